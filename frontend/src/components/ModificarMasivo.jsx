@@ -54,6 +54,16 @@ const ALL_MODEL_FIELDS = [
 // Campos que NO se pueden modificar en UPDATE (el backend los ignora)
 const NON_EDITABLE_IN_UPDATE = ['id_pago_unico', 'fecha_apertura'];
 
+// Mismos colores que la leyenda del instructivo
+const PREVIEW_OP_CLASS = {
+  INSERT: 'table-success',
+  UPDATE: 'table-warning',
+  NOCHANGE: 'table-secondary',
+};
+
+const previewRowClass = (row) =>
+  (row.can_apply === false ? 'table-danger' : PREVIEW_OP_CLASS[row.op] || '');
+
 export default function ModificarMasivo() {
   const navigate = useNavigate();
 
@@ -61,7 +71,12 @@ export default function ModificarMasivo() {
   const [errors, setErrors] = useState([]);
   const [uploading, setUploading] = useState(false);
 
-  const [previewHtml, setPreviewHtml] = useState('');
+  // Vista previa paginada (bulk-update/preview) y reporte de errores del job
+  const [previewUrl, setPreviewUrl] = useState(null);
+  const [errorsUrl, setErrorsUrl] = useState(null);
+  const [previewRows, setPreviewRows] = useState([]);
+  const [previewCounts, setPreviewCounts] = useState(null);
+  const [previewNext, setPreviewNext] = useState(null);
   const [summary, setSummary] = useState(null); // métricas backend
   const [jobId, setJobId] = useState(null);     // id del BulkJob
 
@@ -242,7 +257,7 @@ export default function ModificarMasivo() {
     const f = e.target.files?.[0] ?? null;
     setFile(f);
     setErrors([]);
-    setPreviewHtml('');
+    resetPreview();
     setSummary(null);
     setJobId(null);
     const vErr = validateFile(f);
@@ -253,18 +268,75 @@ export default function ModificarMasivo() {
     setFile(null);
     setErrors([]);
     setUploading(false);
-    setPreviewHtml('');
+    resetPreview();
     setSummary(null);
     setJobId(null);
     if (inputRef.current) inputRef.current.value = '';
     idemKeyRef.current = makeUUID();
   };
 
+  // ====== VISTA PREVIA (keyset: next_after -> after) ======
+  const resetPreview = () => {
+    setPreviewUrl(null);
+    setErrorsUrl(null);
+    setPreviewRows([]);
+    setPreviewCounts(null);
+    setPreviewNext(null);
+  };
+
+  const cargarPreview = async (url, after = null) => {
+    try {
+      const res = await api.get(url, { params: after ? { after } : {} });
+      const data = res?.data || {};
+      const rows = Array.isArray(data.results) ? data.results : [];
+      setPreviewRows((prev) => (after ? [...prev, ...rows] : rows));
+      if (data.counts) setPreviewCounts(data.counts);
+      setPreviewNext(data.next_after ?? null);
+    } catch (err) {
+      console.error('Error en preview:', err);
+      const data = err?.response?.data;
+      setErrors([
+        (Array.isArray(data?.errors) && data.errors.join(' | ')) ||
+          data?.detail ||
+          'No se pudo cargar la vista previa.',
+      ]);
+    }
+  };
+
+  const verMas = async () => {
+    if (!previewUrl || previewNext == null) return;
+    setUploading(true);
+    await cargarPreview(previewUrl, previewNext);
+    setUploading(false);
+  };
+
+  // Reporte de errores (.xlsx): va con el token, así que se baja como blob
+  const descargarErrores = async () => {
+    if (!errorsUrl) return;
+    try {
+      setUploading(true);
+      const res = await api.get(errorsUrl, { responseType: 'blob' });
+      const url = window.URL.createObjectURL(new Blob([res.data]));
+      const a = document.createElement('a');
+      a.href = url;
+      a.download = `errores_${jobId || 'modificacion_masiva'}.xlsx`;
+      document.body.appendChild(a);
+      a.click();
+      document.body.removeChild(a);
+      window.URL.revokeObjectURL(url);
+    } catch (err) {
+      console.error('No se pudo descargar el reporte de errores:', err);
+      setErrors(['No se pudo descargar el reporte de errores. Intentá nuevamente.']);
+    } finally {
+      setUploading(false);
+    }
+  };
+
   // ====== VALIDATE ======  
   const validar = async (e) => {
     e?.preventDefault?.();
     setErrors([]);
-    setPreviewHtml('');
+    resetPreview();
     setSummary(null);
     setJobId(null);
 
@@ -283,9 +355,11 @@ export default function ModificarMasivo() {
       const data = res?.data || {};
 
       if (data.success) {
-        setPreviewHtml(String(data.preview || ''));
         setSummary(data.summary || null);
         setJobId(data.job_id || null);
+        setPreviewUrl(data.preview_url || null);
+        setErrorsUrl(data.errors_url || null);
+        if (data.preview_url) await cargarPreview(data.preview_url);
       } else {
         const readable =
           Array.isArray(data.errors) ? data.errors.join(' | ')
@@ -484,14 +558,68 @@ export default function ModificarMasivo() {
         </div>
       )}
 
-      {previewHtml && (
+      {previewUrl && (
         <div className="mt-4">
-          <h3 className="h5 text-bia">Vista previa</h3>
+          <div className="d-flex flex-wrap gap-2 align-items-center">
+            <h3 className="h5 text-bia m-0">Vista previa</h3>
+            {previewCounts && (
+              <small className="text-muted">
+                {previewRows.length} de {previewCounts.total} filas · ok: {previewCounts.ok} · con errores:{' '}
+                {previewCounts.con_errores}
+              </small>
+            )}
+            {errorsUrl && (
+              <button
+                type="button"
+                className="btn btn-sm btn-outline-danger ms-auto"
+                onClick={descargarErrores}
+                disabled={uploading}
+              >
+                Descargar errores (.xlsx)
+              </button>
+            )}
+          </div>
           <div
-            className="border rounded p-2 bg-white shadow-sm"
+            className="border rounded mt-2 bg-white shadow-sm"
             style={{ maxHeight: '60vh', overflow: 'auto' }}
-            dangerouslySetInnerHTML={{ __html: previewHtml }}
-          />
+          >
+            <table className="table table-sm table-bordered small m-0">
+              <thead className="table-light">
+                <tr>
+                  <th>id_pago_unico</th>
+                  <th>__op</th>
+                  <th>Cambios</th>
+                  <th>Errores</th>
+                </tr>
+              </thead>
+              <tbody>
+                {previewRows.map((row) => (
+                  <tr key={row.id} className={previewRowClass(row)}>
+                    <td><code>{row.id_pago_unico}</code></td>
+                    <td>{row.op}</td>
+                    <td>
+                      {Object.entries(row.changes || {}).map(([campo, { old, new: nuevo }]) => (
+                        <div key={campo}>
+                          <strong>{campo}</strong>: {old == null ? '—' : String(old)} → {nuevo == null ? '—' : String(nuevo)}
+                        </div>
+                      ))}
+                    </td>
+                    <td>{(row.errors || []).join(' | ')}</td>
+                  </tr>
+                ))}
+              </tbody>
+            </table>
+          </div>
+          {previewNext != null && (
+            <button
+              type="button"
+              className="btn btn-sm btn-outline-secondary mt-2"
+              onClick={verMas}
+              disabled={uploading}
+            >
+              Ver más filas
+            </button>
+          )}
           <div className="mt-3 d-flex flex-column flex-sm-row gap-2">
             <button
               type="button"
@@ -1,6 +1,6 @@
 # carga_datos/admin.py
 from django.contrib import admin
-from .models import BulkJob, StagingBulkChange, AuditLog
+from .models import BulkJob, StagingBulkChange, AuditLog, CargaJobBia
 
 @admin.register(BulkJob)
 class BulkJobAdmin(admin.ModelAdmin):
@@ -21,3 +21,9 @@ class AuditLogAdmin(admin.ModelAdmin):
     list_filter = ('table_name', 'action', 'ts')
     search_fields = ('table_name', 'business_key', 'field', 'job__id', 'actor__username')
     autocomplete_fields = ('job', 'actor')
+
+@admin.register(CargaJobBia)
+class CargaJobBiaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'filename', 'estado', 'merge', 'total_rows', 'processed_rows', 'created_count', 'updated_count', 'requested_by', 'created_at')
+    list_filter = ('estado', 'merge', 'created_at')
+    search_fields = ('id', 'upload_id', 'filename', 'requested_by__username')
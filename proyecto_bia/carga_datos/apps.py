@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CargaDatosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'carga_datos'
+
+    def ready(self):
+        from .utils_cache import connect_signals
+        connect_signals()
@@ -0,0 +1,236 @@
+# carga_datos/carga_confirmacion.py
+"""
+Paso 2 (CONFIRMAR) de la carga masiva, independiente de la request HTTP.
+
+Lo usan:
+- api_confirmar_carga (modo sincrónico, todo en una transacción).
+- la tarea Celery confirmar_carga_job (modo background, un commit por bloque
+  junto con el progreso de CargaJobBia; un job que falla a mitad de camino se
+  retoma desde ese progreso, ver `desde`).
+
+El upload se procesa bloque a bloque desde el staging (ver utils_staging):
+1) Validación de claves (sólo id_pago_unico, memoria acotada): formato,
+   duplicados en el archivo y duplicados contra db_bia. Es la única pasada
+   que lee y tipa el staging: los bloques tipados quedan en un archivo
+   temporal (pickle) que reusa la inserción.
+2) Asignación de id_pago_unico para las filas que no lo traen.
+3) Inserción bloque a bloque (COPY / bulk_create, ver utils_loader).
+   Con merge=True las claves que ya existen en db_bia no son error: se
+   actualizan (ON CONFLICT DO UPDATE) y se informan como updated_count.
+
+El tipado de cada bloque (coerce_model_fields) puede repartirse en varios
+procesos con BIA_PARALLEL_WORKERS (ver utils_parallel).
+"""
+import logging
+import pickle
+import tempfile
+from typing import BinaryIO, Callable, Iterator
+
+import pandas as pd
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import BaseDeDatosBia, allocate_id_pago_unico_block
+from .utils_cleaning import coerce_model_fields, frame_to_records
+from .utils_keys import existing_keys
+from .utils_loader import bulk_insert_db_bia, bulk_upsert_db_bia
+from .utils_parallel import imap_ordered, parallel_workers
+from .utils_staging import TEMP_UPLOAD_DIR, iter_staged_frames, read_staged_meta
+from .utils_entidades import EntidadResolver
+from .views_helpers import REQUIRE_KEY_FOR_ROW, KEY_FIELDS
+
+logger = logging.getLogger('django.request')
+
+
+class CargaError(Exception):
+    """Error de validación de la carga (se informa al usuario como 400)."""
+
+
+def _tipar_bloque(item):
+    """(frame, row_offset) -> (frame_tipado, errores). Corre en un worker si hay paralelismo."""
+    frame, row_offset = item
+    return coerce_model_fields(frame, BaseDeDatosBia, row_offset=row_offset)
+
+
+def _bloques_tipados(upload_id: str):
+    """
+    Itera los bloques del staging tipados según el modelo (vectorizado, ver
+    utils_cleaning). id_pago_unico queda como texto ('' si falta).
+    Lanza CargaError si hay celdas que no se pueden convertir.
+    """
+    meta = read_staged_meta(upload_id) or {}
+    workers = parallel_workers(int(meta.get('total_rows') or 0))
+
+    def _items():
+        offset = 0
+        for frame in iter_staged_frames(upload_id):
+            yield frame, offset
+            offset += len(frame)
+
+    for frame, errores in imap_ordered(_tipar_bloque, _items(), workers=workers):
+        if errores:
+            raise CargaError('Valores inválidos en el archivo: ' + '; '.join(errores))
+        if REQUIRE_KEY_FOR_ROW:
+            claves = [c for c in KEY_FIELDS if c in frame.columns]
+            frame = frame.loc[frame[claves].notna().any(axis=1)] if claves else frame.iloc[0:0]
+        if 'id_pago_unico' not in frame.columns:
+            frame = frame.assign(id_pago_unico=None)
+        yield frame.assign(id_pago_unico=frame['id_pago_unico'].fillna(''))
+
+
+def _releer_bloques(tipados: BinaryIO) -> Iterator[pd.DataFrame]:
+    """Bloques que validar_claves_upload guardó en `tipados`, en orden."""
+    tipados.seek(0)
+    while True:
+        try:
+            yield pickle.load(tipados)
+        except EOFError:
+            return
+
+
+def _claves_existentes(keys) -> set[str]:
+    # Un solo round trip (unnest/JOIN en PostgreSQL), ver utils_keys
+    return set(existing_keys(keys))
+
+
+def validar_claves_upload(
+    upload_id: str,
+    *,
+    entidades: EntidadResolver | None = None,
+    merge: bool = False,
+    tipados: BinaryIO | None = None,
+    desde: int = 0,
+) -> tuple[int, int, set[str]]:
+    """
+    Recorre el staging validando id_pago_unico.
+    Si se pasa `entidades`, aprovecha la misma pasada para juntar los nombres
+    de entidad del archivo (se crean todas juntas antes de insertar).
+    Con merge=True no se rechazan las claves que ya existen en db_bia.
+    Si se pasa `tipados` (archivo binario), guarda ahí cada bloque ya tipado
+    para insertarlo después sin volver a leer ni tipar el staging.
+    Las primeras `desde` filas ya las cargó un intento anterior: cuentan para
+    los duplicados dentro del archivo, pero no se buscan en db_bia, no piden
+    id nuevo ni se guardan en `tipados`.
+    Devuelve (filas, filas_sin_id, ids_del_archivo). Lanza CargaError.
+    """
+    total = 0
+    faltantes = 0
+    vistos: set[str] = set()
+    a_cargar: set[str] = set()
+    dup_in_payload: set[str] = set()
+
+    for frame in _bloques_tipados(upload_id):
+        ids = frame['id_pago_unico']
+        vacios = ids.eq('').to_numpy()
+        cargadas = min(max(desde - total, 0), len(frame))
+        faltantes += int(vacios[cargadas:].sum())
+
+        invalidos = ~vacios & ~ids.str.fullmatch(r'\d+').fillna(False).to_numpy()
+        if invalidos.any():
+            pos = int(invalidos.argmax())
+            raise CargaError(f'id_pago_unico inválido en fila {total + pos + 1}: "{ids.iloc[pos]}" (solo dígitos)')
+        total += len(frame)
+
+        con_id = ids[~vacios]
+        dup_in_payload.update(con_id[con_id.duplicated()])
+        unicos = con_id.drop_duplicates()
+        ya_vistos = unicos.isin(vistos).to_numpy()
+        dup_in_payload.update(unicos[ya_vistos])
+        nuevos = unicos[~ya_vistos].tolist()
+        vistos.update(nuevos)
+
+        pendiente = frame.iloc[cargadas:]
+        if pendiente.empty:
+            continue
+        a_cargar.update(pendiente['id_pago_unico'][~vacios[cargadas:]])
+        if entidades is not None:
+            entidades.observar(pendiente)
+        if tipados is not None:
+            pickle.dump(pendiente, tipados, protocol=pickle.HIGHEST_PROTOCOL)
+
+    if total == 0:
+        raise CargaError('Todas las filas están vacías o sin claves requeridas.')
+    if dup_in_payload:
+        raise CargaError(f'id_pago_unico duplicado en el archivo: {", ".join(sorted(dup_in_payload))}')
+    existentes = set() if merge else _claves_existentes(a_cargar)
+    if existentes:
+        raise CargaError(f'id_pago_unico ya existente en base: {", ".join(sorted(existentes))}')
+    return total, faltantes, vistos
+
+
+def _asignar_ids(cantidad: int, ids_archivo: set[str]) -> list[str]:
+    """Reserva `cantidad` ids nuevos que no choquen con el archivo ni con la DB."""
+    return allocate_id_pago_unico_block(cantidad, evitar=ids_archivo)
+
+
+def confirmar_upload(
+    upload_id: str,
+    *,
+    on_progress: Callable[[int, int, int], None] | None = None,
+    merge: bool = False,
+    desde: int = 0,
+) -> dict:
+    """
+    Inserta en db_bia el upload en staging (merge=True: upsert por id_pago_unico).
+
+    on_progress(processed_rows, created_count, updated_count) se llama después
+    de cada bloque, dentro de la misma transacción que lo escribe: lo que guarde
+    queda confirmado junto con el bloque (o no queda).
+    No abre una transacción global: el llamador decide (sincrónico = atomic;
+    background = cada bloque se confirma por separado).
+    desde: filas ya cargadas por un intento anterior (processed_rows del job):
+    se saltean. processed_rows arranca en `desde`; created/updated cuentan sólo
+    este intento.
+    """
+    # Bloques ya tipados de la validación (archivo temporal: se borra solo al cerrarlo)
+    with tempfile.TemporaryFile(dir=TEMP_UPLOAD_DIR, suffix=".tipados") as tipados:
+        return _confirmar_upload(upload_id, tipados, on_progress=on_progress, merge=merge, desde=desde)
+
+
+def _confirmar_upload(upload_id: str, tipados: BinaryIO, *, on_progress, merge: bool, desde: int) -> dict:
+    entidades = EntidadResolver()
+    total, faltantes, ids_archivo = validar_claves_upload(
+        upload_id, entidades=entidades, merge=merge, tipados=tipados, desde=desde,
+    )
+    nuevos_ids = iter(_asignar_ids(faltantes, ids_archivo))
+    # Todas las Entidad faltantes del archivo en un solo bulk_create
+    entidades.crear_faltantes()
+
+    columnas = [f.name for f in BaseDeDatosBia._meta.fields if f.name not in ('id', 'entidad')]
+    processed = desde
+    created = 0
+    updated = 0
+
+    for frame in _releer_bloques(tipados):
+        filas = len(frame)
+
+        sin_id = frame['id_pago_unico'].eq('')
+        if sin_id.any():
+            frame.loc[sin_id, 'id_pago_unico'] = [next(nuevos_ids) for _ in range(int(sin_id.sum()))]
+
+        entidad_ids = entidades.entidad_ids(frame)
+        frame = frame.reindex(columns=columnas)
+        # 🔧 garantizar fecha_apertura si falta/está vacía
+        frame['fecha_apertura'] = frame['fecha_apertura'].astype(object).where(
+            frame['fecha_apertura'].notna(), timezone.localdate()
+        )
+
+        frame['entidad_id'] = entidad_ids
+
+        to_create = frame_to_records(frame)
+        with transaction.atomic():
+            if to_create and merge:
+                insertadas, actualizadas = bulk_upsert_db_bia(to_create)
+                created += insertadas
+                updated += actualizadas
+            elif to_create:
+                created += bulk_insert_db_bia(to_create)
+            processed += filas
+            if on_progress:
+                on_progress(processed, created, updated)
+
+    if not created and not updated and not desde:
+        raise CargaError('No hay filas válidas para insertar.')
+
+    return {'total_rows': total, 'created_count': created, 'updated_count': updated}
@@ -0,0 +1,116 @@
+# carga_datos/carga_preview.py
+"""
+Paso 1 (PREVIEW) de la carga masiva: archivo subido -> staging (ver utils_staging).
+
+Dos modos:
+- Completo (default): se lee, limpia y guarda todo el archivo dentro de la
+  request y se responde con la preview + total_rows.
+- Rápido (BIA_FAST_PREVIEW o fast_preview=true): se lee sólo el encabezado y
+  las primeras filas, se valida y se responde enseguida. El archivo original
+  queda en TEMP_UPLOAD_DIR y la tarea Celery preparar_staging_job arma el
+  staging completo bajo el MISMO upload_id (estado vía staging_status).
+"""
+import logging
+
+import pandas as pd
+from django.conf import settings
+
+from .utils_staging import (
+    StagedUploadWriter,
+    delete_staged_upload,
+    raw_upload_path,
+    read_staging_pending,
+    mark_staging_done,
+    mark_staging_failed,
+)
+from .utils_upload import read_upload_chunks
+from .views_helpers import _limpiar_chunk
+
+logger = logging.getLogger('django.request')
+
+# Cantidad de filas a mostrar en la previsualización
+PREVIEW_ROWS = 10
+
+# Preview rápida por defecto (el front también puede pedirla con fast_preview=true)
+FAST_PREVIEW = bool(getattr(settings, "BIA_FAST_PREVIEW", False))
+
+
+def stage_chunks(chunks, upload_id: str, *, columna_map: dict, source_name: str,
+                 preview_rows: int = PREVIEW_ROWS) -> tuple[int, pd.DataFrame | None]:
+    """
+    Limpia y vuelca cada bloque al staging binario.
+    Devuelve (total_rows, preview_df con las primeras preview_rows filas).
+    """
+    total_rows = 0
+    preview_parts = []
+    with StagedUploadWriter(upload_id, columna_map=columna_map, source_name=source_name) as staged:
+        for chunk in chunks:
+            df = _limpiar_chunk(chunk, columna_map)
+            if df is None or df.empty:
+                continue
+            staged.write(df)
+            # PREVIEW LIMITADA: solo primeras preview_rows filas
+            if total_rows < preview_rows:
+                preview_parts.append(df.head(preview_rows - total_rows))
+            total_rows += int(len(df))
+    preview_df = pd.concat(preview_parts, ignore_index=True) if preview_parts else None
+    return total_rows, preview_df
+
+
+def read_preview(chunks, columna_map: dict, preview_rows: int = PREVIEW_ROWS) -> pd.DataFrame | None:
+    """
+    Lee sólo lo necesario para juntar preview_rows filas no vacías y corta
+    (los bloques se piden chicos, ver read_upload_chunks(chunk_rows=...)).
+    """
+    parts = []
+    total = 0
+    try:
+        for chunk in chunks:
+            df = _limpiar_chunk(chunk, columna_map)
+            if df is None or df.empty:
+                continue
+            parts.append(df.head(preview_rows - total))
+            total += len(parts[-1])
+            if total >= preview_rows:
+                break
+    finally:
+        close = getattr(chunks, "close", None)
+        if close:
+            close()  # cierra el workbook read-only / el reader del CSV
+    return pd.concat(parts, ignore_index=True) if parts else None
+
+
+def stage_raw_upload(upload_id: str) -> int:
+    """
+    Arma el staging completo a partir del archivo original guardado por la
+    preview rápida. Devuelve total_rows. Deja la marca .error si falla.
+    """
+    pending = read_staging_pending(upload_id)
+    path = raw_upload_path(upload_id)
+    if pending is None or path is None:
+        logger.warning(f"Staging en background sin archivo pendiente (upload_id={upload_id}).")
+        return 0
+
+    try:
+        with path.open("rb") as archivo:
+            _, chunks = read_upload_chunks(archivo)
+            total_rows, _ = stage_chunks(
+                chunks,
+                upload_id,
+                columna_map=pending.get("columna_map") or {},
+                source_name=pending.get("source_name") or path.name,
+                preview_rows=0,
+            )
+    except Exception as e:
+        logger.exception(f"Error armando staging en background (upload_id={upload_id}): {e}")
+        mark_staging_failed(upload_id, f"Error al procesar archivo: {e}")
+        raise
+
+    if total_rows == 0:
+        delete_staged_upload(upload_id)
+        mark_staging_failed(upload_id, "No hay filas válidas en el archivo.")
+        return 0
+
+    mark_staging_done(upload_id)
+    logger.info(f"Staging en background listo (upload_id={upload_id}, filas={total_rows}).")
+    return total_rows
@@ -4,7 +4,7 @@ from collections import Counter, defaultdict
 from django.core.management.base import BaseCommand
 from django.db import transaction
 
-from carga_datos.models import BaseDeDatosBia
+from carga_datos.models import BaseDeDatosBia, touch_db_bia
 from certificado_ldd.models import Entidad
 
 def norm(s: str) -> str:
@@ -113,6 +113,9 @@ class Command(BaseCommand):
                 BaseDeDatosBia.objects.bulk_update(to_update, ['entidad_id'])
             updated += len(to_update)
 
+        if updated and not dry:
+            touch_db_bia()
+
         remaining = BaseDeDatosBia.objects.filter(entidad__isnull=True).count()
 
         self.stdout.write(self.style.SUCCESS(f"Filas vinculadas: {updated}"))
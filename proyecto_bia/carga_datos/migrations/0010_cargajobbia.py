@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-17 01:34
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carga_datos', '0009_alter_exportjobbia_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaJobBia',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('estado', models.CharField(choices=[('PENDING', 'Pendiente'), ('RUNNING', 'En proceso'), ('DONE', 'Completado'), ('FAILED', 'Error')], db_index=True, default='PENDING', max_length=20)),
+                ('upload_id', models.CharField(db_index=True, max_length=64)),
+                ('filename', models.CharField(blank=True, default='', max_length=255)),
+                ('total_rows', models.PositiveIntegerField(default=0)),
+                ('processed_rows', models.PositiveIntegerField(default=0)),
+                ('created_count', models.PositiveIntegerField(default=0)),
+                ('error_message', models.TextField(blank=True, default='')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='carga_jobs_bia', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'carga_job_bia',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
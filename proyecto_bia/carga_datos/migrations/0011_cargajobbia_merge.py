@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-17 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carga_datos', '0010_cargajobbia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cargajobbia',
+            name='merge',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='cargajobbia',
+            name='updated_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
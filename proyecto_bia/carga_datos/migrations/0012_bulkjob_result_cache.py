@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carga_datos', '0011_cargajobbia_merge'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkjob',
+            name='db_version',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
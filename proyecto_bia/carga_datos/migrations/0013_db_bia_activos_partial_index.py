@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-17 01:59
+
+from django.db import migrations
+
+# Índice parcial para la regla "máx. activos por DNI + Entidad" (ver utils_activos).
+# Sólo indexa filas activas; el predicado tiene que coincidir con el WHERE de
+# contar_activos para que PostgreSQL lo use. sqlite también soporta índices parciales.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carga_datos', '0012_bulkjob_result_cache'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS idx_bdb_activos_dni_ent "
+                "ON db_bia (dni, entidad_id) "
+                "WHERE upper(estado) IN ('CANCELADO', 'CON DEUDA')"
+            ),
+            reverse_sql="DROP INDEX IF EXISTS idx_bdb_activos_dni_ent",
+        ),
+    ]
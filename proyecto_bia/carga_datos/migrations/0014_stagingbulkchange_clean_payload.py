@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-17 02:02
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carga_datos', '0013_db_bia_activos_partial_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stagingbulkchange',
+            name='clean_payload',
+            field=models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True),
+        ),
+        migrations.AddField(
+            model_name='stagingbulkchange',
+            name='diff',
+            field=models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+        migrations.AddField(
+            model_name='stagingbulkchange',
+            name='snapshot',
+            field=models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-17 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carga_datos', '0014_stagingbulkchange_clean_payload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkjob',
+            name='error_message',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AlterField(
+            model_name='bulkjob',
+            name='status',
+            field=models.CharField(choices=[('validating', 'Validating'), ('ready_to_commit', 'Ready to commit'), ('committing', 'Committing'), ('committed', 'Committed'), ('cancelled', 'Cancelled'), ('failed', 'Failed')], db_index=True, default='ready_to_commit', max_length=32),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-17 02:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carga_datos', '0015_bulkjob_async'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjobbia',
+            name='filtros',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='exportjobbia',
+            name='formato',
+            field=models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel (plantilla Modificar Masivo)')], default='csv', max_length=8),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-17 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carga_datos', '0016_exportjobbia_xlsx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkjob',
+            name='checkpoint_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bulkjob',
+            name='commit_checkpoint',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='bulkjob',
+            name='commit_chunk_rows',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='bulkjob',
+            name='status',
+            field=models.CharField(choices=[('validating', 'Validating'), ('ready_to_commit', 'Ready to commit'), ('committing', 'Committing'), ('partially_committed', 'Partially committed'), ('committed', 'Committed'), ('cancelled', 'Cancelled'), ('failed', 'Failed')], db_index=True, default='ready_to_commit', max_length=32),
+        ),
+    ]
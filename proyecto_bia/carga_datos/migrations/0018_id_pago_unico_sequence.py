@@ -0,0 +1,45 @@
+# Generated by Django 5.1.7 on 2026-10-17 03:05
+
+from django.db import migrations
+
+# Secuencia para id_pago_unico (ver models.allocate_id_pago_unico_block). Arranca
+# después de la mayor clave numérica de db_bia y del contador legacy, lo que sea
+# mayor. Sólo PostgreSQL: en otros motores se sigue usando el contador.
+
+SEQUENCE = "bia_id_pago_unico_seq"
+
+
+def crear_secuencia(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE} AS bigint MINVALUE 1")
+    schema_editor.execute(
+        f"""
+        SELECT setval('{SEQUENCE}', GREATEST(x.ultimo, 1), x.ultimo >= 1)
+        FROM (
+            SELECT GREATEST(
+                COALESCE((SELECT MAX(id_pago_unico::bigint) FROM db_bia
+                          WHERE id_pago_unico ~ '^[0-9]{{1,18}}$'), 0),
+                COALESCE((SELECT last_value FROM business_key_counter
+                          WHERE name = 'id_pago_unico'), 0)
+            ) AS ultimo
+        ) x
+        """
+    )
+
+
+def borrar_secuencia(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carga_datos', '0017_bulkjob_commit_checkpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_secuencia, borrar_secuencia),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-17 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carga_datos', '0018_id_pago_unico_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkjob',
+            name='rolled_back_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='action',
+            field=models.CharField(choices=[('UPDATE', 'Update'), ('INSERT', 'Insert'), ('DELETE', 'Delete'), ('REVERT', 'Revert')], max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='bulkjob',
+            name='status',
+            field=models.CharField(choices=[('validating', 'Validating'), ('ready_to_commit', 'Ready to commit'), ('committing', 'Committing'), ('partially_committed', 'Partially committed'), ('committed', 'Committed'), ('rolled_back', 'Rolled back'), ('cancelled', 'Cancelled'), ('failed', 'Failed')], db_index=True, default='ready_to_commit', max_length=32),
+        ),
+    ]
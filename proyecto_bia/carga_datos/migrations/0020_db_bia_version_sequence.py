@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-17 04:10
+
+from django.db import migrations
+
+# Secuencia para la versión de db_bia (ver models.touch_db_bia). Sigue desde el
+# contador 'db_bia_version' (las validaciones cacheadas con esa versión siguen
+# valiendo; sin contador queda sin llamar y db_bia_version() da 0). Sólo PostgreSQL:
+# en otros motores se sigue usando el contador.
+
+SEQUENCE = "bia_db_bia_version_seq"
+
+
+def crear_secuencia(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE} AS bigint MINVALUE 1")
+    schema_editor.execute(
+        f"""
+        SELECT setval('{SEQUENCE}', GREATEST(x.ultimo, 1), x.ultimo >= 1)
+        FROM (
+            SELECT COALESCE((SELECT last_value FROM business_key_counter
+                             WHERE name = 'db_bia_version'), 0) AS ultimo
+        ) x
+        """
+    )
+
+
+def borrar_secuencia(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carga_datos', '0019_bulkjob_rollback'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_secuencia, borrar_secuencia),
+    ]
@@ -1,10 +1,16 @@
-from django.db import models, transaction
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models, transaction
 from django.db.models.functions import Lower
 from django.db.models import Q
+import os
+import threading
 import uuid
+import weakref
+from collections import deque
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from functools import partial
 from pathlib import Path
 
 
@@ -13,8 +19,9 @@ from pathlib import Path
 # ============================
 class BusinessKeyCounter(models.Model):
     """
-    Contador para claves de negocio. Usamos una sola fila con name='id_pago_unico'
-    y last_value incrementándose bajo select_for_update (a prueba de carreras).
+    Contadores simples (una fila por name). 'id_pago_unico' es el contador
+    legacy de claves: en PostgreSQL las claves salen de ID_PAGO_UNICO_SEQUENCE
+    y esta fila sólo se mantiene al día (ver allocate_id_pago_unico_block).
     """
     name = models.CharField(max_length=50, primary_key=True)
     last_value = models.BigIntegerField(default=0)
@@ -24,29 +31,168 @@ class BusinessKeyCounter(models.Model):
         db_table = 'business_key_counter'
 
 
-@transaction.atomic
-def allocate_id_pago_unico_block(n: int) -> list[str]:
+# ============================
+# Asignación de id_pago_unico
+# ============================
+# PostgreSQL: secuencia (migración 0018). nextval no bloquea a nadie ni escanea db_bia.
+ID_PAGO_UNICO_SEQUENCE = 'bia_id_pago_unico_seq'
+# Ids que cada proceso reserva de una vez para los save() de a una fila
+ID_BLOCK_SIZE = int(getattr(settings, 'BIA_ID_BLOCK_SIZE', 100))
+
+
+def _reconciliar_contador_legacy(hasta: int, using: str = 'default'):
+    """Lleva el contador legacy hasta `hasta` (nunca lo baja)."""
+    BusinessKeyCounter.objects.using(using).filter(
+        name='id_pago_unico', last_value__lt=hasta
+    ).update(last_value=hasta, updated_at=timezone.now())
+
+
+def _reservar_ids(n: int, using: str = 'default') -> list[int]:
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [ID_PAGO_UNICO_SEQUENCE, n])
+            ids = [row[0] for row in cursor.fetchall()]
+        # Después del commit (o ya, en autocommit): el UPDATE no queda tomado durante la transacción
+        transaction.on_commit(partial(_reconciliar_contador_legacy, max(ids), using), using=using)
+        return ids
+
+    # Otros motores (sqlite en dev/tests): contador legacy bajo select_for_update
+    with transaction.atomic(using=using):
+        counter, _ = BusinessKeyCounter.objects.using(using).select_for_update().get_or_create(
+            name='id_pago_unico', defaults={'last_value': 0}
+        )
+        start = counter.last_value + 1
+        counter.last_value = counter.last_value + n
+        counter.save(update_fields=['last_value', 'updated_at'])
+    return list(range(start, start + n))
+
+
+def allocate_id_pago_unico_block(n: int, *, evitar=(), using: str = 'default') -> list[str]:
     """
-    Reserva un bloque de 'n' IDs consecutivos de forma atómica.
+    Reserva 'n' IDs nuevos (consecutivos salvo concurrencia o saltos).
     Devuelve una lista de strings (para compatibilidad con CharField).
+    Los que ya existen en db_bia (claves cargadas a mano por encima de la
+    secuencia) o están en `evitar` (claves explícitas del mismo archivo) se
+    saltean y se piden más: no hace falta el MAX() sobre toda la tabla.
     """
     if n <= 0:
         return []
-    counter, _ = BusinessKeyCounter.objects.select_for_update().get_or_create(
-        name='id_pago_unico', defaults={'last_value': 0}
+    from .utils_keys import existing_keys
+
+    evitar = {str(k) for k in evitar}
+    ids: list[str] = []
+    while len(ids) < n:
+        nuevos = [str(i) for i in _reservar_ids(n - len(ids), using)]
+        ocupados = set(existing_keys(nuevos, using=using)) | (evitar & set(nuevos))
+        ids.extend(i for i in nuevos if i not in ocupados)
+    return ids
+
+
+# Bloque de ids reservado por este proceso: {using: deque}. Se descarta al forkear
+# (workers de Celery/gunicorn) para que dos procesos nunca repartan el mismo bloque.
+_ids_cache: dict[str, deque] = {}
+_ids_cache_lock = threading.Lock()
+os.register_at_fork(after_in_child=_ids_cache.clear)
+
+
+def allocate_id_pago_unico(using: str = 'default') -> str:
+    """
+    Reserva un único ID nuevo, del bloque de ID_BLOCK_SIZE que tiene cacheado
+    el proceso (una ida a la base cada ID_BLOCK_SIZE altas). Los ids de un
+    bloque que el proceso no llega a usar quedan como saltos en la numeración.
+    """
+    with _ids_cache_lock:
+        cache = _ids_cache.setdefault(using, deque())
+        if not cache:
+            cache.extend(allocate_id_pago_unico_block(ID_BLOCK_SIZE, using=using))
+        return cache.popleft()
+
+
+# ============================
+# Versión (marca de agua) de db_bia
+# ============================
+DB_BIA_VERSION_COUNTER = 'db_bia_version'
+# PostgreSQL: la versión es una secuencia (migración 0020). nextval no toma locks,
+# así que las escrituras de db_bia no se encolan detrás de una fila compartida.
+DB_BIA_VERSION_SEQUENCE = 'bia_db_bia_version_seq'
+
+
+def db_bia_version(using: str = 'default') -> int:
+    """Versión actual de db_bia (+ entidades). Cambia con cada escritura confirmada."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            # Recién creada (is_called = false) last_value ya vale 1 y el primer nextval
+            # no lo cambia: hasta ese nextval la versión es 0
+            cursor.execute(
+                'SELECT CASE WHEN is_called THEN last_value ELSE 0 END '
+                f'FROM {connection.ops.quote_name(DB_BIA_VERSION_SEQUENCE)}'
+            )
+            return int(cursor.fetchone()[0])
+
+    value = (
+        BusinessKeyCounter.objects.using(using)
+        .filter(name=DB_BIA_VERSION_COUNTER)
+        .values_list('last_value', flat=True)
+        .first()
     )
-    start = counter.last_value + 1
-    counter.last_value = counter.last_value + n
-    counter.save(update_fields=['last_value', 'updated_at'])
-    return [str(i) for i in range(start, start + n)]
+    return int(value or 0)
+
+
+def _bump_db_bia_version(using: str = 'default'):
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [DB_BIA_VERSION_SEQUENCE])
+        return
+
+    # Otros motores (sqlite en dev/tests): contador en BusinessKeyCounter
+    qs = BusinessKeyCounter.objects.using(using).filter(name=DB_BIA_VERSION_COUNTER)
+    if qs.update(last_value=models.F('last_value') + 1):
+        return
+    _, created = BusinessKeyCounter.objects.using(using).get_or_create(
+        name=DB_BIA_VERSION_COUNTER, defaults={'last_value': 1}
+    )
+    if not created:  # la creó otra request en el medio: igual hay que avanzar
+        qs.update(last_value=models.F('last_value') + 1)
+
 
+class _TouchDbBia:
+    """Callback de on_commit de touch_db_bia (uno por transacción y conexión)."""
 
-@transaction.atomic
-def allocate_id_pago_unico() -> str:
+    def __init__(self, using: str):
+        self.using = using
+
+    def __call__(self):
+        _bump_db_bia_version(self.using)
+
+
+# {using: weakref al _TouchDbBia pendiente}. Las conexiones son por thread, así que
+# esto es por conexión. Django suelta los callbacks de on_commit al confirmar o al
+# hacer rollback (también de un savepoint): la referencia muere sola y la próxima
+# transacción registra el suyo.
+_touch_pendiente = threading.local()
+
+
+def touch_db_bia(using: str = 'default'):
     """
-    Reserva un único ID nuevo.
+    Avisa que db_bia cambió (invalida las validaciones cacheadas, ver utils_cache).
+    Se incrementa DESPUÉS del commit (así nadie cachea datos viejos con la versión
+    nueva) y una sola vez por transacción aunque se llame por cada fila.
     """
-    return allocate_id_pago_unico_block(1)[0]
+    if not transaction.get_connection(using).in_atomic_block:
+        _bump_db_bia_version(using)  # autocommit: la escritura ya está confirmada
+        return
+    pendientes = getattr(_touch_pendiente, 'callbacks', None)
+    if pendientes is None:
+        pendientes = _touch_pendiente.callbacks = {}
+    ref = pendientes.get(using)
+    if ref is not None and ref() is not None:
+        return
+    callback = _TouchDbBia(using)
+    pendientes[using] = weakref.ref(callback)
+    transaction.on_commit(callback, using=using)
 
 
 class BaseDeDatosBia(models.Model):
@@ -151,17 +297,29 @@ class BaseDeDatosBia(models.Model):
     def save(self, *args, **kwargs):
         # Si viene vacío/None, asignamos uno nuevo.
         if not self.id_pago_unico or str(self.id_pago_unico).strip() == '':
-            self.id_pago_unico = allocate_id_pago_unico()
+            self.id_pago_unico = allocate_id_pago_unico(kwargs.get('using') or self._state.db or 'default')
         else:
             # Normalizamos a string y sin espacios
             self.id_pago_unico = str(self.id_pago_unico).strip()
         super().save(*args, **kwargs)
+        touch_db_bia(kwargs.get('using') or self._state.db or 'default')
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        touch_db_bia(kwargs.get('using') or self._state.db or 'default')
+        return result
 
 
 class BulkJob(models.Model):
     class Status(models.TextChoices):
+        VALIDATING = 'validating', 'Validating'
         READY = 'ready_to_commit', 'Ready to commit'
+        COMMITTING = 'committing', 'Committing'
+        # Commit por bloques que se cortó: hay bloques aplicados, se reanuda desde commit_checkpoint
+        PARTIAL = 'partially_committed', 'Partially committed'
         COMMITTED = 'committed', 'Committed'
+        # Revertido con bulk-update/rollback (a partir del AuditLog del job)
+        ROLLED_BACK = 'rolled_back', 'Rolled back'
         CANCELLED = 'cancelled', 'Cancelled'
         FAILED = 'failed', 'Failed'
 
@@ -176,8 +334,17 @@ class BulkJob(models.Model):
         max_length=32, choices=Status.choices, default=Status.READY, db_index=True
     )
     summary = models.JSONField(default=dict, blank=True)
+    # Cache de validación (ver utils_cache): versión de db_bia usada al validar
+    db_version = models.BigIntegerField(null=True, blank=True)
+    error_message = models.TextField(blank=True, default='')
+    # Commit por bloques (ver views_bulk.aplicar_bulk_job): tamaño de bloque (None = una
+    # sola transacción), última business_key aplicada y cuándo se confirmó ese bloque
+    commit_chunk_rows = models.PositiveIntegerField(null=True, blank=True)
+    commit_checkpoint = models.CharField(max_length=255, blank=True, default='')
+    checkpoint_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     committed_at = models.DateTimeField(null=True, blank=True)
+    rolled_back_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         db_table = 'bulk_job'
@@ -190,6 +357,11 @@ class BulkJob(models.Model):
     def __str__(self):
         return f'BulkJob {self.id} ({self.filename}) - {self.status}'
 
+    @property
+    def is_finished(self) -> bool:
+        """False mientras una tarea (validate/commit en background) lo está procesando."""
+        return self.status not in (self.Status.VALIDATING, self.Status.COMMITTING)
+
     def mark_committed(self):
         self.status = self.Status.COMMITTED
         self.committed_at = timezone.now()
@@ -211,6 +383,14 @@ class StagingBulkChange(models.Model):
     payload = models.JSONField(default=dict, blank=True)
     validation_errors = models.JSONField(default=list, blank=True)
     can_apply = models.BooleanField(default=False)
+    # Resultado de bulk_validate para que bulk_commit no vuelva a normalizar:
+    # - clean_payload: valores ya normalizados/tipados (fechas ISO, decimales como str,
+    #   entidad como id). NULL = staging de una versión anterior (hay que revalidar).
+    # - diff: {campo: valor nuevo} que se aplica (INSERT: todo el payload).
+    # - snapshot: valores de la fila en DB contra los que se validó ({campo: str | None}).
+    clean_payload = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    diff = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    snapshot = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -232,6 +412,9 @@ class AuditLog(models.Model):
         UPDATE = 'UPDATE', 'Update'
         INSERT = 'INSERT', 'Insert'
         DELETE = 'DELETE', 'Delete'
+        # Reversión de un BulkJob: campo restaurado, o field='*' con la fila
+        # (JSON) en old_value si se borró un alta / en new_value si se recreó un borrado
+        REVERT = 'REVERT', 'Revert'
 
     table_name = models.CharField(max_length=128, db_index=True)
     business_key = models.CharField(max_length=255, db_index=True)
@@ -289,9 +472,17 @@ class ExportJobBia(models.Model):
         related_name="export_jobs_bia",
     )
 
+    class Formato(models.TextChoices):
+        CSV  = "csv",  "CSV"
+        XLSX = "xlsx", "Excel (plantilla Modificar Masivo)"
+
+    formato      = models.CharField(max_length=8, choices=Formato.choices, default=Formato.CSV)
+
     # Filtros simples (para futuro)
     filtro_dni           = models.CharField(max_length=32, blank=True, default="")
     filtro_id_pago_unico = models.CharField(max_length=32, blank=True, default="")
+    # Filtros completos de la plantilla .xlsx (dni, id_pago_unico__in, limit)
+    filtros              = models.JSONField(default=dict, blank=True)
 
     # Resultado
     total_rows   = models.PositiveIntegerField(default=0)
@@ -328,4 +519,64 @@ class ExportJobBia(models.Model):
         if not self.file_path:
             return None
         # Normalizamos separadores por si viene con backslashes en Windows
-        return self.file_path.replace("\\", "/")
\ No newline at end of file
+        return self.file_path.replace("\\", "/")
+
+class CargaJobBia(models.Model):
+    """
+    Confirmación de carga (paso 2 del flujo React) ejecutada en segundo plano.
+    El upload ya está en staging (upload_id); la tarea Celery lo inserta por
+    bloques y va actualizando processed_rows / created_count para que el
+    front pueda hacer polling.
+    """
+    class Estado(models.TextChoices):
+        PENDIENTE   = "PENDING",  "Pendiente"
+        EN_PROCESO  = "RUNNING",  "En proceso"
+        COMPLETADO  = "DONE",     "Completado"
+        ERROR       = "FAILED",   "Error"
+
+    id           = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at   = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at   = models.DateTimeField(auto_now=True)
+    started_at   = models.DateTimeField(null=True, blank=True)
+    finished_at  = models.DateTimeField(null=True, blank=True)
+
+    estado       = models.CharField(
+        max_length=20,
+        choices=Estado.choices,
+        default=Estado.PENDIENTE,
+        db_index=True,
+    )
+
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="carga_jobs_bia",
+    )
+
+    upload_id    = models.CharField(max_length=64, db_index=True)
+    filename     = models.CharField(max_length=255, blank=True, default="")
+    # merge: upsert por id_pago_unico (las claves existentes se actualizan)
+    merge        = models.BooleanField(default=False)
+
+    # Progreso
+    total_rows     = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_count  = models.PositiveIntegerField(default=0)
+    updated_count  = models.PositiveIntegerField(default=0)
+    error_message  = models.TextField(blank=True, default="")
+
+    class Meta:
+        db_table = 'carga_job_bia'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"CargaJobBia {self.pk} [{self.estado}]"
+
+    @property
+    def is_finished(self) -> bool:
+        return self.estado in (
+            self.Estado.COMPLETADO,
+            self.Estado.ERROR,
+        )
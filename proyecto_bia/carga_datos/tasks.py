@@ -5,9 +5,13 @@ from pathlib import Path
 
 from celery import shared_task
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.utils import timezone
 
-from .models import BaseDeDatosBia, ExportJobBia
+from .models import BaseDeDatosBia, BulkJob, ExportJobBia, CargaJobBia
+from .carga_confirmacion import CargaError, confirmar_upload
+from .utils_staging import delete_staged_upload, raw_upload_path
+from .carga_preview import stage_raw_upload
 
 logger = logging.getLogger("django.request")
 
@@ -122,3 +126,183 @@ def exportar_db_bia_job(job_id: int):
         job.status = ExportJobBia.Status.FAILED
         job.error_message = str(e)
         job.save(update_fields=["status", "error_message", "updated_at"])
+
+
+@shared_task
+def confirmar_carga_job(job_id: str):
+    """
+    Tarea Celery que confirma un upload en staging (CargaJobBia.upload_id).
+    Inserta por bloques; cada bloque se confirma por separado y en la misma
+    transacción se actualizan processed_rows / created_count (polling del front).
+
+    No es todo o nada a propósito (el avance tiene que verse mientras corre):
+    si falla a mitad de camino, las filas de los bloques ya confirmados quedan
+    en db_bia y processed_rows dice exactamente cuántas son. Volver a confirmar
+    el mismo upload (api_confirmar_carga) reencola este job y se retoma desde
+    processed_rows: no se reinsertan ni se revalidan contra la base esas filas.
+    """
+    try:
+        job = CargaJobBia.objects.get(pk=job_id)
+    except CargaJobBia.DoesNotExist:
+        logger.error(f"[CargaJobBia] job_id={job_id} no existe.")
+        return
+
+    # Evitamos re-ejecutar jobs ya tomados por otro worker
+    if job.estado != CargaJobBia.Estado.PENDIENTE:
+        logger.info(f"[CargaJobBia] job_id={job_id} en estado {job.estado}, se omite.")
+        return
+
+    job.estado = CargaJobBia.Estado.EN_PROCESO
+    job.started_at = job.started_at or timezone.now()
+    job.error_message = ""
+    job.save(update_fields=["estado", "started_at", "error_message", "updated_at"])
+
+    # Lo que dejó un intento anterior (0 si es el primero)
+    desde, creadas_antes, actualizadas_antes = job.processed_rows, job.created_count, job.updated_count
+    if desde:
+        logger.info(f"[CargaJobBia] job_id={job_id} se retoma desde la fila {desde}.")
+
+    def _progress(processed: int, created: int, updated: int):
+        job.processed_rows = processed
+        job.created_count = creadas_antes + created
+        job.updated_count = actualizadas_antes + updated
+        job.save(update_fields=["processed_rows", "created_count", "updated_count", "updated_at"])
+
+    try:
+        result = confirmar_upload(job.upload_id, on_progress=_progress, merge=job.merge, desde=desde)
+    except CargaError as e:
+        job.estado = CargaJobBia.Estado.ERROR
+        job.error_message = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=["estado", "error_message", "finished_at", "updated_at"])
+        return
+    except Exception as e:
+        logger.exception(f"[CargaJobBia] Error en confirmar_carga_job job_id={job_id}: {e}")
+        job.estado = CargaJobBia.Estado.ERROR
+        job.error_message = (
+            f"{e} (ya se cargaron {job.processed_rows} filas; al volver a confirmar se sigue desde ahí)"
+            if job.processed_rows else str(e)
+        )
+        job.finished_at = timezone.now()
+        job.save(update_fields=["estado", "error_message", "finished_at", "updated_at"])
+        return
+
+    job.estado = CargaJobBia.Estado.COMPLETADO
+    job.total_rows = result["total_rows"]
+    job.created_count = creadas_antes + result["created_count"]
+    job.updated_count = actualizadas_antes + result["updated_count"]
+    job.finished_at = timezone.now()
+    job.save(update_fields=["estado", "total_rows", "created_count", "updated_count", "finished_at", "updated_at"])
+    delete_staged_upload(job.upload_id)
+
+    logger.info(
+        f"[CargaJobBia] job_id={job.pk} completado. filas={job.total_rows} "
+        f"creadas={job.created_count} actualizadas={job.updated_count}"
+    )
+
+
+@shared_task
+def preparar_staging_job(upload_id: str):
+    """
+    Tarea Celery de la preview rápida: arma el staging completo del upload
+    (mismo upload_id que ya se devolvió al front). El estado se consulta con
+    staging_status / carga/upload-status/.
+    """
+    stage_raw_upload(upload_id)
+
+
+# views_bulk importa estas tareas: la lógica se importa adentro para no generar un ciclo
+
+@shared_task
+def validar_bulk_job(job_id: str):
+    """
+    Tarea Celery de Modificar Masivo: valida el archivo spooleado por
+    bulk_validate (background=true) y arma el staging del BulkJob.
+    El avance queda en BulkJob.summary['progreso'] (bulk-update/status).
+    """
+    from .views_bulk import BulkError, validar_bulk_upload
+
+    job = BulkJob.objects.filter(pk=job_id).first()
+    if job is None:
+        logger.error(f"[BulkJob] job_id={job_id} no existe.")
+        return
+    if job.status != BulkJob.Status.VALIDATING:
+        logger.info(f"[BulkJob] job_id={job_id} en estado {job.status}, se omite.")
+        return
+
+    try:
+        path = raw_upload_path(job.id.hex)
+        if path is None:
+            job.status = BulkJob.Status.FAILED
+            job.error_message = "Archivo no encontrado o expirado."
+            job.save(update_fields=["status", "error_message"])
+            return
+        summary = validar_bulk_upload(job, path)
+    except BulkError as e:
+        logger.info(f"[BulkJob] job_id={job_id} rechazado: {e}")
+        return
+    except Exception as e:
+        logger.exception(f"[BulkJob] Error en validar_bulk_job job_id={job_id}: {e}")
+        return
+    finally:
+        delete_staged_upload(job.id.hex)
+
+    logger.info(f"[BulkJob] job_id={job_id} validado. filas={summary.get('total')} ok={summary.get('ok')}")
+
+
+@shared_task
+def confirmar_bulk_job(job_id: str, user_id: int | None = None):
+    """
+    Tarea Celery de Modificar Masivo: aplica un BulkJob que bulk_commit ya
+    pasó a COMMITTING (background=true). Rechazo -> READY con error_message
+    (o PARTIAL si era un commit por bloques con bloques ya aplicados).
+    """
+    from .views_bulk import BulkError, aplicar_bulk_job
+
+    job = BulkJob.objects.filter(pk=job_id).first()
+    if job is None:
+        logger.error(f"[BulkJob] job_id={job_id} no existe.")
+        return
+    if job.status != BulkJob.Status.COMMITTING:
+        logger.info(f"[BulkJob] job_id={job_id} en estado {job.status}, se omite.")
+        return
+
+    actor = get_user_model().objects.filter(pk=user_id).first() if user_id else None
+    try:
+        resultado = aplicar_bulk_job(job, actor)
+    except BulkError as e:
+        logger.info(f"[BulkJob] commit job_id={job_id} rechazado: {e}")
+        return
+    except Exception as e:
+        logger.exception(f"[BulkJob] Error en confirmar_bulk_job job_id={job_id}: {e}")
+        return
+
+    logger.info(
+        f"[BulkJob] job_id={job_id} aplicado. insertadas={resultado['inserted_count']} "
+        f"actualizadas={resultado['updated_count']} borradas={resultado['deleted_count']}"
+    )
+
+
+@shared_task
+def exportar_plantilla_bulk_job(job_id: int):
+    """
+    Tarea Celery de la plantilla .xlsx de Modificar Masivo (bulk_export_xlsx
+    con background=true). Estado y descarga: export/job-status/.
+    """
+    from .views_bulk import exportar_plantilla_job
+
+    job = ExportJobBia.objects.filter(pk=job_id).first()
+    if job is None:
+        logger.error(f"[ExportJobBia] job_id={job_id} no existe.")
+        return
+    if job.estado != ExportJobBia.Estado.PENDIENTE:
+        logger.info(f"[ExportJobBia] job_id={job_id} en estado {job.estado}, se omite.")
+        return
+
+    try:
+        exportar_plantilla_job(job)
+    except Exception as e:
+        logger.exception(f"[ExportJobBia] Error en exportar_plantilla_bulk_job job_id={job_id}: {e}")
+        return
+
+    logger.info(f"[ExportJobBia] job_id={job_id} completado. filas={job.total_rows} archivo={job.file_path}")
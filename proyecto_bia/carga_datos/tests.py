@@ -1,3 +1,149 @@
+import datetime
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from . import views_bulk
+from .models import AuditLog, BaseDeDatosBia, BulkJob
+from .utils_loader import _orm_upsert
+from .views_bulk import BulkError, _tomar_job_para_commit, aplicar_bulk_job, revertir_bulk_job
+
+
+class BulkJobTestCase(TestCase):
+    """Filas 7000..7005 en db_bia y un helper que valida un archivo de Modificar Masivo."""
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "admin")
+        for i in range(6):
+            BaseDeDatosBia.objects.create(
+                id_pago_unico=str(7000 + i), dni=str(70 + i), entidadinterna="X", nombre_apellido=f"A{i}",
+            )
+
+    def _validar(self, filas) -> BulkJob:
+        path = self.tmp / "cambios.csv"
+        pd.DataFrame(filas).to_csv(path, index=False)
+        job = BulkJob.objects.create(
+            filename=path.name, created_by=self.user, status=BulkJob.Status.VALIDATING, summary={},
+        )
+        views_bulk.validar_bulk_upload(job, path)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BulkJob.Status.READY)
+        return job
+
+    def _nombres(self) -> dict:
+        return dict(BaseDeDatosBia.objects.values_list("id_pago_unico", "nombre_apellido"))
+
+
+class CommitPorBloquesTests(BulkJobTestCase):
+
+    def test_se_reanuda_desde_el_checkpoint(self):
+        job = self._validar([{"id_pago_unico": str(7000 + i), "nombre_apellido": f"B{i}"} for i in range(5)])
+        job = _tomar_job_para_commit(job.id, 2)
+
+        aplicar = views_bulk._CambiosCommit.aplicar
+        llamadas = []
+
+        def falla_en_el_segundo_bloque(cambios):
+            llamadas.append(cambios)
+            if len(llamadas) == 2:
+                raise RuntimeError("worker caído")
+            return aplicar(cambios)
+
+        with mock.patch.object(views_bulk._CambiosCommit, "aplicar", falla_en_el_segundo_bloque):
+            with self.assertRaises(RuntimeError):
+                aplicar_bulk_job(job, self.user)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, BulkJob.Status.PARTIAL)
+        self.assertEqual(job.commit_checkpoint, "7001")
+        self.assertEqual(job.summary["commit"]["updated_count"], 2)
+        nombres = self._nombres()
+        self.assertEqual([nombres[str(7000 + i)] for i in range(5)], ["B0", "B1", "A2", "A3", "A4"])
+
+        # bulk_commit sin chunked: el job PARTIAL sigue con su tamaño de bloque
+        job = _tomar_job_para_commit(job.id, None)
+        self.assertIsNotNone(job)
+        self.assertEqual(job.commit_chunk_rows, 2)
+        resultado = aplicar_bulk_job(job, self.user)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, BulkJob.Status.COMMITTED)
+        self.assertEqual(resultado["updated_count"], 5)
+        nombres = self._nombres()
+        self.assertEqual([nombres[str(7000 + i)] for i in range(6)], ["B0", "B1", "B2", "B3", "B4", "A5"])
+        # Ninguna fila se aplicó (ni auditó) dos veces
+        auditadas = AuditLog.objects.filter(job=job, action=AuditLog.Action.UPDATE, field="nombre_apellido")
+        self.assertEqual(sorted(auditadas.values_list("business_key", flat=True)), [str(7000 + i) for i in range(5)])
+
+    def test_job_terminado_no_se_vuelve_a_tomar(self):
+        job = self._validar([{"id_pago_unico": "7000", "nombre_apellido": "B0"}])
+        aplicar_bulk_job(_tomar_job_para_commit(job.id, 2), self.user)
+        self.assertIsNone(_tomar_job_para_commit(job.id, 2))
+
+
+class RollbackTests(BulkJobTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.job = self._validar([{"id_pago_unico": str(7000 + i), "nombre_apellido": f"B{i}"} for i in range(3)])
+        aplicar_bulk_job(_tomar_job_para_commit(self.job.id, None), self.user)
+
+    def test_revierte_el_commit(self):
+        resultado = revertir_bulk_job(self.job.id, self.user)
+
+        self.assertEqual(resultado["restored_count"], 3)
+        self.assertEqual(resultado["conflict_count"], 0)
+        nombres = self._nombres()
+        self.assertEqual([nombres[str(7000 + i)] for i in range(3)], ["A0", "A1", "A2"])
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, BulkJob.Status.ROLLED_BACK)
+        self.assertEqual(AuditLog.objects.filter(job=self.job, action=AuditLog.Action.REVERT).count(), 3)
+
+    def test_fila_cambiada_despues_del_commit_es_conflicto(self):
+        BaseDeDatosBia.objects.filter(id_pago_unico="7001").update(nombre_apellido="OTRO")
+
+        with self.assertRaisesMessage(BulkError, "7001"):
+            revertir_bulk_job(self.job.id, self.user)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, BulkJob.Status.COMMITTED)
+        nombres = self._nombres()
+        self.assertEqual([nombres[str(7000 + i)] for i in range(3)], ["B0", "OTRO", "B2"])
+
+        resultado = revertir_bulk_job(self.job.id, self.user, skip_conflicts=True)
+
+        self.assertEqual(resultado["restored_count"], 2)
+        self.assertEqual(resultado["conflict_count"], 1)
+        nombres = self._nombres()
+        self.assertEqual([nombres[str(7000 + i)] for i in range(3)], ["A0", "OTRO", "A2"])
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, BulkJob.Status.ROLLED_BACK)
+        self.assertEqual(
+            [c["business_key"] for c in self.job.summary["rollback"]["conflictos"]], ["7001"],
+        )
+
+
+class OrmUpsertTests(TestCase):
+
+    def test_cuenta_insertadas_y_actualizadas(self):
+        BaseDeDatosBia.objects.create(id_pago_unico="100", dni="1", nombre_apellido="Viejo", entidadinterna="X")
+        hoy = datetime.date(2024, 1, 2)
+
+        insertadas, actualizadas = _orm_upsert([
+            {"id_pago_unico": "100", "nombre_apellido": "Nuevo", "dni": None},
+            {"id_pago_unico": "101", "nombre_apellido": "Otro", "entidadinterna": "X", "fecha_apertura": hoy},
+            {"id_pago_unico": "102", "nombre_apellido": "Otro más", "entidadinterna": "X", "fecha_apertura": hoy},
+        ], using="default")
+
+        self.assertEqual((insertadas, actualizadas), (2, 1))
+        existente = BaseDeDatosBia.objects.get(id_pago_unico="100")
+        self.assertEqual(existente.nombre_apellido, "Nuevo")
+        # Un valor vacío en el payload no pisa el de la base (mismo criterio que el COALESCE)
+        self.assertEqual(existente.dni, "1")
+        self.assertEqual(BaseDeDatosBia.objects.count(), 3)
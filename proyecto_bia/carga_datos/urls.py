@@ -10,6 +10,8 @@ from .views import (
     # API
     api_cargar_excel,
     api_confirmar_carga,
+    api_upload_status,
+    api_carga_job_status,
     api_errores_validacion,
     mostrar_datos_bia,
     actualizar_datos_bia,
@@ -21,7 +23,9 @@ from .views import (
 )
 
 # Endpoints de Modificar Masivo (bulk)
-from carga_datos.views_bulk import bulk_validate, bulk_commit, bulk_export_xlsx
+from carga_datos.views_bulk import (
+    bulk_validate, bulk_commit, bulk_rollback, bulk_export_xlsx, bulk_status, bulk_preview, bulk_errors_csv, bulk_errors_xlsx,
+)
 
 # Endpoints de administración (roles/usuarios)
 from carga_datos.views_roles import (
@@ -60,6 +64,10 @@ urlpatterns = [
     path("ping/",                       ping,                   name="api_ping"),
     path("cargar/",                     api_cargar_excel,       name="api_cargar"),
     path("confirmar/",                  api_confirmar_carga,    name="api_confirmar"),
+    # Estado del staging de un upload con preview rápida (GET ?upload_id=...)
+    path("carga/upload-status/",        api_upload_status,      name="api_upload_status"),
+    # Estado de una confirmación en background (GET ?job_id=...)
+    path("carga/job-status/",           api_carga_job_status,   name="api_carga_job_status"),
     path("errores/",                    api_errores_validacion, name="api_errores"),
     path("mostrar-datos-bia/",          mostrar_datos_bia,      name="api_mostrar_datos_bia"),
     path("mostrar-datos-bia/<int:pk>/", actualizar_datos_bia,   name="api_actualizar_datos_bia"),
@@ -87,6 +95,11 @@ urlpatterns = [
     # Bulk update (Modificar Masivo)
     path("bulk-update/validate",     bulk_validate,     name="bulk_update_validate"),
     path("bulk-update/commit",       bulk_commit,       name="bulk_update_commit"),
+    path("bulk-update/rollback",     bulk_rollback,     name="bulk_update_rollback"),
+    path("bulk-update/status",       bulk_status,       name="bulk_update_status"),
+    path("bulk-update/preview",      bulk_preview,      name="bulk_update_preview"),
+    path("bulk-update/errors.csv",   bulk_errors_csv,   name="bulk_update_errors_csv"),
+    path("bulk-update/errors.xlsx",  bulk_errors_xlsx,  name="bulk_update_errors_xlsx"),
     path("bulk-update/export.xlsx",  bulk_export_xlsx,  name="bulk_export_xlsx"),
 
     # Admin (me/roles/users)
@@ -0,0 +1,117 @@
+# carga_datos/utils_activos.py
+"""
+Regla blanda "máximo N registros activos por DNI + Entidad" por conjuntos.
+
+Activo = estado CANCELADO / CON DEUDA (case-insensitive). En vez de un
+count() con estado__iexact por fila:
+
+1) contar_activos(pares): UNA consulta agrupada para todos los (dni, entidad_id)
+   del job. En PostgreSQL es un JOIN contra unnest(dnis, entidades) y usa el
+   índice parcial idx_bdb_activos_dni_ent:
+       (dni, entidad_id) WHERE upper(estado) IN ('CANCELADO', 'CON DEUDA')
+   En otros motores cae a __in por lotes.
+2) ActivosPorDniEntidad: parte de esos conteos y recorre el archivo en orden.
+   Cada fila que se va a aplicar suma a su par (y resta del par que dejaba,
+   si cambia de estado/DNI/entidad o se borra), así dos filas del MISMO
+   archivo que activan el mismo DNI+Entidad también chocan.
+
+    motor = ActivosPorDniEntidad(pares)
+    for fila in filas:
+        previo = par_activo(fila_actual_en_db)   # antes de modificarla
+        if motor.otros(par, previo) >= MAX_ACTIVOS_POR_DNI_ENTIDAD: error
+        elif se_aplica: motor.aplicar(par, previo)
+"""
+import logging
+from typing import Iterable
+
+from django.db import connections
+from django.db.models import Count
+from django.db.models.functions import Upper
+
+from .models import BaseDeDatosBia
+
+logger = logging.getLogger('django.request')
+
+ACTIVE_ESTADOS = ("CANCELADO", "CON DEUDA")
+ACTIVE_INDEX_NAME = "idx_bdb_activos_dni_ent"
+
+# Lote de DNIs para el fallback con __in (sqlite limita los parámetros)
+ACTIVOS_BATCH = 900
+
+Par = tuple[str, int]
+
+
+def par_activo(obj) -> Par | None:
+    """(dni, entidad_id) por el que obj YA cuenta como activo en la base, o None."""
+    if obj is None or not obj.dni or not obj.entidad_id:
+        return None
+    if str(obj.estado or "").upper() not in ACTIVE_ESTADOS:
+        return None
+    return (str(obj.dni), int(obj.entidad_id))
+
+
+def contar_activos(pares: Iterable[Par], *, using: str = "default") -> dict[Par, int]:
+    """{(dni, entidad_id): cantidad de registros activos} para los pares pedidos."""
+    pares = {(str(d), int(e)) for d, e in pares if d and e}
+    if not pares:
+        return {}
+
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        qn = connection.ops.quote_name
+        table = qn(BaseDeDatosBia._meta.db_table)
+        dni_col = qn(BaseDeDatosBia._meta.get_field("dni").column)
+        ent_col = qn(BaseDeDatosBia._meta.get_field("entidad").column)
+        estado_col = qn(BaseDeDatosBia._meta.get_field("estado").column)
+        placeholders = ", ".join(["%s"] * len(ACTIVE_ESTADOS))
+        sql = (
+            f"SELECT b.{dni_col}, b.{ent_col}, COUNT(*) FROM {table} b "
+            f"JOIN unnest(%s::text[], %s::bigint[]) AS p(dni, entidad_id) "
+            f"ON b.{dni_col} = p.dni AND b.{ent_col} = p.entidad_id "
+            f"WHERE upper(b.{estado_col}) IN ({placeholders}) "
+            f"GROUP BY b.{dni_col}, b.{ent_col}"
+        )
+        orden = sorted(pares)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [[d for d, _ in orden], [e for _, e in orden], *ACTIVE_ESTADOS])
+            return {(str(d), int(e)): n for d, e, n in cursor.fetchall()}
+
+    out = {}
+    entidad_ids = sorted({e for _, e in pares})
+    dnis = sorted({d for d, _ in pares})
+    qs = (
+        BaseDeDatosBia.objects.using(using)
+        .annotate(estado_upper=Upper("estado"))
+        .filter(estado_upper__in=ACTIVE_ESTADOS, entidad_id__in=entidad_ids)
+    )
+    for start in range(0, len(dnis), ACTIVOS_BATCH):
+        lote = dnis[start:start + ACTIVOS_BATCH]
+        filas = qs.filter(dni__in=lote).values_list("dni", "entidad_id").annotate(n=Count("id")).order_by()
+        for d, e, n in filas:
+            if (str(d), e) in pares:
+                out[(str(d), e)] = n
+    return out
+
+
+class ActivosPorDniEntidad:
+    def __init__(self, pares: Iterable[Par], *, using: str = "default"):
+        self.conteos = contar_activos(pares, using=using)
+
+    def otros(self, par: Par, previo: Par | None = None) -> int:
+        """Activos de `par` sin contar a la fila que se modifica (activa hoy en `previo`)."""
+        cnt = self.conteos.get(par, 0)
+        if previo == par:
+            cnt -= 1
+        return cnt
+
+    def aplicar(self, par: Par | None, previo: Par | None = None):
+        """
+        Registra que la fila (activa hoy en `previo`, None si no lo es o es nueva)
+        queda activa en `par` (None: deja de ser activa o se borra).
+        """
+        if previo == par:
+            return
+        if previo is not None and previo in self.conteos:
+            self.conteos[previo] -= 1
+        if par is not None:
+            self.conteos[par] = self.conteos.get(par, 0) + 1
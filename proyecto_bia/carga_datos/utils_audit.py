@@ -0,0 +1,112 @@
+# carga_datos/utils_audit.py
+"""
+Escritura de AuditLog por lotes.
+
+En lugar de un AuditLog.objects.create() por campo/fila, los eventos se
+juntan en memoria y se mandan en bloques de AUDIT_BATCH_SIZE:
+- PostgreSQL: COPY FROM STDIN (formato texto, respeta NULL vs '').
+- Otros motores (o BIA_AUDIT_LOADER="orm"): bulk_create.
+
+    audit = AuditBuffer(job=job, actor=request.user)
+    audit.add(AuditLog.Action.UPDATE, business_key, field, old, new)
+    ...
+    audit.flush()   # al final, dentro de la misma transacción que los cambios
+
+También sirve como context manager (flush al salir sin excepción).
+"""
+import io
+import logging
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .models import AuditLog, BaseDeDatosBia
+from .utils_loader import _copy_from_buffer
+
+logger = logging.getLogger('django.request')
+
+# "auto" (COPY si es PostgreSQL), "copy" o "orm"
+AUDIT_LOADER = getattr(settings, "BIA_AUDIT_LOADER", "auto")
+AUDIT_BATCH_SIZE = int(getattr(settings, "BIA_AUDIT_BATCH_SIZE", 10000))
+
+COPY_FIELDS = ("table_name", "business_key", "field", "old_value", "new_value", "job", "action", "actor", "ts")
+
+
+def _copy_text(value) -> str:
+    """Valor -> campo de COPY en formato texto (\\N = NULL)."""
+    if value is None:
+        return r"\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _as_text(value) -> str | None:
+    return None if value is None else str(value)
+
+
+class AuditBuffer:
+    def __init__(self, *, job=None, actor=None, table_name: str | None = None, using: str = "default"):
+        self.job = job
+        self.actor = actor if getattr(actor, "pk", None) is not None else None
+        self.table_name = table_name or BaseDeDatosBia._meta.db_table
+        self.using = using
+        self.use_copy = AUDIT_LOADER != "orm" and connections[using].vendor == "postgresql"
+        self._pending: list[AuditLog] = []
+        self.written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        return False
+
+    def add(self, action: str, business_key, field: str, old_value=None, new_value=None):
+        self._pending.append(AuditLog(
+            table_name=self.table_name,
+            business_key=str(business_key),
+            field=field,
+            old_value=_as_text(old_value),
+            new_value=_as_text(new_value),
+            job=self.job,
+            action=action,
+            actor=self.actor,
+        ))
+        if len(self._pending) >= AUDIT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        if self.use_copy:
+            self._copy(self._pending)
+        else:
+            AuditLog.objects.using(self.using).bulk_create(self._pending, batch_size=AUDIT_BATCH_SIZE)
+        self.written += len(self._pending)
+        self._pending = []
+
+    def _copy(self, entries: list[AuditLog]):
+        connection = connections[self.using]
+        meta = AuditLog._meta
+        qn = connection.ops.quote_name
+        cols_sql = ", ".join(qn(meta.get_field(name).column) for name in COPY_FIELDS)
+        copy_sql = f"COPY {qn(meta.db_table)} ({cols_sql}) FROM STDIN"
+
+        ts = timezone.now().isoformat()
+        buffer = io.StringIO()
+        for e in entries:
+            buffer.write("\t".join(_copy_text(v) for v in (
+                e.table_name, e.business_key, e.field, e.old_value, e.new_value,
+                e.job_id, e.action, e.actor_id, ts,
+            )))
+            buffer.write("\n")
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            _copy_from_buffer(cursor, copy_sql, buffer)
@@ -0,0 +1,126 @@
+# carga_datos/utils_bulk_staging.py
+"""
+Escritura del staging de Modificar Masivo (StagingBulkChange) por lotes.
+
+bulk_validate junta las filas en memoria y las manda en bloques grandes:
+- bulk_create de STAGING_BATCH_SIZE filas (default), o
+- COPY FROM STDIN (PostgreSQL) cuando el job supera STAGING_COPY_MIN_ROWS.
+
+Las claves repetidas del archivo se resuelven ANTES de escribir (ver
+bulk_validate): la restricción unique (job, business_key) nunca se
+chequea fila por fila; si igual llega una clave repetida es un bug y se
+corta con ValueError.
+
+    with transaction.atomic(), StagingBulkWriter(job, expected_rows=len(df)) as w:
+        w.add(business_key, op=op, payload=raw_row, validation_errors=errors, can_apply=ok,
+              clean_payload=payload_clean, diff=cambios, snapshot=valores_en_db)
+"""
+import csv
+import io
+import json
+import logging
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .models import StagingBulkChange
+from .utils_loader import CARGA_LOADER, _copy_from_buffer
+
+logger = logging.getLogger('django.request')
+
+STAGING_BATCH_SIZE = int(getattr(settings, "BIA_STAGING_BATCH_SIZE", 5000))
+STAGING_COPY_MIN_ROWS = int(getattr(settings, "BIA_STAGING_COPY_MIN_ROWS", 50000))
+
+# Columnas que se mandan por COPY (el resto tiene default en el modelo)
+COPY_FIELDS = (
+    "job", "business_key", "op", "payload", "validation_errors", "can_apply",
+    "clean_payload", "diff", "snapshot", "created_at",
+)
+JSON_FIELDS = ("payload", "validation_errors", "clean_payload", "diff", "snapshot")
+
+
+class StagingBulkWriter:
+    def __init__(self, job, *, expected_rows: int | None = None, using: str = "default"):
+        self.job = job
+        self.using = using
+        connection = connections[using]
+        self.use_copy = (
+            CARGA_LOADER != "orm"
+            and connection.vendor == "postgresql"
+            and (expected_rows or 0) >= STAGING_COPY_MIN_ROWS
+        )
+        self._pending: list[StagingBulkChange] = []
+        self._keys: set[str] = set()
+        self.written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        return False
+
+    def add(
+        self, business_key: str, *, op: str, payload: dict, validation_errors: list, can_apply: bool,
+        clean_payload: dict | None = None, diff: dict | None = None, snapshot: dict | None = None,
+    ):
+        if business_key in self._keys:
+            raise ValueError(f"Clave repetida en el staging del job {self.job.pk}: {business_key!r}")
+        self._keys.add(business_key)
+        self._pending.append(StagingBulkChange(
+            job=self.job,
+            business_key=business_key,
+            op=op,
+            payload=payload,
+            validation_errors=validation_errors,
+            can_apply=can_apply,
+            clean_payload=clean_payload if clean_payload is not None else {},
+            diff=diff or {},
+            snapshot=snapshot or {},
+        ))
+        if len(self._pending) >= STAGING_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        if self.use_copy:
+            self._copy(self._pending)
+        else:
+            StagingBulkChange.objects.using(self.using).bulk_create(self._pending, batch_size=STAGING_BATCH_SIZE)
+        self.written += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        self.flush()
+
+    def _copy(self, objs: list[StagingBulkChange]):
+        connection = connections[self.using]
+        meta = StagingBulkChange._meta
+        fields = [meta.get_field(name) for name in COPY_FIELDS]
+        encoders = {name: meta.get_field(name).encoder for name in JSON_FIELDS}
+        qn = connection.ops.quote_name
+        cols_sql = ", ".join(qn(f.column) for f in fields)
+        copy_sql = f"COPY {qn(meta.db_table)} ({cols_sql}) FROM STDIN WITH (FORMAT csv)"
+
+        now = timezone.now()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for obj in objs:
+            writer.writerow([
+                obj.job_id,
+                obj.business_key,
+                obj.op,
+                json.dumps(obj.payload, cls=encoders["payload"]),
+                json.dumps(obj.validation_errors, cls=encoders["validation_errors"]),
+                "t" if obj.can_apply else "f",
+                json.dumps(obj.clean_payload, cls=encoders["clean_payload"]),
+                json.dumps(obj.diff, cls=encoders["diff"]),
+                json.dumps(obj.snapshot, cls=encoders["snapshot"]),
+                now.isoformat(),
+            ])
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            _copy_from_buffer(cursor, copy_sql, buffer)
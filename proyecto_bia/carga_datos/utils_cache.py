@@ -0,0 +1,130 @@
+# carga_datos/utils_cache.py
+"""
+Cache de resultados por hash de contenido (SHA-256 del archivo subido).
+
+Re-subir el mismo archivo no vuelve a parsear ni a validar:
+
+- Carga (api_cargar_excel): el staging sólo depende del archivo, así que se
+  reusa el upload_id anterior del mismo usuario mientras su staging siga
+  vivo (listo o procesando). La validación contra la base se hace igual en
+  la confirmación. Índice: <TEMP_UPLOAD_DIR>/<sha256>.<user_id>.hash
+- Modificación masiva (bulk_validate): se reusa el BulkJob READY del mismo
+  usuario con el mismo file_hash SÓLO si db_bia no cambió desde que se
+  validó (BulkJob.db_version == db_bia_version(), ver models.touch_db_bia).
+  Si cambió algo, se re-valida todo.
+
+La versión de db_bia es global (cualquier escritura o alta/baja de Entidad
+invalida): es conservadora pero nunca devuelve una preview vieja.
+BIA_RESULT_CACHE=False lo desactiva.
+"""
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+from .models import BulkJob, touch_db_bia
+from .utils_staging import TEMP_UPLOAD_DIR, _ensure_temp_upload_dir, _is_safe_upload_id, staging_status
+
+logger = logging.getLogger('django.request')
+
+RESULT_CACHE = bool(getattr(settings, "BIA_RESULT_CACHE", True))
+
+
+def file_sha256(archivo) -> str:
+    """SHA-256 de un archivo subido (por bloques) y lo deja en la posición 0."""
+    h = hashlib.sha256()
+    archivo.seek(0)
+    if hasattr(archivo, "chunks"):
+        for block in archivo.chunks():
+            h.update(block)
+    else:
+        h.update(archivo.read())
+    archivo.seek(0)
+    return h.hexdigest()
+
+
+def _owner(user) -> str:
+    pk = getattr(user, "pk", None)
+    return str(pk) if pk is not None else "anon"
+
+
+def _upload_index_path(file_hash: str, user) -> Path | None:
+    owner = _owner(user)
+    if not (_is_safe_upload_id(file_hash) and owner.isalnum()):
+        return None
+    return TEMP_UPLOAD_DIR / f"{file_hash}.{owner}.hash"
+
+
+# ---------- Carga (staging) ----------
+
+def cached_upload(file_hash: str, user) -> dict | None:
+    """
+    Preview guardada para el mismo archivo y usuario si su staging sigue
+    disponible: {'upload_id', 'preview', 'source_name', 'estado': staging_status}.
+    """
+    if not RESULT_CACHE:
+        return None
+    path = _upload_index_path(file_hash, user)
+    if path is None or not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        data = {}
+    upload_id = data.get("upload_id") or ""
+    estado = staging_status(upload_id)
+    if estado["estado"] not in ("listo", "procesando"):
+        # confirmado, cancelado, expirado o con error: el índice ya no sirve
+        path.unlink(missing_ok=True)
+        return None
+    return {**data, "estado": estado}
+
+
+def remember_upload(file_hash: str, user, *, upload_id: str, preview: str, source_name: str = ""):
+    if not RESULT_CACHE:
+        return
+    path = _upload_index_path(file_hash, user)
+    if path is None:
+        return
+    try:
+        _ensure_temp_upload_dir()
+        data = {"upload_id": upload_id, "preview": preview, "source_name": source_name}
+        path.write_text(json.dumps(data), encoding="utf-8")
+    except Exception as e:
+        logger.warning(f"No se pudo guardar el índice de cache del upload {upload_id}: {e}")
+
+
+# ---------- Modificación masiva (BulkJob) ----------
+
+def cached_bulk_job(file_hash: str, user, db_version: int) -> BulkJob | None:
+    """BulkJob READY ya validado con el mismo archivo y la misma versión de db_bia."""
+    if not RESULT_CACHE or not file_hash:
+        return None
+    return (
+        BulkJob.objects
+        .filter(
+            file_hash=file_hash,
+            created_by=user,
+            status=BulkJob.Status.READY,
+            db_version=db_version,
+        )
+        .order_by("-created_at")
+        .first()
+    )
+
+
+# ---------- Entidades ----------
+
+def _entidad_changed(sender, **kwargs):
+    # La validación resuelve 'entidad' por id/nombre: un alta/baja/renombre cambia resultados
+    touch_db_bia()
+
+
+def connect_signals():
+    from .views_helpers import _get_entidad_model
+    Entidad = _get_entidad_model()
+    post_save.connect(_entidad_changed, sender=Entidad, dispatch_uid="bia_cache_entidad_save")
+    post_delete.connect(_entidad_changed, sender=Entidad, dispatch_uid="bia_cache_entidad_delete")
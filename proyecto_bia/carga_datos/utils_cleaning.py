@@ -0,0 +1,166 @@
+# carga_datos/utils_cleaning.py
+"""
+Limpieza vectorizada de DataFrames de carga (columna a columna, sin apply por fila).
+
+- trim de strings y ''/espacios -> NaN
+- detección/eliminación de filas completamente vacías
+- coerción por tipo de campo del modelo (fechas, decimales, enteros, texto)
+- NaN/NaT -> None al pasar a records
+
+Reemplaza la limpieza celda a celda y el df.astype(str) de antes.
+"""
+import numpy as np
+import pandas as pd
+from django.db import models
+from pandas.api.types import is_bool_dtype, is_float_dtype, is_numeric_dtype, is_object_dtype, is_string_dtype
+
+# Cantidad máxima de celdas inválidas que se detallan en el error
+MAX_ERRORES_DETALLE = 20
+
+
+def _string_mask(s: pd.Series) -> pd.Series:
+    """True donde el valor es un str (en columnas object mezcladas)."""
+    return s.str.len().notna()
+
+
+def strip_strings(df: pd.DataFrame) -> pd.DataFrame:
+    """Trim de strings en columnas de texto; ''/espacios -> NaN."""
+    if df is None or df.empty:
+        return df
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if is_object_dtype(s) or is_string_dtype(s):
+            stripped = s.str.strip()
+            s = stripped.where(stripped.notna(), s)
+            s = s.mask(stripped.eq(""))
+        out[col] = s
+    return pd.DataFrame(out, index=df.index, columns=df.columns)
+
+
+def blank_rows_mask(df: pd.DataFrame) -> pd.Series:
+    """True para filas sin ningún valor (None/NaN/''/espacios)."""
+    if df is None or df.empty:
+        return pd.Series(False, index=getattr(df, "index", None), dtype=bool)
+    blank = pd.Series(True, index=df.index)
+    for col in df.columns:
+        s = df[col]
+        col_blank = s.isna()
+        if is_object_dtype(s) or is_string_dtype(s):
+            col_blank = col_blank | s.str.strip().eq("")
+        blank &= col_blank.to_numpy()
+    return blank
+
+
+def drop_blank_rows(df: pd.DataFrame) -> pd.DataFrame:
+    if df is None or df.empty:
+        return df
+    return df.loc[~blank_rows_mask(df)]
+
+
+# ---------- Coerción por tipo de campo ----------
+
+def _to_text(s: pd.Series) -> pd.Series:
+    """
+    Texto limpio para CharField: enteros guardados como float (DNI/CUIT leídos
+    como 2054685741.0) vuelven a '2054685741'; el resto str().
+    """
+    notna = s.notna()
+    out = pd.Series(None, index=s.index, dtype=object)
+    if is_bool_dtype(s):
+        out[notna] = s[notna].astype(str)
+        return out
+    if is_numeric_dtype(s):
+        vals = s[notna]
+        if is_float_dtype(s):
+            integral = (vals % 1 == 0)
+            out[vals.index[integral]] = vals[integral].astype("int64").astype(str)
+            out[vals.index[~integral]] = vals[~integral].astype(str)
+        else:
+            out[notna] = vals.astype(str)
+        return out
+
+    is_str = _string_mask(s)
+    out[is_str] = s[is_str]
+    otros = notna & ~is_str
+    if otros.any():
+        def _fmt(v):
+            if isinstance(v, float) and v.is_integer():
+                return str(int(v))
+            return str(v)
+        out[otros] = s[otros].map(_fmt)
+    return out
+
+
+def _to_date(s: pd.Series) -> tuple[pd.Series, pd.Series]:
+    parsed = pd.to_datetime(s, errors="coerce", format="ISO8601")
+    invalid = s.notna() & parsed.isna()
+    out = pd.Series(None, index=s.index, dtype=object)
+    ok = parsed.notna()
+    out[ok] = parsed[ok].dt.date
+    return out, invalid
+
+
+def _to_decimal(s: pd.Series) -> tuple[pd.Series, pd.Series]:
+    parsed = pd.to_numeric(s, errors="coerce")
+    invalid = s.notna() & parsed.isna()
+    return parsed, invalid
+
+
+def _to_int(s: pd.Series) -> tuple[pd.Series, pd.Series]:
+    parsed = pd.to_numeric(s, errors="coerce")
+    no_entero = parsed.notna() & (parsed % 1 != 0)
+    invalid = (s.notna() & parsed.isna()) | no_entero
+    parsed = parsed.mask(no_entero)
+    return parsed.astype("Int64"), invalid
+
+
+def coerce_model_fields(df: pd.DataFrame, model, *, row_offset: int = 0) -> tuple[pd.DataFrame, list[str]]:
+    """
+    Convierte cada columna que coincide con un campo concreto de `model`
+    a su tipo (DateField -> date, DecimalField -> número, IntegerField -> entero,
+    CharField -> texto). Las FK y columnas ajenas al modelo no se tocan.
+
+    Devuelve (df_tipado, errores). Cada error indica fila (1-based, sumando
+    row_offset cuando df es un bloque de un archivo más grande), campo y valor
+    que no se pudo convertir.
+    """
+    if df is None or df.empty:
+        return df, []
+
+    fields = {f.name: f for f in model._meta.concrete_fields}
+    out = df.copy()
+    invalid_masks = {}
+    for col in df.columns:
+        field = fields.get(col)
+        if field is None or field.primary_key or field.is_relation:
+            continue
+        s = df[col]
+        if isinstance(field, models.DateTimeField):
+            continue
+        if isinstance(field, models.DateField):
+            out[col], invalid_masks[col] = _to_date(s)
+        elif isinstance(field, models.DecimalField):
+            out[col], invalid_masks[col] = _to_decimal(s)
+        elif isinstance(field, models.IntegerField):
+            out[col], invalid_masks[col] = _to_int(s)
+        elif isinstance(field, models.CharField):
+            out[col] = _to_text(s)
+
+    errores = []
+    for col, mask in invalid_masks.items():
+        if not mask.any():
+            continue
+        posiciones = np.flatnonzero(mask.to_numpy())
+        for pos in posiciones[:MAX_ERRORES_DETALLE - len(errores)]:
+            errores.append(f"fila {row_offset + pos + 1}: {col}: valor inválido '{df[col].iloc[pos]}'")
+        if len(errores) >= MAX_ERRORES_DETALLE:
+            break
+    return out, errores
+
+
+def frame_to_records(df: pd.DataFrame) -> list[dict]:
+    """DataFrame -> list[dict] con NaN/NaT/<NA> -> None."""
+    if df is None or df.empty:
+        return []
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
@@ -0,0 +1,99 @@
+# carga_datos/utils_diff.py
+"""
+Diff archivo vs. db_bia por columnas (pandas), para Modificar Masivo.
+
+En vez de comparar str(viejo) != str(nuevo) campo por campo y fila por fila:
+1) frame_actual: los valores actuales de las claves afectadas (las filas que ya
+   trajo existing_rows en UNA consulta) en un DataFrame indexado por id_pago_unico.
+2) frame_nuevo: los payloads normalizados del archivo, alineados con esas claves.
+3) mascara_cambios: compara columna a columna con tipos (no como texto):
+     - Decimal: entero escalado a decimal_places del campo (10 == 10.00)
+     - Fechas: datetime64
+     - FK / enteros: Int64 (id de la entidad, no el objeto)
+     - resto: string
+   y devuelve un DataFrame bool (clave x campo) con True donde la celda cambia.
+   Un campo ausente en el payload (celda vacía en el archivo) nunca cambia.
+
+    cambiados = campos_cambiados(payloads, actuales, fields_map)
+    diff = {k: payload[k] for k in cambiados[clave]}
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+from django.db import models
+
+logger = logging.getLogger('django.request')
+
+
+def frame_actual(actuales: dict, campos: list[str], fields_map: dict[str, models.Field]) -> pd.DataFrame:
+    """{clave: instancia} -> DataFrame clave x campo con los valores actuales (FK = id)."""
+    attnames = [fields_map[c].attname for c in campos]
+    df = pd.DataFrame.from_records(
+        [vars(o) for o in actuales.values()], index=list(actuales.keys()), columns=attnames,
+    )
+    df.columns = campos
+    return df
+
+
+def frame_nuevo(payloads: dict[str, dict], campos: list[str]) -> pd.DataFrame:
+    """{clave: payload normalizado} -> DataFrame clave x campo (NaN = campo ausente)."""
+    return pd.DataFrame.from_records(
+        list(payloads.values()), index=list(payloads.keys()), columns=campos,
+    ).astype(object)
+
+
+def _canonica(serie: pd.Series, field: models.Field) -> pd.Series:
+    """Columna -> forma comparable según el tipo del campo (nulos como NA)."""
+    if isinstance(field, models.DecimalField):
+        num = pd.to_numeric(serie, errors="coerce").astype("float64")
+        return (num * 10 ** field.decimal_places).round().astype("Int64")
+    if isinstance(field, (models.ForeignKey, models.IntegerField)):
+        return pd.to_numeric(serie, errors="coerce").astype("Int64")
+    if isinstance(field, models.DateTimeField):
+        return pd.to_datetime(serie, errors="coerce", utc=True)
+    if isinstance(field, models.DateField):
+        return pd.to_datetime(serie, errors="coerce")
+    return serie.astype("string")
+
+
+def mascara_cambios(nuevo: pd.DataFrame, actual: pd.DataFrame, fields_map: dict[str, models.Field]) -> pd.DataFrame:
+    """
+    DataFrame bool alineado con `nuevo`: True si la celda trae valor y es
+    distinta (con tipos) del valor actual de esa clave.
+    """
+    actual = actual.reindex(index=nuevo.index, columns=nuevo.columns)
+    presentes = nuevo.notna()
+    mascara = pd.DataFrame(False, index=nuevo.index, columns=nuevo.columns)
+    for campo in nuevo.columns:
+        con_valor = presentes[campo]
+        if not con_valor.any():
+            continue
+        field = fields_map[campo]
+        viejo = _canonica(actual[campo], field)
+        nuevo_c = _canonica(nuevo[campo], field)
+        iguales = (viejo == nuevo_c).fillna(False).astype(bool) | (viejo.isna() & nuevo_c.isna())
+        mascara[campo] = con_valor & ~iguales
+    return mascara
+
+
+def campos_cambiados(payloads: dict[str, dict], actuales: dict, fields_map: dict[str, models.Field]) -> dict[str, list[str]]:
+    """
+    {clave: [campos que cambian]} para cada clave de `payloads` que existe en
+    `actuales` (las demás no son UPDATE y no aparecen). Campos en el orden del modelo.
+    """
+    payloads = {k: p for k, p in payloads.items() if k in actuales}
+    if not payloads:
+        return {}
+    usados = set().union(*payloads.values())
+    campos = [c for c in fields_map if c in usados]
+    if not campos:
+        return {k: [] for k in payloads}
+
+    mascara = mascara_cambios(
+        frame_nuevo(payloads, campos),
+        frame_actual({k: actuales[k] for k in payloads}, campos, fields_map),
+        fields_map,
+    )
+    nombres = np.asarray(campos, dtype=object)
+    return {k: nombres[fila].tolist() for k, fila in zip(mascara.index, mascara.to_numpy(dtype=bool))}
@@ -0,0 +1,123 @@
+# carga_datos/utils_entidades.py
+"""
+Resolución de la FK 'entidad' por lotes (propietario -> entidadinterna).
+
+En lugar de resolver fila por fila (normalizar + dict lookup + create):
+1) observar(df): junta los nombres distintos del archivo (la normalización
+   se calcula una sola vez por valor distinto, no por fila).
+2) crear_faltantes(): crea TODAS las Entidad que falten con un único
+   bulk_create(ignore_conflicts=True), respetando uq_entidad_nombre_ci
+   (si otra request la creó en el medio, el conflicto se ignora y se relee).
+3) entidad_ids(df): Serie de entidad_id alineada con df (mapeo vectorizado).
+
+Prioridad por fila: 'propietario' y, si está vacío, 'entidadinterna'.
+Sin CREATE_MISSING_ENTIDADES sólo se usan las existentes.
+"""
+import logging
+
+import pandas as pd
+from django.db.models.functions import Lower
+
+from .models import touch_db_bia
+from .views_helpers import (
+    CREATE_MISSING_ENTIDADES,
+    normalizar_valor_nombre,
+    _get_entidad_model,
+    _build_entidad_cache,
+)
+
+logger = logging.getLogger('django.request')
+
+ENTIDAD_BATCH_SIZE = 1000
+
+
+class EntidadResolver:
+    """
+        resolver = EntidadResolver()
+        for df in bloques:
+            resolver.observar(df)
+        resolver.crear_faltantes()
+        df['entidad_id'] = resolver.entidad_ids(df)
+    """
+
+    def __init__(self, create_missing: bool = CREATE_MISSING_ENTIDADES):
+        self.create_missing = create_missing
+        self.cache = _build_entidad_cache()  # clave normalizada -> Entidad
+        self._ids = {k: e.pk for k, e in self.cache.items()}
+        self._pendientes: dict[str, str] = {}  # clave -> nombre tal cual vino
+        self.creadas = 0
+
+    # ---------- helpers ----------
+    @staticmethod
+    def _texto_y_clave(df: pd.DataFrame, col: str) -> tuple[pd.Series, pd.Series]:
+        if col not in df.columns:
+            vacio = pd.Series("", index=df.index, dtype=object)
+            return vacio, pd.Series(None, index=df.index, dtype=object)
+        s = df[col]
+        texto = s.where(s.notna(), "").astype(str).str.strip()
+        claves = {v: normalizar_valor_nombre(v) for v in texto.unique() if v}
+        clave = texto.map(claves)
+        return texto, clave.where(clave.ne(""))
+
+    def _candidatas(self, df: pd.DataFrame) -> tuple[pd.Series, pd.Series]:
+        p_txt, p_key = self._texto_y_clave(df, 'propietario')
+        e_txt, e_key = self._texto_y_clave(df, 'entidadinterna')
+        if self.create_missing:
+            usar_p = p_key.notna()
+            return p_key.where(usar_p, e_key), p_txt.where(usar_p, e_txt)
+        conocida_p = p_key.isin(self._ids.keys())
+        conocida_e = e_key.isin(self._ids.keys())
+        clave = p_key.where(conocida_p, e_key.where(conocida_e))
+        return clave, p_txt.where(conocida_p, e_txt)
+
+    # ---------- API ----------
+    def observar(self, df: pd.DataFrame):
+        """Registra los nombres de entidad del bloque que todavía no existen."""
+        if not self.create_missing or df is None or df.empty:
+            return
+        clave, texto = self._candidatas(df)
+        nuevas = clave.notna() & ~clave.isin(self._ids.keys())
+        if not nuevas.any():
+            return
+        distintas = pd.DataFrame({'clave': clave[nuevas], 'nombre': texto[nuevas]}).drop_duplicates('clave')
+        for k, nombre in zip(distintas['clave'], distintas['nombre']):
+            self._pendientes.setdefault(k, nombre)
+
+    def crear_faltantes(self) -> int:
+        """Crea en un solo bulk_create las entidades observadas que faltan."""
+        pendientes = {k: n for k, n in self._pendientes.items() if k not in self._ids}
+        self._pendientes.clear()
+        if not pendientes:
+            return 0
+
+        Entidad = _get_entidad_model()
+        Entidad.objects.bulk_create(
+            [Entidad(nombre=n, responsable="", cargo="") for n in pendientes.values()],
+            batch_size=ENTIDAD_BATCH_SIZE,
+            ignore_conflicts=True,  # uq_entidad_nombre_ci: si ya existe, se relee abajo
+        )
+        # ignore_conflicts no devuelve pks: releemos por nombre (case-insensitive)
+        nombres_ci = list({n.lower() for n in pendientes.values()})
+        for start in range(0, len(nombres_ci), ENTIDAD_BATCH_SIZE):
+            lote = nombres_ci[start:start + ENTIDAD_BATCH_SIZE]
+            for e in Entidad.objects.annotate(nombre_ci=Lower('nombre')).filter(nombre_ci__in=lote):
+                key = normalizar_valor_nombre(e.nombre)
+                self.cache.setdefault(key, e)
+                self._ids.setdefault(key, e.pk)
+
+        touch_db_bia()
+        self.creadas += len(pendientes)
+        logger.info(f"Entidades creadas en carga masiva: {len(pendientes)}")
+        return len(pendientes)
+
+    def entidad_ids(self, df: pd.DataFrame) -> pd.Series:
+        """
+        entidad_id por fila (Int64, <NA> si no resuelve). Crea antes las que
+        falten del bloque, por si no se llamó a observar() en una pasada previa.
+        """
+        if df is None or df.empty:
+            return pd.Series(dtype="Int64")
+        self.observar(df)
+        self.crear_faltantes()
+        clave, _ = self._candidatas(df)
+        return clave.map(self._ids).astype("Int64")
@@ -0,0 +1,109 @@
+# carga_datos/utils_keys.py
+"""
+Búsqueda de claves de negocio (id_pago_unico) existentes en db_bia.
+
+En lugar de un filter(id_pago_unico__in=[...]) con cientos de miles de
+parámetros, en PostgreSQL se manda UN solo parámetro array y se hace
+JOIN contra unnest(%s) usando el índice único de id_pago_unico:
+
+    SELECT b.id_pago_unico, b.id
+    FROM db_bia b
+    JOIN unnest(%s::text[]) AS k(clave) ON b.id_pago_unico = k.clave
+
+Una sola ida y vuelta, costo lineal en la cantidad de claves.
+En otros motores (sqlite en dev/tests) se cae al __in por lotes.
+"""
+import logging
+from typing import Iterable
+
+from django.db import connections
+
+from .models import BaseDeDatosBia
+
+logger = logging.getLogger('django.request')
+
+BUSINESS_KEY_FIELD = "id_pago_unico"
+
+# Lote para el fallback con __in (sqlite limita la cantidad de parámetros)
+KEY_LOOKUP_BATCH = 900
+
+
+def _claves_unicas(keys: Iterable) -> list[str]:
+    vistos = set()
+    out = []
+    for k in keys:
+        if k is None:
+            continue
+        k = str(k).strip()
+        if k and k not in vistos:
+            vistos.add(k)
+            out.append(k)
+    return out
+
+
+def _unnest_sql(connection, select_cols: str) -> str:
+    qn = connection.ops.quote_name
+    table = qn(BaseDeDatosBia._meta.db_table)
+    key_col = qn(BaseDeDatosBia._meta.get_field(BUSINESS_KEY_FIELD).column)
+    return (
+        f"SELECT {select_cols} FROM {table} b "
+        f"JOIN unnest(%s::text[]) AS k(clave) ON b.{key_col} = k.clave"
+    )
+
+
+def existing_keys(keys: Iterable, *, using: str = "default") -> dict[str, int]:
+    """
+    Devuelve {id_pago_unico: pk} para las claves que ya existen en db_bia.
+    Las claves vacías/None se ignoran.
+    """
+    claves = _claves_unicas(keys)
+    if not claves:
+        return {}
+
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        qn = connection.ops.quote_name
+        key_col = qn(BaseDeDatosBia._meta.get_field(BUSINESS_KEY_FIELD).column)
+        pk_col = qn(BaseDeDatosBia._meta.pk.column)
+        sql = _unnest_sql(connection, f"b.{key_col}, b.{pk_col}")
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [claves])
+            return {str(k): pk for k, pk in cursor.fetchall()}
+
+    out = {}
+    qs = BaseDeDatosBia.objects.using(using)
+    for start in range(0, len(claves), KEY_LOOKUP_BATCH):
+        lote = claves[start:start + KEY_LOOKUP_BATCH]
+        out.update(
+            (str(k), pk) for k, pk in
+            qs.filter(**{f"{BUSINESS_KEY_FIELD}__in": lote}).values_list(BUSINESS_KEY_FIELD, "pk")
+        )
+    return out
+
+
+def existing_rows(keys: Iterable, *, using: str = "default") -> dict[str, BaseDeDatosBia]:
+    """
+    Igual que existing_keys pero devuelve las instancias completas
+    {id_pago_unico: BaseDeDatosBia} (lo necesita bulk_commit para comparar/actualizar).
+    """
+    claves = _claves_unicas(keys)
+    if not claves:
+        return {}
+
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        sql = _unnest_sql(connection, "b.*")
+        return {
+            str(getattr(o, BUSINESS_KEY_FIELD)): o
+            for o in BaseDeDatosBia.objects.using(using).raw(sql, [claves])
+        }
+
+    out = {}
+    qs = BaseDeDatosBia.objects.using(using)
+    for start in range(0, len(claves), KEY_LOOKUP_BATCH):
+        lote = claves[start:start + KEY_LOOKUP_BATCH]
+        out.update(
+            (str(getattr(o, BUSINESS_KEY_FIELD)), o)
+            for o in qs.filter(**{f"{BUSINESS_KEY_FIELD}__in": lote})
+        )
+    return out
@@ -0,0 +1,241 @@
+# carga_datos/utils_loader.py
+"""
+Carga masiva de filas nuevas en db_bia.
+
+- PostgreSQL: COPY FROM STDIN a una tabla temporal (por bloques) y luego un
+  único INSERT ... SELECT hacia db_bia. Evita instanciar un modelo por fila y
+  armar sentencias INSERT gigantes.
+- Otros motores (sqlite en tests/dev): fallback al camino ORM de siempre
+  (bulk_create con batch_size).
+
+Los payloads son dicts {campo_modelo: valor}; la FK va como 'entidad_id'.
+
+Modo merge (bulk_upsert_db_bia): mismo camino, pero el INSERT ... SELECT lleva
+ON CONFLICT (id_pago_unico) DO UPDATE. Igual que en Modificar Masivo, las celdas
+vacías no pisan valores existentes (COALESCE) y fecha_apertura / id_pago_unico
+no se actualizan.
+"""
+import csv
+import io
+import logging
+from typing import Iterable
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import BaseDeDatosBia, touch_db_bia
+from .utils_keys import BUSINESS_KEY_FIELD, existing_rows
+
+logger = logging.getLogger('django.request')
+
+# "auto" (COPY si es PostgreSQL), "copy" o "orm"
+CARGA_LOADER = getattr(settings, "BIA_CARGA_LOADER", "auto")
+
+# Filas por bloque enviado con COPY / bulk_create
+LOADER_BATCH_ROWS = int(getattr(settings, "BIA_LOADER_BATCH_ROWS", 20000))
+ORM_BATCH_SIZE = 2000
+
+TMP_TABLE = "tmp_db_bia_carga"
+
+# Campos que el merge nunca actualiza en filas existentes
+MERGE_IMMUTABLE_FIELDS = {BUSINESS_KEY_FIELD, "fecha_apertura"}
+
+
+def _insert_fields():
+    """Campos concretos de db_bia que se insertan (todos menos el PK)."""
+    return [f for f in BaseDeDatosBia._meta.concrete_fields if not f.primary_key]
+
+
+def _use_copy(using: str) -> bool:
+    if CARGA_LOADER == "orm":
+        return False
+    return connections[using].vendor == "postgresql"
+
+
+def _to_copy_value(field, value, connection):
+    """
+    Valor Python -> texto para COPY (formato CSV).
+    Pasa por to_python/get_db_prep_save igual que el ORM, así los errores
+    de tipo (fechas/decimales inválidos) se comportan como en bulk_create.
+    None -> celda vacía sin comillas (NULL en COPY CSV).
+    """
+    if value is None:
+        return None
+    value = field.get_db_prep_save(field.to_python(value), connection)
+    if value is None:
+        return None
+    return str(value)
+
+
+def _copy_from_buffer(cursor, sql: str, buffer: io.StringIO):
+    raw = cursor.cursor
+    if hasattr(raw, "copy_expert"):  # psycopg2
+        raw.copy_expert(sql, buffer)
+    else:  # psycopg 3
+        with raw.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def _copy_to_temp(cursor, payloads: Iterable[dict], connection, fields) -> str:
+    """Crea la tabla temporal y le manda los payloads con COPY por bloques."""
+    qn = connection.ops.quote_name
+    cols_sql = ", ".join(qn(f.column) for f in fields)
+    table = qn(BaseDeDatosBia._meta.db_table)
+    tmp = qn(TMP_TABLE)
+    copy_sql = f"COPY {tmp} ({cols_sql}) FROM STDIN WITH (FORMAT csv)"
+
+    cursor.execute(f"DROP TABLE IF EXISTS {tmp}")
+    cursor.execute(
+        f"CREATE TEMP TABLE {tmp} ON COMMIT DROP AS "
+        f"SELECT {cols_sql} FROM {table} WITH NO DATA"
+    )
+
+    def _flush(buffer, rows):
+        if rows:
+            buffer.seek(0)
+            _copy_from_buffer(cursor, copy_sql, buffer)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    pending = 0
+    for payload in payloads:
+        writer.writerow([
+            _to_copy_value(f, payload.get(f.attname, payload.get(f.name)), connection)
+            for f in fields
+        ])
+        pending += 1
+        if pending >= LOADER_BATCH_ROWS:
+            _flush(buffer, pending)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            pending = 0
+    _flush(buffer, pending)
+    return cols_sql
+
+
+def _copy_insert(payloads: Iterable[dict], using: str) -> int:
+    connection = connections[using]
+    fields = _insert_fields()
+    table = connection.ops.quote_name(BaseDeDatosBia._meta.db_table)
+    tmp = connection.ops.quote_name(TMP_TABLE)
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cols_sql = _copy_to_temp(cursor, payloads, connection, fields)
+        cursor.execute(f"INSERT INTO {table} ({cols_sql}) SELECT {cols_sql} FROM {tmp}")
+        inserted = cursor.rowcount
+        cursor.execute(f"DROP TABLE IF EXISTS {tmp}")
+    return inserted
+
+
+def _copy_upsert(payloads: Iterable[dict], using: str) -> tuple[int, int]:
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    fields = _insert_fields()
+    table = qn(BaseDeDatosBia._meta.db_table)
+    tmp = qn(TMP_TABLE)
+    key_col = qn(BaseDeDatosBia._meta.get_field(BUSINESS_KEY_FIELD).column)
+    set_sql = ", ".join(
+        f"{qn(f.column)} = COALESCE(EXCLUDED.{qn(f.column)}, {table}.{qn(f.column)})"
+        for f in fields if f.name not in MERGE_IMMUTABLE_FIELDS
+    )
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cols_sql = _copy_to_temp(cursor, payloads, connection, fields)
+        # xmax = 0 => la fila es nueva (INSERT); si no, vino del DO UPDATE
+        cursor.execute(
+            f"WITH upsert AS ("
+            f" INSERT INTO {table} ({cols_sql}) SELECT {cols_sql} FROM {tmp}"
+            f" ON CONFLICT ({key_col}) DO UPDATE SET {set_sql}"
+            f" RETURNING (xmax = 0) AS inserted"
+            f") SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM upsert"
+        )
+        inserted, updated = cursor.fetchone()
+        cursor.execute(f"DROP TABLE IF EXISTS {tmp}")
+    return int(inserted or 0), int(updated or 0)
+
+
+def _orm_insert(payloads: Iterable[dict], using: str) -> int:
+    fields = _insert_fields()
+    total = 0
+    batch = []
+    with transaction.atomic(using=using):
+        for payload in payloads:
+            obj = BaseDeDatosBia(**{
+                f.attname: payload.get(f.attname, payload.get(f.name)) for f in fields
+            })
+            batch.append(obj)
+            if len(batch) >= LOADER_BATCH_ROWS:
+                BaseDeDatosBia.objects.using(using).bulk_create(batch, batch_size=ORM_BATCH_SIZE)
+                total += len(batch)
+                batch = []
+        if batch:
+            BaseDeDatosBia.objects.using(using).bulk_create(batch, batch_size=ORM_BATCH_SIZE)
+            total += len(batch)
+    return total
+
+
+def bulk_insert_db_bia(payloads: Iterable[dict], *, using: str = "default") -> int:
+    """
+    Inserta los payloads en db_bia y devuelve la cantidad de filas insertadas.
+
+    Acepta cualquier iterable (lista o generador), así el llamador puede ir
+    produciendo filas sin materializar todas las instancias del modelo.
+    Todo se ejecuta en una transacción: o entran todas las filas o ninguna.
+    Nota: igual que bulk_create, no llama a save() (id_pago_unico debe venir asignado).
+    """
+    if _use_copy(using):
+        total = _copy_insert(payloads, using)
+    else:
+        total = _orm_insert(payloads, using)
+    # Después de escribir: fuera de atomic() la carga ya quedó confirmada; dentro, va al on_commit
+    touch_db_bia(using)
+    return total
+
+
+def _orm_upsert(payloads: Iterable[dict], using: str) -> tuple[int, int]:
+    """
+    Fallback sin PostgreSQL: nuevas con bulk_create, existentes con bulk_update
+    sólo de los campos que vienen con valor (mismo criterio que el COALESCE).
+    """
+    fields = _insert_fields()
+    updatable = [f for f in fields if f.name not in MERGE_IMMUTABLE_FIELDS]
+    payloads = list(payloads)
+    existentes = existing_rows((p.get(BUSINESS_KEY_FIELD) for p in payloads), using=using)
+
+    nuevos = []
+    cambiados = {}
+    campos = set()
+    for payload in payloads:
+        obj = existentes.get(str(payload.get(BUSINESS_KEY_FIELD)))
+        if obj is None:
+            nuevos.append(payload)
+            continue
+        for f in updatable:
+            value = payload.get(f.attname, payload.get(f.name))
+            if value is not None:
+                setattr(obj, f.attname, value)
+                campos.add(f.attname)
+        cambiados[obj.pk] = obj
+
+    with transaction.atomic(using=using):
+        inserted = _orm_insert(nuevos, using) if nuevos else 0
+        if cambiados and campos:
+            BaseDeDatosBia.objects.using(using).bulk_update(
+                list(cambiados.values()), sorted(campos), batch_size=ORM_BATCH_SIZE
+            )
+    return inserted, len(cambiados)
+
+
+def bulk_upsert_db_bia(payloads: Iterable[dict], *, using: str = "default") -> tuple[int, int]:
+    """
+    Modo merge: inserta las filas nuevas y actualiza las existentes por
+    id_pago_unico. Devuelve (insertadas, actualizadas).
+    Los payloads no deben repetir id_pago_unico (ON CONFLICT no puede tocar
+    dos veces la misma fila en una sentencia).
+    """
+    if _use_copy(using):
+        inserted, updated = _copy_upsert(payloads, using)
+    else:
+        inserted, updated = _orm_upsert(payloads, using)
+    touch_db_bia(using)
+    return inserted, updated
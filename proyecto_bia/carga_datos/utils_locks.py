@@ -0,0 +1,142 @@
+# carga_datos/utils_locks.py
+"""
+Locks por clave de negocio (id_pago_unico) para los commits de Modificar Masivo.
+
+Dos commits de jobs distintos que tocan claves distintas corren en paralelo;
+si se pisan, el segundo espera (hace cola) a que el primero confirme, y recién
+ahí lee las filas (que ya cambiaron: ver snapshot/revalidación en bulk_commit).
+
+PostgreSQL: advisory locks de transacción (pg_advisory_xact_lock), en dos niveles:
+  - rango: int(clave) // KEY_LOCK_RANGE_SIZE
+  - clave: la clave misma (crc32 si no es un entero chico)
+Un lote de hasta KEY_LOCK_MAX_KEYS claves toma el rango COMPARTIDO y cada clave
+EXCLUSIVA; un lote más grande toma sus rangos EXCLUSIVOS (no llena la tabla de
+locks del servidor con cientos de miles de entradas). Todo se pide en el mismo
+orden (rangos y después claves, ascendente), así dos commits no se bloquean
+mutuamente (deadlock). Se liberan solos con el commit/rollback.
+
+    with transaction.atomic():
+        bloquear_claves(claves_del_lote)
+        existentes = existing_rows(claves_del_lote)
+        ...
+
+Otros motores (sqlite en dev/tests): no hace nada (las escrituras ya van de a una).
+"""
+import logging
+import zlib
+from typing import Iterable
+
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.db.transaction import TransactionManagementError
+
+from .utils_keys import _claves_unicas
+
+logger = logging.getLogger('django.request')
+
+# Tope de locks por clave en una transacción (la tabla de locks de PostgreSQL es de
+# max_locks_per_transaction * max_connections entradas, 6400 con la config default)
+KEY_LOCK_MAX_KEYS = int(getattr(settings, "BIA_BULK_KEY_LOCK_MAX_KEYS", 1000))
+KEY_LOCK_RANGE_SIZE = int(getattr(settings, "BIA_BULK_KEY_LOCK_RANGE_SIZE", 100000))
+# Segundos que un commit espera claves tomadas por otro antes de rendirse
+KEY_LOCK_TIMEOUT = int(getattr(settings, "BIA_BULK_KEY_LOCK_TIMEOUT", 120))
+
+# Primer entero de pg_advisory_xact_lock(int, int): separa estos locks de cualquier otro uso
+LOCK_NS_RANGO = 0x42494131  # "BIA1"
+LOCK_NS_CLAVE = 0x42494132  # "BIA2"
+
+INT4_MAX = 0x7FFFFFFF
+SQLSTATE_LOCK_TIMEOUT = "55P03"
+
+
+class ClavesEnUso(Exception):
+    """Otro commit tiene claves de este lote y no las soltó en KEY_LOCK_TIMEOUT segundos."""
+
+
+def _id_clave(clave: str) -> int:
+    if clave.isdigit() and int(clave) <= INT4_MAX:
+        return int(clave)
+    return zlib.crc32(clave.encode()) & INT4_MAX
+
+
+def _id_rango(clave: str) -> int:
+    if clave.isdigit():
+        return (int(clave) // KEY_LOCK_RANGE_SIZE) & INT4_MAX
+    return zlib.crc32(clave.encode()) & INT4_MAX
+
+
+def _locks(claves: list[str]) -> list[tuple[int, int, bool]]:
+    """[(namespace, id, compartido)] en el orden en que se piden."""
+    rangos = sorted({_id_rango(k) for k in claves})
+    if len(claves) > KEY_LOCK_MAX_KEYS:
+        return [(LOCK_NS_RANGO, r, False) for r in rangos]
+    return (
+        [(LOCK_NS_RANGO, r, True) for r in rangos]
+        + [(LOCK_NS_CLAVE, i, False) for i in sorted({_id_clave(k) for k in claves})]
+    )
+
+
+def _ocupados(cursor, arrays) -> int:
+    """Cuántos de los locks pedidos tiene ahora otra sesión en un modo incompatible."""
+    cursor.execute(
+        "SELECT count(*) FROM pg_locks l "
+        "JOIN unnest(%s::int4[], %s::int4[], %s::bool[]) AS t(ns, id, compartido) "
+        "  ON l.classid = t.ns::oid AND l.objid = t.id::oid "
+        "WHERE l.locktype = 'advisory' AND l.objsubid = 2 AND l.granted "
+        "  AND l.database = (SELECT oid FROM pg_database WHERE datname = current_database()) "
+        "  AND l.pid <> pg_backend_pid() "
+        "  AND (NOT t.compartido OR l.mode = 'ExclusiveLock')",
+        arrays,
+    )
+    return cursor.fetchone()[0]
+
+
+def bloquear_claves(keys: Iterable, *, using: str = "default") -> int:
+    """
+    Toma los locks de `keys` hasta el fin de la transacción en curso (tiene que
+    haber una: fuera de atomic() se soltarían enseguida). Si otro commit tiene
+    alguna, espera hasta KEY_LOCK_TIMEOUT segundos y después levanta ClavesEnUso
+    (la transacción queda abortada: hay que dejar que el atomic haga rollback).
+    Devuelve cuántos locks estaban tomados por otros al empezar (0 = sin espera).
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return 0
+    if not connection.in_atomic_block:
+        raise TransactionManagementError("bloquear_claves necesita una transacción (atomic).")
+    claves = _claves_unicas(keys)
+    if not claves:
+        return 0
+
+    locks = _locks(claves)
+    arrays = [list(col) for col in zip(*locks)]
+    with connection.cursor() as cursor:
+        ocupados = _ocupados(cursor, arrays)
+        if ocupados:
+            logger.info(
+                f"[locks] {ocupados} lock(s) de {len(locks)} en uso por otro commit; "
+                f"esperando hasta {KEY_LOCK_TIMEOUT}s."
+            )
+
+        cursor.execute("SELECT current_setting('lock_timeout')")
+        previo = cursor.fetchone()[0]
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", [f"{KEY_LOCK_TIMEOUT}s"])
+        try:
+            # unnest devuelve las filas en el orden del array: los locks se piden en orden
+            cursor.execute(
+                "SELECT CASE WHEN t.compartido THEN pg_advisory_xact_lock_shared(t.ns, t.id) "
+                "            ELSE pg_advisory_xact_lock(t.ns, t.id) END "
+                "FROM unnest(%s::int4[], %s::int4[], %s::bool[]) AS t(ns, id, compartido)",
+                arrays,
+            )
+            cursor.fetchall()
+        except OperationalError as e:
+            causa = e.__cause__
+            if (getattr(causa, "pgcode", None) or getattr(causa, "sqlstate", None)) != SQLSTATE_LOCK_TIMEOUT:
+                raise
+            raise ClavesEnUso(
+                f"Hay claves de este lote tomadas por otro commit desde hace más de {KEY_LOCK_TIMEOUT}s; "
+                "reintentá cuando termine."
+            ) from e
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", [previo])
+    return ocupados
@@ -0,0 +1,149 @@
+# carga_datos/utils_parallel.py
+"""
+Modo paralelo (opt-in) para normalizar/validar uploads grandes en varios cores.
+
+- BIA_PARALLEL_WORKERS: cantidad de procesos (0/1 = desactivado, default).
+  Ops lo ajusta al tamaño del contenedor.
+- BIA_PARALLEL_MIN_ROWS: por debajo de esta cantidad de filas no conviene
+  pagar el arranque de procesos; se hace en serie.
+- BIA_PARALLEL_SHARD_ROWS: filas por rango (shard) enviado a cada proceso.
+
+Sólo para requests web / modo sincrónico: dentro de una tarea Celery o de un
+proceso daemon (los hijos del pool prefork lo son) siempre se hace en serie,
+un daemon no puede tener procesos hijos.
+
+Las funciones que se mandan a los workers tienen que ser de nivel módulo
+(picklables) y NO deben tocar la base: el worker hereda (fork) o arma
+(spawn) el entorno Django sólo para usar _meta de modelos / validadores.
+Los resultados siempre vuelven en el mismo orden de entrada.
+"""
+import logging
+import multiprocessing
+import os
+from collections import deque
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+import pandas as pd
+from django.conf import settings
+
+logger = logging.getLogger('django.request')
+
+PARALLEL_WORKERS = int(getattr(settings, "BIA_PARALLEL_WORKERS", 0))
+PARALLEL_MIN_ROWS = int(getattr(settings, "BIA_PARALLEL_MIN_ROWS", 50000))
+PARALLEL_SHARD_ROWS = int(getattr(settings, "BIA_PARALLEL_SHARD_ROWS", 10000))
+
+
+def _init_worker(settings_module: str | None):
+    """Con spawn/forkserver el proceso arranca limpio: inicializamos Django."""
+    if settings_module:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    from django.apps import apps
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def _sin_procesos_hijos() -> bool:
+    """True si este proceso no debe abrir un pool: daemon o ejecutando una tarea Celery."""
+    if multiprocessing.current_process().daemon:
+        return True
+    try:
+        # El pool prefork de Celery usa billiard (su propio current_process)
+        from billiard.process import current_process as billiard_process
+        from celery import current_task
+    except ImportError:
+        return False
+    return bool(billiard_process().daemon) or bool(current_task)
+
+
+def parallel_workers(total_rows: int | None = None, workers: int | None = None) -> int:
+    """
+    Procesos a usar (1 = en serie). Respeta el opt-in por settings y el
+    mínimo de filas para que valga la pena. En serie dentro de Celery / daemons.
+    """
+    workers = PARALLEL_WORKERS if workers is None else int(workers)
+    if workers <= 1:
+        return 1
+    if _sin_procesos_hijos():
+        return 1
+    if total_rows is not None and total_rows < PARALLEL_MIN_ROWS:
+        return 1
+    return min(workers, os.cpu_count() or workers)
+
+
+def _executor(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(os.environ.get("DJANGO_SETTINGS_MODULE"),),
+    )
+
+
+def imap_ordered(func: Callable, items: Iterable, *, workers: int = 1) -> Iterator:
+    """
+    Como map(func, items) pero repartido en `workers` procesos.
+    Mantiene el orden y una ventana acotada de tareas en vuelo (no lee todo
+    `items` de golpe, así sirve para iterar el staging bloque a bloque).
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    window = workers * 2
+    executor = _executor(workers)
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def map_row_shards(
+    func: Callable[[pd.DataFrame], list],
+    df: pd.DataFrame,
+    *,
+    workers: int = 1,
+    shard_rows: int | None = None,
+) -> list:
+    """
+    Parte df en rangos de filas, aplica func(shard) -> list en paralelo y
+    concatena los resultados en el orden original.
+    """
+    if df is None or df.empty:
+        return []
+    if workers <= 1:
+        return list(func(df))
+
+    shard_rows = int(shard_rows or PARALLEL_SHARD_ROWS)
+    shards = (df.iloc[start:start + shard_rows] for start in range(0, len(df), shard_rows))
+    logger.info(f"Procesando {len(df)} filas en paralelo ({workers} procesos, shards de {shard_rows}).")
+    out = []
+    for part in imap_ordered(func, shards, workers=workers):
+        out.extend(part)
+    return out
+
+
+def map_chunks(func: Callable[[pd.DataFrame], list], chunks: Iterable[pd.DataFrame], *, workers: int | None = None) -> Iterator:
+    """
+    imap_ordered para los bloques de un archivo leído en streaming (total
+    desconocido): se leen bloques hasta PARALLEL_MIN_ROWS filas para decidir
+    si conviene paralelizar y el resto se procesa a medida que se lee.
+    Devuelve func(bloque) por bloque, en orden.
+    """
+    chunks = iter(chunks)
+    head = []
+    rows = 0
+    for chunk in chunks:
+        head.append(chunk)
+        rows += len(chunk)
+        if rows >= PARALLEL_MIN_ROWS:
+            break
+    yield from imap_ordered(func, chain(head, chunks), workers=parallel_workers(rows, workers))
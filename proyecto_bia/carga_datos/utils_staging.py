@@ -0,0 +1,251 @@
+# carga_datos/utils_staging.py
+"""
+Staging binario de uploads (paso PREVIEW -> paso CONFIRMAR).
+
+Cada upload_id se guarda en dos archivos dentro de TEMP_UPLOAD_DIR:
+- <upload_id>.frames : secuencia de DataFrames ya limpios y mapeados al modelo,
+                       serializados uno detrás de otro con pickle (un frame por
+                       bloque leído), conservando dtypes.
+- <upload_id>.json   : metadatos (columnas, mapeo de columnas, cantidad de filas,
+                       bloques, archivo de origen).
+
+Así la confirmación lee los bloques directamente, sin volver a parsear un CSV,
+sin re-validar columnas y sin convertir todo a string.
+
+Con preview rápida (ver carga_preview) el staging se arma en background; mientras
+tanto existen además:
+- <upload_id>.upload<ext> : archivo original tal cual se subió.
+- <upload_id>.pending     : marca "procesando" (source_name, created_at).
+- <upload_id>.error       : mensaje si el staging en background falló.
+"""
+import json
+import logging
+import pickle
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger('django.request')
+
+STAGING_FORMAT = "frames-pickle-v1"
+
+# Directorio de uploads temporales para cargas masivas
+TEMP_UPLOAD_DIR = Path(
+    getattr(settings, "BIA_TEMP_UPLOAD_DIR", Path(getattr(settings, "BASE_DIR", ".")) / "temp_uploads")
+)
+
+
+def _ensure_temp_upload_dir():
+    try:
+        TEMP_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    except Exception as e:
+        logger.exception(f"No se pudo crear TEMP_UPLOAD_DIR: {e}")
+        raise
+
+
+def _is_safe_upload_id(upload_id: str) -> bool:
+    # upload_id lo generamos con uuid4().hex: evitamos rutas arbitrarias
+    return bool(upload_id) and upload_id.isalnum()
+
+
+def _frames_path(upload_id: str) -> Path:
+    return TEMP_UPLOAD_DIR / f"{upload_id}.frames"
+
+
+def _meta_path(upload_id: str) -> Path:
+    return TEMP_UPLOAD_DIR / f"{upload_id}.json"
+
+
+def _pending_path(upload_id: str) -> Path:
+    return TEMP_UPLOAD_DIR / f"{upload_id}.pending"
+
+
+def _error_path(upload_id: str) -> Path:
+    return TEMP_UPLOAD_DIR / f"{upload_id}.error"
+
+
+def _raw_paths(upload_id: str) -> list[Path]:
+    if not TEMP_UPLOAD_DIR.exists():
+        return []
+    return list(TEMP_UPLOAD_DIR.glob(f"{upload_id}.upload*"))
+
+
+class StagedUploadWriter:
+    """
+    Escribe un upload en staging bloque a bloque.
+
+        with StagedUploadWriter(upload_id, columna_map=..., source_name=...) as w:
+            for df in bloques:
+                w.write(df)
+
+    Si ocurre una excepción dentro del with, se borran los archivos parciales.
+    """
+
+    def __init__(self, upload_id: str, *, columna_map: dict | None = None, source_name: str = ""):
+        if not _is_safe_upload_id(upload_id):
+            raise ValueError(f"upload_id inválido: {upload_id!r}")
+        _ensure_temp_upload_dir()
+        self.upload_id = upload_id
+        self.columna_map = dict(columna_map or {})
+        self.source_name = source_name
+        self.columns: list[str] = []
+        self.total_rows = 0
+        self.chunks = 0
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = _frames_path(self.upload_id).open("wb")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._fh.close()
+            delete_staged_upload(self.upload_id)
+            return False
+        self.close()
+        return False
+
+    def write(self, df: pd.DataFrame):
+        if df is None or df.empty:
+            return
+        if not self.columns:
+            self.columns = [str(c) for c in df.columns]
+        pickle.dump(df.reset_index(drop=True), self._fh, protocol=pickle.HIGHEST_PROTOCOL)
+        self.total_rows += int(len(df))
+        self.chunks += 1
+
+    def close(self):
+        if self._fh is None or self._fh.closed:
+            return
+        self._fh.close()
+        meta = {
+            "format": STAGING_FORMAT,
+            "upload_id": self.upload_id,
+            "source_name": self.source_name,
+            "columns": self.columns,
+            "columna_map": self.columna_map,
+            "total_rows": self.total_rows,
+            "chunks": self.chunks,
+            "created_at": timezone.now().isoformat(),
+        }
+        _meta_path(self.upload_id).write_text(json.dumps(meta), encoding="utf-8")
+
+
+def read_staged_meta(upload_id: str) -> dict | None:
+    """Metadatos del upload o None si no existe / expiró / formato desconocido."""
+    if not _is_safe_upload_id(upload_id):
+        return None
+    meta_path = _meta_path(upload_id)
+    if not meta_path.exists() or not _frames_path(upload_id).exists():
+        return None
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except Exception as e:
+        logger.warning(f"Metadatos de staging ilegibles para upload_id={upload_id}: {e}")
+        return None
+    if meta.get("format") != STAGING_FORMAT:
+        return None
+    return meta
+
+
+def iter_staged_frames(upload_id: str) -> Iterator[pd.DataFrame]:
+    """Itera los bloques (DataFrames tipados) guardados para el upload."""
+    with _frames_path(upload_id).open("rb") as fh:
+        while True:
+            try:
+                yield pickle.load(fh)
+            except EOFError:
+                return
+
+
+# ---------- Staging en background (preview rápida) ----------
+
+def save_raw_upload(upload_id: str, archivo, extension: str) -> Path:
+    """Copia el archivo subido a TEMP_UPLOAD_DIR para procesarlo después."""
+    if not _is_safe_upload_id(upload_id):
+        raise ValueError(f"upload_id inválido: {upload_id!r}")
+    _ensure_temp_upload_dir()
+    path = TEMP_UPLOAD_DIR / f"{upload_id}.upload{extension}"
+    archivo.seek(0)
+    with path.open("wb") as fh:
+        if hasattr(archivo, "chunks"):
+            for block in archivo.chunks():
+                fh.write(block)
+        else:
+            fh.write(archivo.read())
+    return path
+
+
+def raw_upload_path(upload_id: str) -> Path | None:
+    paths = _raw_paths(upload_id) if _is_safe_upload_id(upload_id) else []
+    return paths[0] if paths else None
+
+
+def mark_staging_pending(upload_id: str, *, source_name: str = "", columna_map: dict | None = None):
+    _ensure_temp_upload_dir()
+    data = {
+        "source_name": source_name,
+        "columna_map": dict(columna_map or {}),
+        "created_at": timezone.now().isoformat(),
+    }
+    _pending_path(upload_id).write_text(json.dumps(data), encoding="utf-8")
+
+
+def read_staging_pending(upload_id: str) -> dict | None:
+    if not _is_safe_upload_id(upload_id) or not _pending_path(upload_id).exists():
+        return None
+    try:
+        return json.loads(_pending_path(upload_id).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def mark_staging_done(upload_id: str):
+    """Fin del staging en background: se borran la marca y el archivo original."""
+    for path in [_pending_path(upload_id), *_raw_paths(upload_id)]:
+        try:
+            path.unlink(missing_ok=True)
+        except Exception as e:
+            logger.warning(f"No se pudo borrar archivo temporal {path}: {e}")
+
+
+def mark_staging_failed(upload_id: str, mensaje: str):
+    _error_path(upload_id).write_text(str(mensaje), encoding="utf-8")
+    mark_staging_done(upload_id)
+
+
+def staging_status(upload_id: str) -> dict:
+    """
+    Estado del staging de un upload:
+    - 'listo'       : se puede confirmar (incluye total_rows)
+    - 'procesando'  : staging en background todavía corriendo
+    - 'error'       : falló el staging en background (incluye error)
+    - 'inexistente' : no existe / expiró
+    """
+    meta = read_staged_meta(upload_id)
+    if meta is not None:
+        return {"estado": "listo", "total_rows": int(meta.get("total_rows") or 0)}
+    if not _is_safe_upload_id(upload_id):
+        return {"estado": "inexistente"}
+    if _error_path(upload_id).exists():
+        return {"estado": "error", "error": _error_path(upload_id).read_text(encoding="utf-8")}
+    if _pending_path(upload_id).exists():
+        return {"estado": "procesando"}
+    return {"estado": "inexistente"}
+
+
+def delete_staged_upload(upload_id: str):
+    if not _is_safe_upload_id(upload_id):
+        return
+    paths = [
+        _frames_path(upload_id), _meta_path(upload_id),
+        _pending_path(upload_id), _error_path(upload_id), *_raw_paths(upload_id),
+    ]
+    for path in paths:
+        try:
+            path.unlink(missing_ok=True)
+        except Exception as e:
+            logger.warning(f"No se pudo borrar archivo temporal {path}: {e}")
@@ -0,0 +1,214 @@
+# carga_datos/utils_upload.py
+"""
+Lectura por bloques de archivos subidos (Excel/CSV).
+
+En lugar de cargar el archivo completo con pd.read_excel / pd.read_csv,
+se itera en DataFrames de a UPLOAD_CHUNK_ROWS filas para que el consumo
+de memoria del worker quede acotado sin importar el tamaño del archivo.
+
+CSV tipado: encoding (chardet) y delimitador (csv.Sniffer) se detectan UNA vez
+sobre una muestra, y a read_csv se le pasan dtype/parse_dates armados desde los
+campos de BaseDeDatosBia (CharField -> str, DateField -> fecha). Así DNI/CUIT/
+id_pago_unico llegan como texto ("007" sigue siendo "007", nada de 2054685741.0)
+y el archivo se parsea en una sola pasada.
+"""
+import codecs
+import csv
+import logging
+import os
+from itertools import islice
+from typing import Iterator
+
+import chardet
+import pandas as pd
+from django.conf import settings
+from django.db import models
+
+from .models import BaseDeDatosBia
+from .views_helpers import mapear_columnas
+
+logger = logging.getLogger('django.request')
+
+# Filas por bloque al leer uploads grandes
+UPLOAD_CHUNK_ROWS = int(getattr(settings, "BIA_UPLOAD_CHUNK_ROWS", 20000))
+
+# Muestra (bytes) para detectar encoding y delimitador del CSV
+CSV_SNIFF_BYTES = int(getattr(settings, "BIA_CSV_SNIFF_BYTES", 256 * 1024))
+
+_CSV_DELIMITERS = ",;\t|"
+
+
+def upload_extension(archivo) -> str:
+    return os.path.splitext(getattr(archivo, "name", "") or "")[1].lower()
+
+
+def _header_names(row) -> list[str]:
+    """
+    Arma los nombres de columnas igual que pandas:
+    - celdas vacías -> 'Unnamed: N'
+    - repetidos -> 'col', 'col.1', 'col.2', ...
+    - se descartan celdas vacías al final del encabezado
+    """
+    values = list(row or [])
+    while values and (values[-1] is None or str(values[-1]).strip() == ""):
+        values.pop()
+
+    names = []
+    seen = {}
+    for i, v in enumerate(values):
+        if v is None or str(v).strip() == "":
+            name = f"Unnamed: {i}"
+        else:
+            name = str(v)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _sniff_csv(archivo) -> tuple[str, str]:
+    """
+    Detecta (encoding, delimitador) leyendo sólo una muestra del archivo.
+    - BOM UTF-8 -> utf-8-sig; ascii -> utf-8; sin resultado -> latin1.
+    - Delimitador entre , ; TAB | (default ',').
+    """
+    archivo.seek(0)
+    sample = archivo.read(CSV_SNIFF_BYTES)
+    archivo.seek(0)
+
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding = "utf-8-sig"
+    else:
+        encoding = (chardet.detect(sample).get("encoding") or "latin1").lower()
+        if encoding == "ascii":
+            encoding = "utf-8"
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        encoding = "latin1"
+
+    # La muestra puede cortar un carácter multibyte al final: ignoramos ese resto
+    text = sample.decode(encoding, errors="ignore")
+    lines = text.splitlines()[:50]
+    if len(sample) >= CSV_SNIFF_BYTES and len(lines) > 1:
+        lines = lines[:-1]  # última línea posiblemente incompleta
+    try:
+        delimiter = csv.Sniffer().sniff("\n".join(lines), delimiters=_CSV_DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ","
+    return encoding, delimiter
+
+
+def csv_read_options(columns) -> dict:
+    """
+    dtype/parse_dates para read_csv a partir de los campos del modelo.
+    Las columnas se matchean con el mismo criterio que mapear_columnas
+    (nombres normalizados); las que no son del modelo se infieren como siempre.
+    """
+    fields = {f.name: f for f in BaseDeDatosBia._meta.concrete_fields}
+    dtype = {}
+    parse_dates = []
+    for col, campo in mapear_columnas(columns).items():
+        field = fields.get(campo)
+        if field is None or field.is_relation:
+            continue
+        if isinstance(field, models.DateTimeField):
+            continue
+        if isinstance(field, models.DateField):
+            parse_dates.append(col)
+        elif isinstance(field, (models.CharField, models.TextField)):
+            dtype[col] = str
+    return {"dtype": dtype, "parse_dates": parse_dates, "date_format": "ISO8601"}
+
+
+def _iter_xlsx(archivo, chunk_rows: int) -> tuple[list[str], Iterator[pd.DataFrame]]:
+    from openpyxl import load_workbook
+
+    archivo.seek(0)
+    wb = load_workbook(archivo, read_only=True, data_only=True)
+    ws = wb.worksheets[0]
+    rows = ws.iter_rows(values_only=True)
+    columns = _header_names(next(rows, None))
+    width = len(columns)
+
+    def _chunks():
+        try:
+            while width:
+                block = list(islice(rows, chunk_rows))
+                if not block:
+                    break
+                data = [
+                    tuple(r[:width]) + (None,) * (width - len(r))
+                    for r in block
+                ]
+                yield pd.DataFrame.from_records(data, columns=columns)
+        finally:
+            wb.close()
+
+    return columns, _chunks()
+
+
+def _iter_csv(archivo, chunk_rows: int) -> tuple[list[str], Iterator[pd.DataFrame]]:
+    encoding, delimiter = _sniff_csv(archivo)
+    columns = [
+        str(c) for c in
+        pd.read_csv(archivo, nrows=0, encoding=encoding, sep=delimiter).columns
+    ]
+    options = csv_read_options(columns)
+    if delimiter == ";":
+        # CSV "regional" (Excel es-AR): ; como separador y , como decimal
+        options["decimal"] = ","
+
+    def _chunks():
+        archivo.seek(0)
+        yield from pd.read_csv(
+            archivo,
+            chunksize=chunk_rows,
+            encoding=encoding,
+            sep=delimiter,
+            **options,
+        )
+
+    return columns, _chunks()
+
+
+def read_csv_typed(archivo) -> pd.DataFrame:
+    """CSV completo (tipado y con dialecto detectado) en un solo DataFrame."""
+    columns, chunks = _iter_csv(archivo, UPLOAD_CHUNK_ROWS)
+    frames = list(chunks)
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _iter_whole(archivo, chunk_rows: int) -> tuple[list[str], Iterator[pd.DataFrame]]:
+    """Fallback (.xls y otros): pandas lee todo y luego se entrega por bloques."""
+    archivo.seek(0)
+    df = pd.read_excel(archivo)
+    columns = [str(c) for c in df.columns]
+
+    def _chunks():
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+    return columns, _chunks()
+
+
+def read_upload_chunks(archivo, chunk_rows: int | None = None) -> tuple[list[str], Iterator[pd.DataFrame]]:
+    """
+    Abre un archivo subido (Excel/CSV) en modo streaming.
+
+    Devuelve (columnas, iterador de DataFrames). Las columnas se conocen
+    apenas se lee el encabezado, así se pueden validar antes de procesar
+    los bloques. Cada DataFrame trae como máximo `chunk_rows` filas.
+    """
+    chunk_rows = int(chunk_rows or UPLOAD_CHUNK_ROWS)
+    extension = upload_extension(archivo)
+    if extension == '.csv':
+        return _iter_csv(archivo, chunk_rows)
+    if extension in ('.xlsx', '.xlsm'):
+        return _iter_xlsx(archivo, chunk_rows)
+    return _iter_whole(archivo, chunk_rows)
@@ -1,7 +1,5 @@
 # carga_datos/views.py
-import os
 import logging
-import unicodedata
 import json
 import hashlib
 from io import StringIO
@@ -17,7 +15,6 @@ from django.core.exceptions import PermissionDenied  # ⬅️ agregado
 from django.db import IntegrityError, transaction
 from django.db.models import Q
 from django.core.validators import RegexValidator
-from django.apps import apps  # import perezoso de modelos de otras apps
 from django.conf import settings
 
 from rest_framework import status
@@ -34,11 +31,32 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from .forms import ExcelUploadForm
 from .models import (
     BaseDeDatosBia,
-    allocate_id_pago_unico_block,
     ExportJobBia,        # ⬅️ NUEVO modelo para exportaciones asíncronas
+    CargaJobBia,         # confirmación de carga en background
+    touch_db_bia,
 )
 from .serializers import BaseDeDatosBiaSerializer
-from .views_helpers import limpiar_valor  # si ya lo tenés
+from .views_helpers import (
+    validar_columnas_obligatorias,
+    df_drop_blank_rows,
+    mapear_columnas,
+    _limpiar_chunk,
+    CREATE_MISSING_ENTIDADES,
+    _es_verdadero,
+)
+from .utils_upload import read_upload_chunks, upload_extension
+from .utils_entidades import EntidadResolver
+from .utils_cleaning import strip_strings, coerce_model_fields, frame_to_records
+from .utils_staging import (
+    StagedUploadWriter,
+    read_staged_meta,
+    delete_staged_upload,
+    save_raw_upload,
+    mark_staging_pending,
+    staging_status,
+)
+from .carga_preview import PREVIEW_ROWS, FAST_PREVIEW, stage_chunks, read_preview, stage_raw_upload
+from .utils_cache import file_sha256, cached_upload, remember_upload
 
 # ⬇️ permisos backend
 from .permissions import (
@@ -49,6 +67,8 @@ from .permissions import (
 )
 
 from .tasks import exportar_db_bia_job  # ⬅️ NUEVA tarea Celery de exportación
+from .tasks import confirmar_carga_job, preparar_staging_job
+from .carga_confirmacion import CargaError, confirmar_upload
 
 
 logger = logging.getLogger('django.request')
@@ -64,22 +84,6 @@ from django.utils import timezone
 # =========================
 # CONFIGURACIÓN IMPORTANTE
 # =========================
-# Si True: si no existe la Entidad (por propietario o entidadinterna), se crea automáticamente.
-CREATE_MISSING_ENTIDADES = True
-
-# (Opcional) Exigir clave en confirmación para considerar válida la fila.
-# Si lo activás, sólo se aceptarán filas que tengan al menos DNI o id_pago_unico no vacío.
-REQUIRE_KEY_FOR_ROW = False
-KEY_FIELDS = ('dni', 'id_pago_unico')
-
-# Cantidad de filas a mostrar en la previsualización
-PREVIEW_ROWS = 10
-
-# Directorio de uploads temporales para cargas masivas
-TEMP_UPLOAD_DIR = Path(
-    getattr(settings, "BIA_TEMP_UPLOAD_DIR", Path(getattr(settings, "BASE_DIR", ".")) / "temp_uploads")
-)
-
 # Directorio para archivos de exportación masiva
 EXPORTS_DIR = Path(
     getattr(settings, "BIA_EXPORTS_DIR", Path(getattr(settings, "MEDIA_ROOT", ".")) / "exports")
@@ -93,161 +97,8 @@ def _ensure_exports_dir():
         raise
 
 # ========== UTILIDADES ==========
-
-def _strip_accents(s: str) -> str:
-    if s is None:
-        return ""
-    s = str(s)
-    return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
-
-def normalizar_columna(col):
-    """
-    Normaliza nombres de columnas para matchear contra campos del modelo:
-    - s/ tildes, puntos, guiones, guiones bajos, espacios
-    - upper
-    """
-    col = str(col).strip()
-    col = _strip_accents(col)
-    col = col.replace(".", "").replace("-", "").replace("_", "")
-    col = col.upper().replace(" ", "")
-    return col
-
-def normalizar_valor_nombre(valor: str) -> str:
-    """
-    Normaliza valores de 'propietario' / 'entidadinterna' para comparación:
-    - s/ tildes, espacios y puntuación común
-    - lower
-    """
-    s = _strip_accents((valor or "").strip())
-    for ch in ('.', '-', '_', ',', ';', ':', '/', '\\'):
-        s = s.replace(ch, '')
-    s = s.lower().replace(" ", "")
-    return s
-
-def validar_columnas_obligatorias(df_columns):
-    """
-    Verifica qué columnas del modelo faltan en el archivo.
-    Si querés que 'creditos' sea opcional, podés excluirlo aquí como ejemplo.
-    """
-    columnas_modelo = [f.name for f in BaseDeDatosBia._meta.fields if f.name != 'id']
-    # Ejemplo para hacer opcional:
-    # if 'creditos' in columnas_modelo:
-    #     columnas_modelo.remove('creditos')
-
-    columnas_modelo_norm = [normalizar_columna(c) for c in columnas_modelo]
-    columnas_excel_norm  = [normalizar_columna(c) for c in df_columns]
-
-    faltantes = []
-    for i, normalizada in enumerate(columnas_modelo_norm):
-        if normalizada not in columnas_excel_norm:
-            faltantes.append(columnas_modelo[i])
-    return faltantes
-
-# ---------- Helpers de limpieza de filas ----------
-def df_drop_blank_rows(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Elimina filas completamente vacías (None/NaN/''/espacios).
-    Evita que pandas cuente filas con formato/bordes como válidas.
-    """
-    if df is None or df.empty:
-        return df
-
-    # Normalizamos NaN -> None
-    df = df.where(pd.notnull(df), None)
-
-    # Considerar strings vacíos/espacios como vacíos
-    def _row_is_blank(row) -> bool:
-        for v in row:
-            if v is None:
-                continue
-            if isinstance(v, str):
-                if v.strip() != '':
-                    return False
-            else:
-                # Números/fechas/etc. cuentan como "no vacío"
-                return False
-        return True
-
-    mask = df.apply(_row_is_blank, axis=1)
-    return df.loc[~mask]
-
-def _row_is_blank_dict(d: dict) -> bool:
-    """
-    True si todas las celdas del dict están vacías (None/''/espacios).
-    """
-    if not isinstance(d, dict):
-        return True
-    for _, v in d.items():
-        if v is None:
-            continue
-        if isinstance(v, str):
-            if v.strip() != '':
-                return False
-        else:
-            # Números/fechas/etc. significan "no vacía"
-            return False
-    return True
-
-def _has_key_fields(d: dict) -> bool:
-    for k in KEY_FIELDS:
-        v = d.get(k)
-        if v is None:
-            continue
-        if str(v).strip() != '':
-            return True
-    return False
-
-# ==============================
-# RESOLVER FK ENTIDAD (OPCIÓN 3)
-# ==============================
-def _get_entidad_model():
-    """Importa Entidad de forma perezosa para evitar ciclos de import."""
-    return apps.get_model('certificado_ldd', 'Entidad')
-
-def _build_entidad_cache():
-    """
-    Devuelve un dict clave-normalizada -> Entidad
-    """
-    Entidad = _get_entidad_model()
-    cache = {}
-    for e in Entidad.objects.all():
-        cache[normalizar_valor_nombre(e.nombre)] = e
-    return cache
-
-def _resolver_entidad(propietario: str, entidadinterna: str, cache: dict, create_missing: bool):
-    """
-    Prioriza 'propietario'; si no, 'entidadinterna'.
-    Usa cache para no pegar mil consultas.
-    Si create_missing=True, crea Entidad cuando no exista.
-    """
-    Entidad = _get_entidad_model()
-
-    for candidato in (propietario, entidadinterna):
-        cand = (candidato or "").strip()
-        if not cand:
-            continue
-        key = normalizar_valor_nombre(cand)
-        if key in cache:
-            return cache[key]
-        if create_missing:
-            ent = Entidad.objects.create(nombre=cand, responsable="", cargo="")
-            cache[key] = ent
-            return ent
-    return None
-
-# ==============================
-# Helpers para uploads temporales
-# ==============================
-def _ensure_temp_upload_dir():
-    try:
-        TEMP_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-    except Exception as e:
-        logger.exception(f"No se pudo crear TEMP_UPLOAD_DIR: {e}")
-        raise
-
-def _get_temp_path(upload_id: str) -> Path:
-    _ensure_temp_upload_dir()
-    return TEMP_UPLOAD_DIR / f"{upload_id}.csv"
+# normalizar_columna / validar_columnas_obligatorias / mapear_columnas /
+# _limpiar_chunk viven en views_helpers (los usa también la tarea de staging).
 
 # ============== VISTAS WEB UI ==============
 @login_required
@@ -299,75 +150,58 @@ def cargar_excel(request):
         if form.is_valid():
             archivo = request.FILES['archivo']
             try:
-                extension = os.path.splitext(archivo.name)[1].lower()
-                if extension == '.csv':
-                    try:
-                        df = pd.read_csv(archivo)
-                    except UnicodeDecodeError:
-                        archivo.seek(0)
-                        df = pd.read_csv(archivo, encoding='latin1')
-                else:
-                    df = pd.read_excel(archivo)
+                # Lectura por bloques: la memoria queda acotada al tamaño del bloque
+                columnas_archivo, chunks = read_upload_chunks(archivo)
 
-                # 🔧 NUEVO: eliminar filas totalmente vacías antes de seguir
-                df = df_drop_blank_rows(df)
-                df = df.where(pd.notnull(df), None)
-
-                # Validación de columnas
-                faltantes = validar_columnas_obligatorias(list(df.columns))
+                # Validación de columnas (sólo requiere el encabezado)
+                faltantes = validar_columnas_obligatorias(columnas_archivo)
                 if faltantes:
                     errores = ["❌ Faltan columnas obligatorias en el archivo:"] + [f"- Faltante: {col}" for col in faltantes]
                     logger.info(f"[{request.user}] Faltan columnas en archivo '{archivo.name}': {faltantes}")
                     return render(request, 'upload_form.html', {'form': form, 'mensaje': "\n".join(errores)})
 
                 # Mapeo columnas Excel -> modelo
-                columnas_modelo = [f.name for f in BaseDeDatosBia._meta.fields if f.name != 'id']
-                columna_map = {}
-                for col in df.columns:
-                    col_norm = normalizar_columna(col)
-                    for campo in columnas_modelo:
-                        if normalizar_columna(campo) == col_norm:
-                            columna_map[col] = campo
-                            break
-                df.rename(columns=columna_map, inplace=True)
-
-                # 🔧 NUEVO: por si el rename generó columnas vacías, limpiar otra vez
-                df = df_drop_blank_rows(df)
-                df = df.where(pd.notnull(df), None)
-
-                # Resolver FK 'entidad' por fila (propietario -> entidadinterna)
-                entidad_cache = _build_entidad_cache()
+                columna_map = mapear_columnas(columnas_archivo)
+
+                # Resolver FK 'entidad' (propietario -> entidadinterna) por lotes, ver utils_entidades
+                entidades = EntidadResolver(create_missing=CREATE_MISSING_ENTIDADES)
                 columnas = [f.name for f in BaseDeDatosBia._meta.fields if f.name != 'id']
-                registros = []
-                for i in df.index:
-                    fila = {col: df.at[i, col] for col in columnas if col in df.columns}
-                    # Ignorar filas vacías defensivamente
-                    if _row_is_blank_dict(fila):
-                        continue
-                    ent = _resolver_entidad(
-                        fila.get('propietario'),
-                        fila.get('entidadinterna'),
-                        entidad_cache,
-                        CREATE_MISSING_ENTIDADES
-                    )
-
-                    # 🔧 NUEVO: garantizar fecha_apertura si falta/está vacía
-                    payload = {k: fila.get(k) for k in columnas if k != 'entidad'}
-                    if not payload.get('fecha_apertura'):
-                        payload['fecha_apertura'] = timezone.localdate()
-
-                    obj = BaseDeDatosBia(**payload)
-                    if ent:
-                        obj.entidad = ent
-                    registros.append(obj)
-
-                if not registros:
+                total_creados = 0
+                filas_leidas = 0
+                with transaction.atomic():
+                    for chunk in chunks:
+                        df = _limpiar_chunk(chunk, columna_map)
+                        if df is None or df.empty:
+                            continue
+
+                        # Tipado vectorizado por campo (fechas/decimales/enteros/texto)
+                        df, invalidos = coerce_model_fields(df, BaseDeDatosBia, row_offset=filas_leidas)
+                        if invalidos:
+                            raise ValueError("valores inválidos: " + "; ".join(invalidos))
+                        filas_leidas += len(df)
+
+                        # FK por bloque: faltantes en un bulk_create + mapeo vectorizado
+                        entidad_ids = entidades.entidad_ids(df)
+                        df = df.reindex(columns=[c for c in columnas if c != 'entidad'])
+                        # 🔧 NUEVO: garantizar fecha_apertura si falta/está vacía
+                        df['fecha_apertura'] = df['fecha_apertura'].astype(object).where(
+                            df['fecha_apertura'].notna(), timezone.localdate()
+                        )
+
+                        df['entidad_id'] = entidad_ids
+                        registros = [BaseDeDatosBia(**payload) for payload in frame_to_records(df)]
+
+                        if registros:
+                            # batch_size un poco más grande para rendimiento
+                            BaseDeDatosBia.objects.bulk_create(registros, batch_size=2000)
+                            touch_db_bia()
+                            total_creados += len(registros)
+
+                if not total_creados:
                     mensaje = "⚠️ No se encontraron filas válidas para insertar."
                 else:
-                    # batch_size un poco más grande para rendimiento
-                    BaseDeDatosBia.objects.bulk_create(registros, batch_size=2000)
-                    mensaje = f"✅ Se cargaron {len(registros)} registros."
-                    logger.info(f"[{request.user}] Cargó archivo '{archivo.name}' con {len(registros)} registros (web).")
+                    mensaje = f"✅ Se cargaron {total_creados} registros."
+                    logger.info(f"[{request.user}] Cargó archivo '{archivo.name}' con {total_creados} registros (web).")
 
             except Exception as e:
                 mensaje = f"❌ Error al procesar el archivo: {e}"
@@ -385,12 +219,21 @@ def api_cargar_excel(request):
     """
     Paso 1 (PREVIEW) para flujo React:
     - Recibe archivo Excel/CSV.
-    - Valida columnas.
-    - Limpia filas vacías.
+    - Valida columnas (a partir del encabezado).
+    - Lee, limpia y guarda el archivo por bloques (memoria acotada).
     - Genera SOLO una tabla HTML de las primeras PREVIEW_ROWS filas.
-    - Guarda el DF limpio en un CSV temporal en disco.
+    - Guarda los bloques limpios en staging binario (ver utils_staging).
     - Devuelve: success, preview, upload_id, total_rows.
 
+    Preview rápida (fast_preview=true o BIA_FAST_PREVIEW): sólo se leen el
+    encabezado y las primeras filas; se responde enseguida con
+    staging='procesando' y total_rows=None, y el staging completo se arma en
+    background bajo el mismo upload_id (polling en carga/upload-status/).
+
+    Si el mismo usuario vuelve a subir el mismo archivo (mismo SHA-256) y su
+    staging sigue disponible, se devuelve la preview y el upload_id anteriores
+    sin re-parsear (cached=true, ver utils_cache).
+
     El flujo legacy que usaba session['datos_cargados'] sigue disponible vía
     la vista web, pero el Portal BIA (React) se apoya en upload_id.
     """
@@ -404,23 +247,33 @@ def api_cargar_excel(request):
         logger.warning(f"[{request.user}] No se recibió archivo.")
         return Response({'success': False, 'errors': ['Archivo no recibido']}, status=400)
 
-    try:
-        extension = os.path.splitext(archivo.name)[1].lower()
-        if extension == '.csv':
-            try:
-                df = pd.read_csv(archivo)
-            except UnicodeDecodeError:
-                archivo.seek(0)
-                df = pd.read_csv(archivo, encoding='latin1')
-        else:
-            df = pd.read_excel(archivo)
+    fast = FAST_PREVIEW or _es_verdadero(request.data.get('fast_preview'))
 
-        # 🔧 NUEVO: sacar filas completamente vacías
-        df = df_drop_blank_rows(df)
-        df = df.where(pd.notnull(df), None)
-
-        # Validación de columnas
-        faltantes = validar_columnas_obligatorias(list(df.columns))
+    upload_id = None
+    try:
+        file_hash = file_sha256(archivo)
+        previo = cached_upload(file_hash, request.user)
+        if previo is not None:
+            estado = previo['estado']
+            logger.info(
+                f"[{request.user}] '{archivo.name}' ya estaba en staging: se reusa upload_id={previo['upload_id']}."
+            )
+            return Response({
+                'success': True,
+                'preview': previo.get('preview') or "",
+                'upload_id': previo['upload_id'],
+                'total_rows': estado.get('total_rows'),
+                'staging': estado['estado'],
+                'status_url': reverse("carga_datos:api_upload_status") + f"?upload_id={previo['upload_id']}",
+                'cached': True,
+            })
+
+        # Lectura por bloques (openpyxl read-only / read_csv chunksize).
+        # En modo rápido los bloques son de PREVIEW_ROWS filas y se corta enseguida.
+        columnas_archivo, chunks = read_upload_chunks(archivo, chunk_rows=PREVIEW_ROWS if fast else None)
+
+        # Validación de columnas (sólo requiere el encabezado)
+        faltantes = validar_columnas_obligatorias(columnas_archivo)
         if faltantes:
             errores = ["❌ Faltan columnas obligatorias en el archivo:"] + [
                 f"- Faltante: {col}" for col in faltantes
@@ -429,36 +282,58 @@ def api_cargar_excel(request):
             return Response({'success': False, 'errors': errores}, status=400)
 
         # Mapeo columnas Excel -> modelo
-        columnas_modelo = [f.name for f in BaseDeDatosBia._meta.fields if f.name != 'id']
-        columna_map = {}
-        for col in df.columns:
-            col_norm = normalizar_columna(col)
-            for campo in columnas_modelo:
-                if normalizar_columna(campo) == col_norm:
-                    columna_map[col] = campo
-                    break
-        df.rename(columns=columna_map, inplace=True)
-
-        # 🔧 NUEVO: limpiar nuevamente tras rename
-        df = df_drop_blank_rows(df)
-        df = df.where(pd.notnull(df), None)
-
-        if df.empty:
+        columna_map = mapear_columnas(columnas_archivo)
+        upload_id = uuid.uuid4().hex
+
+        if fast:
+            preview_df = read_preview(chunks, columna_map)
+            if preview_df is None or preview_df.empty:
+                return Response(
+                    {'success': False, 'errors': ['No hay filas válidas en el archivo.']},
+                    status=400
+                )
+
+            save_raw_upload(upload_id, archivo, upload_extension(archivo))
+            mark_staging_pending(upload_id, source_name=archivo.name, columna_map=columna_map)
+            try:
+                preparar_staging_job.delay(upload_id)
+            except Exception as e:
+                # Sin broker: armamos el staging acá mismo (comportamiento de siempre)
+                logger.warning(f"No se pudo encolar preparar_staging_job (upload_id={upload_id}): {e}")
+                stage_raw_upload(upload_id)
+
+            logger.info(
+                f"[{request.user}] Previsualización rápida de '{archivo.name}' (upload_id={upload_id})."
+            )
+            estado = staging_status(upload_id)
+            preview_html = preview_df.to_html(escape=False, index=False)
+            if estado['estado'] != 'error':
+                remember_upload(file_hash, request.user, upload_id=upload_id,
+                                preview=preview_html, source_name=archivo.name)
+            return Response({
+                'success': True,
+                'preview': preview_html,
+                'upload_id': upload_id,
+                'total_rows': estado.get('total_rows'),
+                'staging': estado['estado'],
+                'status_url': reverse("carga_datos:api_upload_status") + f"?upload_id={upload_id}",
+            })
+
+        # Volcar cada bloque limpio al staging binario
+        total_rows, preview_df = stage_chunks(
+            chunks, upload_id, columna_map=columna_map, source_name=archivo.name
+        )
+
+        if total_rows == 0:
+            delete_staged_upload(upload_id)
             return Response(
                 {'success': False, 'errors': ['No hay filas válidas en el archivo.']},
                 status=400
             )
 
-        total_rows = int(len(df))
-
-        # PREVIEW LIMITADA: solo primeras PREVIEW_ROWS filas
-        preview_df = df.head(PREVIEW_ROWS)
         preview_html = preview_df.to_html(escape=False, index=False)
-
-        # Generar upload_id y guardar DF limpio en CSV temporal
-        upload_id = uuid.uuid4().hex
-        temp_path = _get_temp_path(upload_id)
-        df.to_csv(temp_path, index=False)
+        remember_upload(file_hash, request.user, upload_id=upload_id,
+                        preview=preview_html, source_name=archivo.name)
 
         logger.info(
             f"[{request.user}] Previsualización cargada de '{archivo.name}' "
@@ -474,213 +349,230 @@ def api_cargar_excel(request):
 
     except Exception as e:
         logger.exception(f"[{request.user}] Error inesperado en carga: {e}")
+        if upload_id is not None:
+            delete_staged_upload(upload_id)
         return Response(
             {'success': False, 'errors': [f"Error al procesar archivo: {str(e)}"]},
             status=500
         )
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, CanUploadExcel])
+def api_upload_status(request):
+    """
+    Estado del staging de un upload (preview rápida):
+    GET ?upload_id=... -> {estado: listo|procesando|error|inexistente, total_rows?, error?}
+    """
+    upload_id = (request.GET.get('upload_id') or "").strip()
+    if not upload_id:
+        return Response({'success': False, 'error': 'Falta upload_id'}, status=400)
+    estado = staging_status(upload_id)
+    if estado['estado'] == 'inexistente':
+        return Response({'success': False, 'upload_id': upload_id, **estado}, status=404)
+    return Response({'success': True, 'upload_id': upload_id, **estado})
+
+def _stage_records_legacy(records: list) -> tuple[str | None, list[str]]:
+    """
+    Flujo legacy (records en body/sesión): limpia, valida columnas y deja
+    los datos en staging para confirmar igual que un upload_id.
+    Devuelve (upload_id, errores).
+    """
+    df = pd.DataFrame.from_records(records)
+    df = df_drop_blank_rows(strip_strings(df))
+
+    # Validar columnas nuevamente (defensivo)
+    faltantes = validar_columnas_obligatorias(list(df.columns))
+    if faltantes:
+        errores = ["❌ Faltan columnas obligatorias en el archivo (confirmación):"] + [
+            f"- Faltante: {col}" for col in faltantes
+        ]
+        return None, errores
+
+    # Mapeo columnas Excel -> modelo (por si hiciera falta)
+    columna_map = mapear_columnas(df.columns)
+    df = _limpiar_chunk(df, columna_map)
+
+    upload_id = uuid.uuid4().hex
+    with StagedUploadWriter(upload_id, columna_map=columna_map, source_name="records") as staged:
+        staged.write(df)
+    return upload_id, []
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, CanUploadExcel])  # ⬅️ permiso
 def api_confirmar_carga(request):
     """
     Paso 2 (CONFIRMAR) para flujo React:
     - Recibe upload_id (identificador del archivo procesado).
-    - Reabre el CSV temporal asociado.
-    - Vuelve a limpiar/verificar.
+    - Lee los bloques tipados del staging (ya limpios y mapeados).
     - Asigna id_pago_unico cuando falten.
     - Valida duplicados (payload y DB).
     - Resuelve FK 'entidad'.
-    - Inserta con bulk_create.
+    - Inserta con COPY (PostgreSQL) o bulk_create (fallback), ver utils_loader.
     - Borra el archivo temporal.
+    (La lógica vive en carga_confirmacion.confirmar_upload.)
+
+    Con background=true no inserta en la request: crea un CargaJobBia, encola
+    la tarea Celery y responde 202 con job_id (polling en carga/job-status/).
+    Si un job en background de este upload falló con filas ya cargadas, se
+    reencola ese mismo job (con su merge) y sigue desde processed_rows, aunque
+    no venga background=true.
+
+    Con merge=true los id_pago_unico que ya existen en db_bia se actualizan
+    (upsert) en lugar de rechazar el archivo; la respuesta trae created_count
+    y updated_count por separado.
 
     Para compatibilidad mínima con el flujo legacy, si no viene upload_id
     se intenta leer 'records' desde request.data o session, aunque se recomienda
     que el Portal React use SIEMPRE upload_id.
     """
     upload_id = (request.data.get('upload_id') or "").strip()
+    background = _es_verdadero(request.data.get('background'))
+    merge = _es_verdadero(request.data.get('merge'))
 
     # Compatibilidad backward mínima (legacy: records en body o sesión)
     if not upload_id:
         records_legacy = request.data.get('records', []) or request.session.get('datos_cargados', [])
         if records_legacy:
             # Reusar la lógica anterior a partir de records directamente
-            records = [r for r in (records_legacy or []) if not _row_is_blank_dict(r)]
+            # (las filas vacías se descartan al limpiar, ver _stage_records_legacy)
+            records = list(records_legacy)
         else:
             return Response({'success': False, 'error': 'Falta upload_id o datos para confirmar'}, status=400)
-        df = pd.DataFrame.from_records(records)
-    else:
-        temp_path = _get_temp_path(upload_id)
-        if not temp_path.exists():
-            return Response(
-                {'success': False, 'error': f'Upload no encontrado o expirado (upload_id={upload_id}).'},
-                status=400
-            )
         try:
-            df = pd.read_csv(temp_path)
+            upload_id, errores = _stage_records_legacy(records)
         except Exception as e:
-            logger.exception(f"[{request.user}] Error leyendo CSV temporal {temp_path}: {e}")
-            return Response(
-                {'success': False, 'error': f'Error al leer el archivo temporal: {str(e)}'},
-                status=500
-            )
-
-    try:
-        df = df_drop_blank_rows(df)
-        df = df.where(pd.notnull(df), None)
-
-        # Validar columnas nuevamente (defensivo)
-        faltantes = validar_columnas_obligatorias(list(df.columns))
-        if faltantes:
-            errores = ["❌ Faltan columnas obligatorias en el archivo (confirmación):"] + [
-                f"- Faltante: {col}" for col in faltantes
-            ]
+            logger.exception(f"[{request.user}] Error preparando records legacy: {e}")
+            return Response({'success': False, 'error': f'Error al confirmar carga: {str(e)}'}, status=500)
+        if errores:
             return Response({'success': False, 'error': "; ".join(errores)}, status=400)
 
-        # Mapeo columnas Excel -> modelo (por si hiciera falta)
-        columnas_modelo = [f.name for f in BaseDeDatosBia._meta.fields if f.name != 'id']
-        columna_map = {}
-        for col in df.columns:
-            col_norm = normalizar_columna(col)
-            for campo in columnas_modelo:
-                if normalizar_columna(campo) == col_norm:
-                    columna_map[col] = campo
-                    break
-        if columna_map:
-            df.rename(columns=columna_map, inplace=True)
-            df = df_drop_blank_rows(df)
-            df = df.where(pd.notnull(df), None)
-
-        # Convertir DF en records para reutilizar lógica
-        records = df.astype(str).where(pd.notnull(df), None).to_dict(orient='records')
-
-        # 🔧 Filtrar dicts "vacíos"
-        records = [r for r in records if not _row_is_blank_dict(r)]
-        if REQUIRE_KEY_FOR_ROW:
-            records = [r for r in records if _has_key_fields(r)]
-        if not records:
-            return Response({'success': False, 'error': 'Todas las filas están vacías o sin claves requeridas.'}, status=400)
-
-        columnas = [f.name for f in BaseDeDatosBia._meta.fields if f.name != 'id']
-
-        # 1) Normalizar + detectar faltantes de id_pago_unico
-        normalized = []
-        missing_indexes = []
-        for idx, item in enumerate(records):
-            row = dict(item or {})
-            raw_idp = (row.get('id_pago_unico') or '').strip()
-            if raw_idp == '':
-                missing_indexes.append(idx)
-            else:
-                if not raw_idp.isdigit():
-                    return Response(
-                        {'success': False, 'error': f'id_pago_unico inválido en fila {idx+1}: "{raw_idp}" (solo dígitos)'},
-                        status=400
-                    )
-            normalized.append(row)
-
-        # 2) Asignar bloque para faltantes
-        if missing_indexes:
-            new_ids = allocate_id_pago_unico_block(len(missing_indexes))
-            for i, new_id in zip(missing_indexes, new_ids):
-                normalized[i]['id_pago_unico'] = new_id
-
-        # 3) Duplicados dentro del payload (optimizado O(n))
-        idps = [str(r.get('id_pago_unico')).strip() for r in normalized]
-        seen = set()
-        dup_in_payload = set()
-        for x in idps:
-            if x in seen:
-                dup_in_payload.add(x)
-            else:
-                seen.add(x)
-
-        if dup_in_payload:
-            return Response(
-                {
-                    'success': False,
-                    'error': f'id_pago_unico duplicado en el archivo: {", ".join(sorted(dup_in_payload))}'
-                },
-                status=400
-            )
-
-        # 4) Duplicados contra la DB
-        existing = set(
-            BaseDeDatosBia.objects.filter(id_pago_unico__in=idps).values_list('id_pago_unico', flat=True)
+    estado = staging_status(upload_id)
+    if estado['estado'] == 'procesando':
+        return Response(
+            {'success': False, 'estado': 'procesando',
+             'error': 'El archivo todavía se está procesando; reintentá en unos segundos.'},
+            status=409
         )
-        if existing:
-            existing_str = {str(x) for x in existing}
-            return Response(
-                {
-                    'success': False,
-                    'error': f'id_pago_unico ya existente en base: {", ".join(sorted(existing_str))}'
-                },
-                status=400
-            )
-
-        # 5) Construcción de objetos + resolución de FK
-        entidad_cache = _build_entidad_cache()
-        to_create = []
-        for row in normalized:
-            payload = {}
-            for col in columnas:
-                if col == 'entidad':
-                    continue
-                if 'limpiar_valor' in globals():
-                    payload[col] = limpiar_valor(row.get(col))
-                else:
-                    payload[col] = row.get(col)
-
-            # Ignorar defensivamente filas que quedaron "vacías" luego de limpiar
-            if _row_is_blank_dict(payload):
-                continue
+    if estado['estado'] == 'error':
+        return Response({'success': False, 'estado': 'error', 'error': estado.get('error')}, status=400)
 
-            # 🔧 NUEVO: garantizar fecha_apertura si falta/está vacía
-            if not payload.get('fecha_apertura'):
-                payload['fecha_apertura'] = timezone.localdate()
+    meta = read_staged_meta(upload_id)
+    if meta is None:
+        return Response(
+            {'success': False, 'error': f'Upload no encontrado o expirado (upload_id={upload_id}).'},
+            status=400
+        )
 
-            ent = _resolver_entidad(
-                payload.get('propietario'),
-                payload.get('entidadinterna'),
-                entidad_cache,
-                CREATE_MISSING_ENTIDADES
+    parcial = (
+        CargaJobBia.objects
+        .filter(upload_id=upload_id, estado=CargaJobBia.Estado.ERROR, processed_rows__gt=0)
+        .order_by('-created_at')
+        .first()
+    )
+    if parcial is not None:
+        # UPDATE condicional: dos confirmaciones a la vez no reencolan dos veces el mismo job
+        if not CargaJobBia.objects.filter(pk=parcial.pk, estado=CargaJobBia.Estado.ERROR).update(
+            estado=CargaJobBia.Estado.PENDIENTE, error_message="", finished_at=None, updated_at=timezone.now(),
+        ):
+            return Response({'success': False, 'error': 'La carga ya se está retomando.'}, status=409)
+        parcial.refresh_from_db()
+
+    if background or parcial is not None:
+        job = parcial or CargaJobBia.objects.create(
+            requested_by=request.user if request.user.is_authenticated else None,
+            upload_id=upload_id,
+            filename=meta.get('source_name') or "",
+            total_rows=int(meta.get('total_rows') or 0),
+            merge=merge,
+        )
+        try:
+            confirmar_carga_job.delay(str(job.pk))
+        except Exception as e:
+            logger.exception(f"No se pudo encolar confirmar_carga_job para job_id={job.pk}: {e}")
+            job.estado = CargaJobBia.Estado.ERROR
+            job.error_message = f"No se pudo encolar la tarea: {e}"
+            job.finished_at = timezone.now()
+            job.save(update_fields=["estado", "error_message", "finished_at", "updated_at"])
+            return Response(
+                {'success': False, 'error': 'Error al encolar la confirmación de carga.'},
+                status=500,
             )
-            obj = BaseDeDatosBia(**payload)
-            if ent:
-                obj.entidad = ent
-            to_create.append(obj)
+        request.session.pop('datos_cargados', None)
+        return Response(
+            {
+                'success': True,
+                'job_id': str(job.pk),
+                'estado': job.estado,
+                'total_rows': job.total_rows,
+                'status_url': reverse("carga_datos:api_carga_job_status") + f"?job_id={job.pk}",
+            },
+            status=202,
+        )
 
-        if not to_create:
-            return Response({'success': False, 'error': 'No hay filas válidas para insertar.'}, status=400)
+    try:
+        with transaction.atomic():
+            result = confirmar_upload(upload_id, merge=merge)
+    except CargaError as e:
+        return Response({'success': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        logger.exception(f"[{request.user}] Error inesperado en confirmación: {e}")
+        return Response(
+            {'success': False, 'error': f'Error al confirmar carga: {str(e)}'},
+            status=500
+        )
 
-        # 6) Persistencia en bloque (batch grande para rendimiento)
-        BaseDeDatosBia.objects.bulk_create(to_create, batch_size=2000)
+    # Limpiamos sesión si venían de ahí (legacy) y borramos el staging
+    request.session.pop('datos_cargados', None)
+    delete_staged_upload(upload_id)
 
-        # 7) Limpiamos sesión si venían de ahí (legacy) y borramos archivo temporal si aplica
-        if 'datos_cargados' in request.session:
-            request.session.pop('datos_cargados', None)
+    return Response({
+        'success': True,
+        'created_count': result['created_count'],
+        'updated_count': result['updated_count'],
+        'skipped_count': 0,
+        'errors_count': 0,
+    })
 
-        if upload_id:
-            temp_path = _get_temp_path(upload_id)
-            try:
-                temp_path.unlink(missing_ok=True)
-            except Exception as e:
-                logger.warning(f"No se pudo borrar archivo temporal {temp_path}: {e}")
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, CanUploadExcel])
+def api_carga_job_status(request):
+    """
+    GET /api/carga-datos/carga/job-status/?job_id=...
+    Estado y progreso de una confirmación de carga en background.
+    """
+    job_id = (request.query_params.get("job_id") or "").strip()
+    try:
+        job_uuid = uuid.UUID(job_id)
+    except ValueError:
+        return Response({"success": False, "error": "job_id inválido."}, status=400)
 
-        return Response({
-            'success': True,
-            'created_count': len(to_create),
-            'updated_count': 0,
-            'skipped_count': 0,
-            'errors_count': 0,
-        })
+    job = get_object_or_404(CargaJobBia, pk=job_uuid)
 
-    except Exception as e:
-        logger.exception(f"[{request.user}] Error inesperado en confirmación: {e}")
+    if job.requested_by and job.requested_by != request.user and not request.user.is_superuser:
         return Response(
-            {'success': False, 'error': f'Error al confirmar carga: {str(e)}'},
-            status=500
+            {"success": False, "error": "No estás autorizado para ver este job."},
+            status=403,
         )
 
+    return Response(
+        {
+            "success": True,
+            "job_id": str(job.pk),
+            "estado": job.estado,
+            "is_finished": job.is_finished,
+            "total_rows": job.total_rows,
+            "processed_rows": job.processed_rows,
+            "created_count": job.created_count,
+            "updated_count": job.updated_count,
+            "merge": job.merge,
+            "error_message": job.error_message,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        },
+        status=200,
+    )
+
 # =========================
 # ERRORES VALIDACIÓN (web)
 # =========================
@@ -1076,6 +968,7 @@ def api_export_job_status(request):
             "success": True,
             "job_id": job.pk,
             "estado": job.estado,
+            "formato": job.formato,
             "total_rows": job.total_rows,
             "created_at": job.created_at,
             "started_at": job.started_at,
@@ -1091,7 +984,8 @@ def api_export_job_status(request):
 def exportar_datos_bia_csv_download(request, job_id: int):
     """
     GET /api/carga-datos/export/download/<job_id>/
-    Devuelve el CSV generado para ese job como archivo descargable.
+    Devuelve el archivo generado para ese job (CSV, o .xlsx si es la
+    plantilla de Modificar Masivo) como descargable.
     """
     job = get_object_or_404(ExportJobBia, pk=job_id)
 
@@ -1122,7 +1016,11 @@ def exportar_datos_bia_csv_download(request, job_id: int):
         open(file_path, "rb"),
         as_attachment=True,
         filename=file_path.name,
-        content_type="text/csv; charset=utf-8",
+        content_type=(
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            if job.formato == ExportJobBia.Formato.XLSX
+            else "text/csv; charset=utf-8"
+        ),
     )
 
 
@@ -1143,19 +1041,11 @@ def delete_db_bia(request, pk: int):
     business_key = str(obj.id_pago_unico or "")
 
     from .models import AuditLog  # asegúrate de tener este modelo definido
+    from .utils_audit import AuditBuffer
 
-    with transaction.atomic():
-        # Audit del borrado (similar al bulk_commit)
-        AuditLog.objects.create(
-            table_name=BaseDeDatosBia._meta.db_table,
-            business_key=business_key if business_key else str(pk),
-            field="*",
-            old_value="(row)",
-            new_value=None,
-            job=None,
-            action=AuditLog.Action.DELETE,
-            actor=request.user,
-        )
+    with transaction.atomic(), AuditBuffer(actor=request.user) as audit:
+        # Audit del borrado (mismo writer que bulk_commit)
+        audit.add(AuditLog.Action.DELETE, business_key or pk, "*", "(row)", None)
         obj.delete()
 
     return Response({"success": True, "deleted_id": pk, "business_key": business_key})
@@ -1,37 +1,61 @@
 # carga_datos/views_bulk.py
-import io
+import csv
+import json
+import tempfile
 import uuid
 import math
-import hashlib
 import datetime
+from itertools import groupby, islice
+from operator import itemgetter
 from typing import Dict, Any, List, Tuple
 
 import pandas as pd
+from django.conf import settings
 from django.db import transaction, models
 from django.utils import timezone
 from django.apps import apps
-from django.http import HttpResponse
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 
-from django.db.models import Max, BigIntegerField, Q
-from django.db.models.functions import Cast
+from django.db.models import Count, Q
+from django.db.models.functions import Lower
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import numbers as xl_numbers
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 
 from carga_datos.models import (
     BulkJob,
     StagingBulkChange,
     AuditLog,
     BaseDeDatosBia,
-    BusinessKeyCounter,
+    ExportJobBia,
+    allocate_id_pago_unico_block,
+    db_bia_version,
+    touch_db_bia,
 )
-from carga_datos.utils_preview import render_preview_table
+from carga_datos.utils_activos import ACTIVE_ESTADOS, ActivosPorDniEntidad, par_activo
+from carga_datos.utils_audit import AuditBuffer
+from carga_datos.utils_bulk_staging import StagingBulkWriter
+from carga_datos.utils_cache import cached_bulk_job, file_sha256
+from carga_datos.utils_diff import campos_cambiados
+from carga_datos.utils_keys import existing_rows
+from carga_datos.utils_locks import ClavesEnUso, bloquear_claves
+from carga_datos.utils_parallel import map_chunks
+from carga_datos.utils_staging import delete_staged_upload, save_raw_upload
+from carga_datos.utils_upload import UPLOAD_CHUNK_ROWS, read_upload_chunks, upload_extension
+from carga_datos.views import EXPORTS_DIR, _ensure_exports_dir
+from carga_datos.views_helpers import _es_verdadero, df_drop_blank_rows
+from carga_datos.tasks import confirmar_bulk_job, exportar_plantilla_bulk_job, validar_bulk_job
 
 # 🚦 permisos de negocio
 from carga_datos.permissions import CanBulkModify, IsAdminOrSuperuser
@@ -74,7 +98,7 @@ ALLOWED_SUBESTADOS_BY_ESTADO = {
     "CON DEUDA": {"VENCIDO", "MORA", "AGENCIA EXTERNA"},
     "AGENCIA EXTERNA": {"DERIVADO"},
 }
-ACTIVE_ESTADOS_SET = {"CANCELADO", "CON DEUDA"}
+ACTIVE_ESTADOS_SET = set(ACTIVE_ESTADOS)
 MAX_ACTIVOS_POR_DNI_ENTIDAD = 1
 
 # Validaciones soft
@@ -89,17 +113,42 @@ DEC_RATE_FIELDS = {"interes_diario"}  # 0..1
 # Validación estricta de CUIT (desactivada por defecto)
 ENFORCE_CUIT_CHECKSUM = False
 
+# Lote para el prefetch (__in)
+PREFETCH_BATCH = 900
 
-# ============ Utilidades / normalizadores ============
+# Filas por bloque al leer el archivo (validate) y al recorrer el staging (commit)
+BULK_CHUNK_ROWS = int(getattr(settings, "BIA_BULK_CHUNK_ROWS", UPLOAD_CHUNK_ROWS))
+
+# Commit por bloques (chunked=true): filas por transacción, y tras cuántos segundos sin
+# checkpoint un commit en COMMITTING se da por cortado y se puede reanudar
+BULK_COMMIT_CHUNK_ROWS = int(getattr(settings, "BIA_BULK_COMMIT_CHUNK_ROWS", 5000))
+BULK_COMMIT_STALE_SECONDS = int(getattr(settings, "BIA_BULK_COMMIT_STALE_SECONDS", 900))
+# Rollback: claves del AuditLog que se revierten por lote (una consulta de filas + bulk_* por lote)
+BULK_ROLLBACK_BATCH = int(getattr(settings, "BIA_BULK_ROLLBACK_BATCH", 5000))
+ROLLBACK_MAX_CONFLICTOS = 1000  # cuántos conflictos se guardan en summary['rollback']
+# Columnas del staging que lee el commit
+STAGING_COMMIT_COLS = ("business_key", "op", "can_apply", "clean_payload", "diff", "snapshot")
 
+# Preview paginada (bulk-update/preview)
+PREVIEW_PAGE_SIZE = int(getattr(settings, "BIA_BULK_PREVIEW_PAGE_SIZE", 100))
+PREVIEW_MAX_PAGE_SIZE = 1000
 
-def _sha256_bytes(b: bytes) -> str:
-    return hashlib.sha256(b).hexdigest()
+# Prefijos de business_key en staging para filas sin clave (se numeran: "(auto)#1", ...)
+AUTO_KEY = "(auto)"
+NO_KEY = "(sin_clave)"
+
+# Campos de la fila en DB que usan las reglas de un UPDATE (además de los del payload):
+# si alguno cambió entre validate y commit, la fila se revalida (ver snapshot en staging)
+REVALIDATION_FIELDS = {"fecha_apertura", "fecha_deuda", "estado", "sub_estado", "entidad", "dni"}
+
+
+# ============ Utilidades / normalizadores ============
 
 
 def _is_nan(x: Any) -> bool:
     try:
-        return isinstance(x, float) and math.isnan(x)
+        # NaT: columnas de fecha tipadas (parse_dates / read_excel) con celdas vacías
+        return x is pd.NaT or (isinstance(x, float) and math.isnan(x))
     except Exception:
         return False
 
@@ -215,27 +264,6 @@ def _normalize_cuit(val: Any) -> str | None:
     return digits
 
 
-# ======= Helpers de autoincremento seguro =======
-
-
-def _allocate_sequential_ids_from_db_max(n: int) -> list[str]:
-    """Toma el mayor id en DB y el contador para asignar n ids consecutivos, de forma atómica."""
-    if n <= 0:
-        return []
-    with transaction.atomic():
-        counter, _ = BusinessKeyCounter.objects.select_for_update().get_or_create(
-            name='id_pago_unico', defaults={'last_value': 0}
-        )
-        db_max = BaseDeDatosBia.objects.aggregate(
-            m=Max(Cast(BUSINESS_KEY_FIELD, BigIntegerField()))
-        )["m"] or 0
-        last = max(int(counter.last_value or 0), int(db_max))
-        start = last + 1
-        counter.last_value = last + n
-        counter.save(update_fields=['last_value', 'updated_at'])
-        return [str(i) for i in range(start, start + n)]
-
-
 # ======= Validaciones de negocio =======
 
 
@@ -320,339 +348,631 @@ def _is_active_estado(estado: str) -> bool:
     return _normalize_estado(estado) in ACTIVE_ESTADOS_SET
 
 
-def _soft_uniqueness_ok(dni: str, entidad_id: int, estado: str) -> Tuple[bool, str]:
-    if not dni or not entidad_id:
-        return True, ""
-    if not _is_active_estado(estado):
-        return True, ""
-    qs = BaseDeDatosBia.objects.filter(
-        dni=dni, entidad_id=entidad_id
-    ).filter(Q(estado__iexact="CANCELADO") | Q(estado__iexact="CON DEUDA"))
-    cnt = qs.count()
-    if cnt >= MAX_ACTIVOS_POR_DNI_ENTIDAD:
-        return False, f"Regla de negocio: ya existen {cnt} registro(s) activo(s) para este DNI+Entidad (estados: CANCELADO / CON DEUDA)."
-    return True, ""
+def _msg_activos(cnt: int) -> str:
+    return f"Regla de negocio: ya existen {cnt} registro(s) activo(s) para este DNI+Entidad (estados: CANCELADO / CON DEUDA)."
 
 
-# =========== EXPORT .XLSX ===========
+# ======= Prefetch para validar por conjuntos (pocas consultas por archivo) =======
 
 
-@api_view(["GET"])
-@permission_classes([IsAuthenticated, CanBulkModify])
-def bulk_export_xlsx(request):
+def _batches(values: list, size: int = PREFETCH_BATCH):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class _EntidadesPrefetch:
     """
-    Descarga la base real (db_bia) en .xlsx:
-      - Todas las columnas (sin 'id')
-      - Agrega '__op' vacía
-      - ❗ Formatea DNI y CUIT como TEXTO para evitar .0/notación científica en Excel
+    Entidades referenciadas por el archivo (por id o por nombre) más las
+    actuales de las filas a modificar, cargadas de una vez. Mismo criterio
+    que _coerce_entidad_value (id numérico o nombre iexact) sin consultar por fila.
     """
-    model_fields = [f.name for f in BaseDeDatosBia._meta.fields if f.name != "id"]
-    base_cols = [BUSINESS_KEY_FIELD] + [c for c in model_fields if c != BUSINESS_KEY_FIELD]
-    export_cols = [BUSINESS_KEY_FIELD, "__op"] + [c for c in base_cols if c != BUSINESS_KEY_FIELD]
 
-    qs = BaseDeDatosBia.objects.all().order_by("id")
+    def __init__(self, raw_values, ids_extra=()):
+        Entidad = _get_entidad_model()
+        ids = {i for i in ids_extra if i is not None}
+        nombres = set()
+        for raw in raw_values:
+            v = _normalize_val(raw)
+            if v is None:
+                continue
+            s = str(v)
+            if s.isdigit():
+                ids.add(int(s))
+            else:
+                nombres.add(s.lower())
+
+        self.nombres: Dict[int, str] = {}
+        self.por_nombre: Dict[str, int] = {}
+        for lote in _batches(sorted(ids)):
+            self.nombres.update(Entidad.objects.filter(pk__in=lote).values_list("id", "nombre"))
+        for lote in _batches(sorted(nombres)):
+            qs = Entidad.objects.annotate(nombre_ci=Lower("nombre")).filter(nombre_ci__in=lote)
+            for pk, nombre in qs.values_list("id", "nombre"):
+                self.nombres[pk] = nombre
+                self.por_nombre.setdefault(str(nombre).lower(), pk)
+
+    def coerce(self, raw: Any) -> Tuple[Any, str]:
+        v = _normalize_val(raw)
+        if v is None:
+            return None, ""
+        s = str(v)
+        if s.isdigit():
+            pk = int(s)
+            exists = pk in self.nombres
+            return (pk if exists else None), ("" if exists else "entidad: id inexistente")
+        pk = self.por_nombre.get(s.lower())
+        if pk is not None:
+            return pk, ""
+        return None, "entidad: no encontrada por nombre"
+
+    def display(self, pk: Any) -> str | None:
+        """'id · nombre' para la preview (str(pk) si no existe)."""
+        if pk is None:
+            return None
+        nombre = self.nombres.get(pk)
+        return f"{pk} · {nombre}" if nombre is not None else str(pk)
+
+
+class BulkError(Exception):
+    """
+    Rechazo de negocio en la validación o el commit de un BulkJob (archivo sin
+    clave, regla que falla al revalidar, ...). En el commit sale del atomic
+    (rollback); la vista responde 400 y la tarea lo deja en error_message.
+    """
+
+
+def _es_clave_sin_asignar(business_key: str | None) -> bool:
+    return not business_key or business_key.startswith((AUTO_KEY, NO_KEY))
+
+
+def _bloquear_claves(claves):
+    """
+    Locks por clave (utils_locks) de las claves explícitas: las (auto) salen de la
+    secuencia y no pueden pisarse con otro job. Si no se liberan a tiempo -> BulkError.
+    """
+    try:
+        bloquear_claves(k for k in claves if not _es_clave_sin_asignar(k))
+    except ClavesEnUso as e:
+        raise BulkError(str(e)) from e
+
+
+def _descartar_duplicadas(prevalidadas: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Misma business_key repetida en el archivo: queda sólo la ÚLTIMA fila
+    (mismo resultado que tenía el update_or_create por fila).
+    Devuelve (filas, cantidad_descartadas).
+    """
+    ultima = {pre["bkey"]: i for i, pre in enumerate(prevalidadas) if pre["bkey"]}
+    filas = [pre for i, pre in enumerate(prevalidadas) if not pre["bkey"] or ultima[pre["bkey"]] == i]
+    return filas, len(prevalidadas) - len(filas)
+
+
+# ======= Staging "precocido" (clean_payload / diff / snapshot) =======
+
+
+def _snapshot_fila(obj, campos, fields_map: Dict[str, models.Field]) -> Dict[str, str | None]:
+    """Valores actuales de obj para `campos`, como texto (mismo criterio de comparación que el diff)."""
+    out = {}
+    for k in campos:
+        v = getattr(obj, fields_map[k].attname, None)
+        out[k] = None if v is None else str(v)
+    return out
+
+
+def _fila_json(obj) -> str:
+    """Fila completa de db_bia como JSON ({attname: valor}, FK = id), para el AuditLog de un DELETE."""
+    return json.dumps(
+        {f.attname: getattr(obj, f.attname) for f in BaseDeDatosBia._meta.concrete_fields},
+        cls=DjangoJSONEncoder,
+    )
+
 
-    dni = (request.GET.get("dni") or "").strip()
+def _fila_desde_json(data: str | None) -> BaseDeDatosBia:
+    """Inversa de _fila_json. ValueError si no es una fila (ej. el "(row)" de los DELETE viejos)."""
+    valores = json.loads(data or "")
+    if not isinstance(valores, dict):
+        raise ValueError("no es una fila")
+    return BaseDeDatosBia(**{
+        f.attname: f.to_python(valores.get(f.attname)) for f in BaseDeDatosBia._meta.concrete_fields
+    })
+
+
+def _decodificar_payload(data: dict, fields_map: Dict[str, models.Field]) -> Dict[str, Any]:
+    """JSON del staging -> valores tipados (fechas, Decimal, id de entidad) vía to_python."""
+    return {k: fields_map[k].to_python(v) for k, v in data.items() if k in fields_map}
+
+
+def _par_activo_payload(payload: dict, obj=None):
+    """(dni, entidad_id) en que queda activa la fila tras aplicar payload sobre obj (None si no queda activa)."""
+    estado = payload.get("estado") or getattr(obj, "estado", None)
+    entidad_id = payload.get("entidad") or getattr(obj, "entidad_id", None)
+    dni = payload.get("dni") or getattr(obj, "dni", None)
+    if entidad_id and dni and _is_active_estado(estado):
+        return (str(dni), int(entidad_id))
+    return None
+
+
+def _revalidar_fila(op: str, payload_clean: dict, obj, today: datetime.date) -> str:
+    """
+    Reglas críticas de bulk_commit para una fila (sin la unicidad blanda, que va
+    por conjuntos). Devuelve el primer error o "" si está ok.
+    """
+    if op == "INSERT":
+        if not all(payload_clean.get(k) for k in REQUIRED_FOR_INSERT):
+            return "faltan dni/cuit/nombre_apellido (tras normalizar)."
+        fa, fd = payload_clean.get("fecha_apertura"), payload_clean.get("fecha_deuda")
+        estado_val = _normalize_estado(payload_clean.get("estado"))
+        sub_estado_val = _normalize_estado(payload_clean.get("sub_estado"))
+    else:
+        fa = payload_clean.get("fecha_apertura") or getattr(obj, "fecha_apertura", None)
+        fd = payload_clean.get("fecha_deuda") or getattr(obj, "fecha_deuda", None)
+        estado_val = _normalize_estado(payload_clean.get("estado") or getattr(obj, "estado", None))
+        sub_estado_val = _normalize_estado(payload_clean.get("sub_estado") or getattr(obj, "sub_estado", None))
+
+    okd, msgd = _dates_are_valid(fa, fd, today)
+    if not okd:
+        return msgd
+    okm, msgm = _money_is_valid(payload_clean)
+    if not okm:
+        return msgm
+    oke, msge = _estado_is_valid(estado_val, sub_estado_val)
+    if not oke:
+        return msge
+    if op == "UPDATE":
+        for ef in EMAIL_FIELDS:
+            if ef in payload_clean and not _email_is_valid(str(payload_clean[ef])):
+                return f"Email inválido en {ef}."
+        for pf in PHONE_FIELDS:
+            if pf in payload_clean and not _phone_is_valid(str(payload_clean[pf])):
+                return f"Teléfono inválido en {pf} (solo dígitos)."
+    return ""
+
+
+# ======= Prevalidación por fila (sin DB, apta para workers) =======
+
+
+def _prevalidar_fila(row: dict, fields_map: Dict[str, models.Field], editable_cols: set) -> Dict[str, Any]:
+    """
+    Parte de bulk_validate que no consulta la base: normaliza la fila, arma
+    payload_clean (dni/cuit/fechas/decimales vía to_python) y precalcula los
+    errores de formato de emails/teléfonos. La FK 'entidad' queda cruda en
+    payload_clean para resolverla después contra la DB.
+    """
+    raw_row = {k: _normalize_val(v) for k, v in row.items()}
+    bkey = _normalize_business_key(raw_row.get(BUSINESS_KEY_FIELD) or raw_row.get("business_key"))
+    op_in = str(raw_row.get("__op") or "").upper().strip()
+    if op_in and op_in not in ACCEPTED_OPS:
+        op_in = ""
+
+    out = {"raw_row": raw_row, "bkey": bkey, "op_in": op_in}
+    if op_in == "DELETE":
+        return out
+
+    # Construir payload_clean (ignorando vacíos; no editables vacíos => ignorar)
+    payload_clean = {}
+    errors: List[str] = []
+    for k, v in raw_row.items():
+        if k in {BUSINESS_KEY_FIELD, "business_key", "__op"}:
+            continue
+        if k not in fields_map:
+            if _normalize_val(v) is not None:
+                errors.append(f"Columna desconocida: {k}")
+            continue
+
+        is_non_editable = k in NON_EDITABLE_FIELDS
+        norm_v = _normalize_val(v)
+
+        # NO-EDITABLE vacía => ignorar
+        if is_non_editable and norm_v is None:
+            continue
+        # NO-EDITABLE con valor => error
+        if is_non_editable and norm_v is not None:
+            errors.append(f"Columna no editable: {k}")
+            continue
+
+        if k not in editable_cols:
+            continue
+        if norm_v is None:
+            continue
+
+        # Normalización especial para dni/cuit
+        if k == "dni":
+            nd = _normalize_dni(norm_v)
+            if nd:
+                payload_clean[k] = nd
+            continue
+        if k == "cuit":
+            nc = _normalize_cuit(norm_v)
+            if nc:
+                payload_clean[k] = nc
+            continue
+
+        # FK: se resuelve en el proceso principal (consulta DB)
+        if k == ENTIDAD_FIELD:
+            payload_clean[k] = norm_v
+            continue
+
+        coerced, err = _coerce_to_field(fields_map[k], norm_v)
+        if err:
+            errors.append(err)
+        else:
+            payload_clean[k] = coerced
+
+    contact_errors = []
+    for ef in EMAIL_FIELDS:
+        if ef in payload_clean and not _email_is_valid(str(payload_clean[ef])):
+            contact_errors.append(f"Email inválido en {ef}.")
+    for pf in PHONE_FIELDS:
+        if pf in payload_clean and not _phone_is_valid(str(payload_clean[pf])):
+            contact_errors.append(f"Teléfono inválido (solo dígitos) en {pf}.")
+
+    out.update(payload_clean=payload_clean, errors=errors, contact_errors=contact_errors)
+    return out
+
+
+def _prevalidar_shard(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Rango de filas -> lista de filas prevalidadas (mismo orden). Corre en un worker."""
+    fields_map = _model_concrete_fields(BaseDeDatosBia)
+    editable_cols = set(fields_map.keys()) - ({"id"} | NON_EDITABLE_FIELDS)
+    return [_prevalidar_fila(row, fields_map, editable_cols) for row in df.to_dict(orient="records")]
+
+
+# =========== EXPORT .XLSX ===========
+
+
+# Columnas que se exportan como TEXTO (evita .0 / notación científica en Excel)
+EXPORT_TEXT_COLS = ("dni", "cuit")
+# Filas por fetch del cursor del lado del servidor (y cada cuánto se guarda el avance del job)
+EXPORT_CHUNK_ROWS = int(getattr(settings, "BIA_EXPORT_CHUNK_ROWS", 5000))
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+EXPORT_GUIA = [
+    "Instrucciones",
+    f"- En UPDATE, NO modificar '{BUSINESS_KEY_FIELD}' ni 'fecha_apertura'.",
+    "- '__op': UPDATE (o vacío), INSERT, DELETE.",
+    "- INSERT: 'id_pago_unico' puede ir vacío (se autogenera); 'fecha_apertura' se completa si falta.",
+    "- Fechas: YYYY-MM-DD; 'fecha_deuda' debe ser anterior a 'fecha_apertura'.",
+    "- 'entidad': ID numérico o nombre (case-insensitive).",
+    "- Estados/sub-estados permiten 'Agencia Externa'.",
+    "- DNI/CUIT exportados como TEXTO para evitar .0 en Excel.",
+]
+
+
+def _filtros_export(params) -> Dict[str, Any]:
+    """Querystring -> filtros de la plantilla (se guardan tal cual en ExportJobBia.filtros)."""
+    filtros: Dict[str, Any] = {}
+
+    dni = (params.get("dni") or "").strip()
     if dni:
-        qs = qs.filter(dni=dni)
+        filtros["dni"] = dni
 
-    idp_csv = (request.GET.get(f"{BUSINESS_KEY_FIELD}__in") or "").strip()
+    idp_csv = (params.get(f"{BUSINESS_KEY_FIELD}__in") or "").strip()
     if idp_csv:
-        ids = [s.strip() for s in idp_csv.split(",") if s.strip()]
-        qs = qs.filter(**{f"{BUSINESS_KEY_FIELD}__in": ids})
+        filtros[f"{BUSINESS_KEY_FIELD}__in"] = [s.strip() for s in idp_csv.split(",") if s.strip()]
 
     try:
-        limit = int(request.GET.get("limit", "0"))
+        limit = int(params.get("limit", "0"))
     except Exception:
         limit = 0
     if limit > 0:
-        qs = qs[:limit]
-
-    rows = list(qs.values(*base_cols))
-    norm_rows = []
-    for r in rows:
-        norm = {k: _normalize_val(v) for k, v in r.items()}
-        norm["__op"] = ""
-        # Normalizar dni/cuit para exportar como texto limpio
-        if "dni" in norm and norm["dni"] is not None:
-            norm["dni"] = _normalize_dni(norm["dni"]) or norm["dni"]
-        if "cuit" in norm and norm["cuit"] is not None:
-            norm["cuit"] = _normalize_cuit(norm["cuit"]) or norm["cuit"]
-        norm_rows.append(norm)
-
-    df = pd.DataFrame(norm_rows, columns=export_cols)
-
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Datos")
-        ws = writer.sheets["Datos"]
-        ws.freeze_panes = "A2"
-        # Ancho de columnas
-        for i, col in enumerate(export_cols, start=1):
-            width = max(10, min(40, len(str(col)) + 2))
-            ws.column_dimensions[get_column_letter(i)].width = width
-
-        # ❗ Forzar formato TEXTO en columnas DNI y CUIT
-        def _col_index(col_name: str) -> int | None:
-            try:
-                return export_cols.index(col_name) + 1  # 1-based
-            except ValueError:
-                return None
-
-        dni_col = _col_index("dni")
-        cuit_col = _col_index("cuit")
-        for col_idx in filter(None, [dni_col, cuit_col]):
-            col_letter = get_column_letter(col_idx)
-            # desde fila 2 (fila 1 es header)
-            for row_idx in range(2, ws.max_row + 1):
-                cell = ws[f"{col_letter}{row_idx}"]
-                cell.number_format = "@"  # texto
-
-        # Hoja Guía
-        guia_lines = [
-            ["Instrucciones"],
-            [f"- En UPDATE, NO modificar '{BUSINESS_KEY_FIELD}' ni 'fecha_apertura'."],
-            ["- '__op': UPDATE (o vacío), INSERT, DELETE."],
-            ["- INSERT: 'id_pago_unico' puede ir vacío (se autogenera); 'fecha_apertura' se completa si falta."],
-            ["- Fechas: YYYY-MM-DD; 'fecha_deuda' debe ser anterior a 'fecha_apertura'."],
-            ["- 'entidad': ID numérico o nombre (case-insensitive)."],
-            ["- Estados/sub-estados permiten 'Agencia Externa'."],
-            ["- DNI/CUIT exportados como TEXTO para evitar .0 en Excel."],
-        ]
-        pd.DataFrame([{"Guía": x[0]} for x in guia_lines]).to_excel(writer, index=False, sheet_name="Guía")
-        writer.sheets["Guía"].column_dimensions["A"].width = 110
-
-    buffer.seek(0)
+        filtros["limit"] = limit
+    return filtros
+
+
+def _export_queryset(filtros: Dict[str, Any]):
+    qs = BaseDeDatosBia.objects.all().order_by("id")
+    if filtros.get("dni"):
+        qs = qs.filter(dni=filtros["dni"])
+    ids = filtros.get(f"{BUSINESS_KEY_FIELD}__in")
+    if ids:
+        qs = qs.filter(**{f"{BUSINESS_KEY_FIELD}__in": ids})
+    if filtros.get("limit"):
+        qs = qs[:filtros["limit"]]
+    return qs
+
+
+def escribir_plantilla_xlsx(fh, filtros: Dict[str, Any], on_progress=None) -> int:
+    """
+    Escribe la plantilla de Modificar Masivo (db_bia filtrada) en `fh` y
+    devuelve la cantidad de filas. Memoria constante:
+      - openpyxl write_only: cada fila se serializa al hacer append.
+      - values_list().iterator(): cursor del lado del servidor en PostgreSQL.
+      - Formato TEXTO de DNI/CUIT definido una vez por columna (una celda
+        "molde" por columna que se reusa en todas las filas).
+    """
+    model_fields = [f.name for f in BaseDeDatosBia._meta.fields if f.name != "id"]
+    base_cols = [BUSINESS_KEY_FIELD] + [c for c in model_fields if c != BUSINESS_KEY_FIELD]
+    export_cols = [BUSINESS_KEY_FIELD, "__op"] + base_cols[1:]
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Datos")
+    ws.freeze_panes = "A2"
+    for i, col in enumerate(export_cols, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = max(10, min(40, len(str(col)) + 2))
+
+    moldes: Dict[int, WriteOnlyCell] = {}
+    for col in EXPORT_TEXT_COLS:
+        if col not in base_cols:
+            continue
+        idx = base_cols.index(col)
+        ws.column_dimensions[get_column_letter(export_cols.index(col) + 1)].number_format = xl_numbers.FORMAT_TEXT
+        moldes[idx] = WriteOnlyCell(ws)
+        moldes[idx].number_format = xl_numbers.FORMAT_TEXT
+    normalizar = {
+        base_cols.index(c): f for c, f in (("dni", _normalize_dni), ("cuit", _normalize_cuit)) if c in base_cols
+    }
+
+    ws.append(export_cols)
+    total = 0
+    for valores in _export_queryset(filtros).values_list(*base_cols).iterator(chunk_size=EXPORT_CHUNK_ROWS):
+        fila = [_normalize_val(v) for v in valores]
+        for idx, norm in normalizar.items():
+            if fila[idx] is not None:
+                fila[idx] = norm(fila[idx]) or fila[idx]
+        for idx, molde in moldes.items():
+            if fila[idx] is not None:
+                molde.value = str(fila[idx])
+                fila[idx] = molde
+        ws.append([fila[0], None, *fila[1:]])
+
+        total += 1
+        if on_progress and total % EXPORT_CHUNK_ROWS == 0:
+            on_progress(total)
+
+    guia = wb.create_sheet("Guía")
+    guia.column_dimensions["A"].width = 110
+    guia.append(["Guía"])
+    for linea in EXPORT_GUIA:
+        guia.append([linea])
+
+    wb.save(fh)
+    return total
+
+
+def exportar_plantilla_job(job: ExportJobBia) -> ExportJobBia:
+    """
+    Genera la plantilla .xlsx de un ExportJobBia (formato=xlsx) en EXPORTS_DIR.
+    La descarga y el polling son los mismos que el export CSV
+    (export/job-status/, export/download/<job_id>/).
+    """
+    _ensure_exports_dir()
     ts = timezone.localtime().strftime("%Y%m%d_%H%M%S")
-    filename = f"db_bia_export_{ts}.xlsx"
+    filename = f"db_bia_export_{job.pk}_{ts}.xlsx"
+    full_path = EXPORTS_DIR / filename
+
+    job.estado = ExportJobBia.Estado.EN_PROCESO
+    job.started_at = timezone.now()
+    job.filename = filename
+    job.error_message = ""
+    job.save(update_fields=["estado", "started_at", "filename", "error_message", "updated_at"])
+
+    def _avance(procesadas: int):
+        job.total_rows = procesadas
+        job.save(update_fields=["total_rows", "updated_at"])
+
+    try:
+        with full_path.open("wb") as fh:
+            total = escribir_plantilla_xlsx(fh, job.filtros or {}, on_progress=_avance)
+    except Exception as e:
+        full_path.unlink(missing_ok=True)
+        job.estado = ExportJobBia.Estado.ERROR
+        job.finished_at = timezone.now()
+        job.error_message = str(e)
+        job.save(update_fields=["estado", "finished_at", "error_message", "updated_at"])
+        raise
+
+    job.estado = ExportJobBia.Estado.COMPLETADO
+    job.finished_at = timezone.now()
+    job.total_rows = total
+    job.file_path = str(full_path.relative_to(getattr(settings, "MEDIA_ROOT", EXPORTS_DIR.parent)))
+    job.save(update_fields=["estado", "finished_at", "total_rows", "file_path", "updated_at"])
+    return job
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, CanBulkModify])
+def bulk_export_xlsx(request):
+    """
+    Descarga la base real (db_bia) en .xlsx:
+      - Todas las columnas (sin 'id')
+      - Agrega '__op' vacía
+      - ❗ Formatea DNI y CUIT como TEXTO para evitar .0/notación científica en Excel
+    Filtros: dni, id_pago_unico__in (csv), limit.
+
+    Con background=true no descarga: crea un ExportJobBia (formato xlsx) que
+    arma Celery; el estado y la descarga van por export/job-status/.
+    """
+    filtros = _filtros_export(request.GET)
+
+    if _es_verdadero(request.GET.get("background")):
+        job = ExportJobBia.objects.create(
+            requested_by=request.user if request.user.is_authenticated else None,
+            estado=ExportJobBia.Estado.PENDIENTE,
+            formato=ExportJobBia.Formato.XLSX,
+            filtro_dni=filtros.get("dni", ""),
+            filtros=filtros,
+        )
+        try:
+            exportar_plantilla_bulk_job.delay(job.pk)
+        except Exception as e:
+            job.estado = ExportJobBia.Estado.ERROR
+            job.error_message = f"No se pudo encolar la tarea: {e}"
+            job.save(update_fields=["estado", "error_message", "updated_at"])
+            return Response({"errors": ["Error al encolar la exportación."]}, status=500)
+        status_url = f'{reverse("carga_datos:api_export_job_status")}?job_id={job.pk}'
+        return Response(
+            {"success": True, "job_id": job.pk, "estado": job.estado, "status_url": status_url},
+            status=202,
+        )
 
-    resp = HttpResponse(
-        buffer.getvalue(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    # Se arma en un archivo temporal (no en memoria) y se devuelve por bloques
+    tmp = tempfile.TemporaryFile()
+    escribir_plantilla_xlsx(tmp, filtros)
+    tmp.seek(0)
+    ts = timezone.localtime().strftime("%Y%m%d_%H%M%S")
+    return FileResponse(
+        tmp,
+        as_attachment=True,
+        filename=f"db_bia_export_{ts}.xlsx",
+        content_type=XLSX_CONTENT_TYPE,
     )
-    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return resp
 
 
 # =========== VALIDATE ===========
 
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated, CanBulkModify])
-def bulk_validate(request):
+def _progreso(job: BulkJob, fase: str, procesadas: int | None = None, total: int | None = None):
+    """Contadores de avance en job.summary['progreso'] (los consulta bulk_status)."""
+    summary = dict(job.summary or {})
+    summary["progreso"] = {"fase": fase, "procesadas": procesadas, "total": total}
+    job.summary = summary
+    job.save(update_fields=["summary"])
+
+
+def _prevalidar_archivo(job: BulkJob, path) -> List[Dict[str, Any]]:
+    """
+    Lee el archivo spooleado por bloques de BULK_CHUNK_ROWS (openpyxl read-only /
+    read_csv chunksize) y prevalida cada bloque apenas se lee (en paralelo si
+    BIA_PARALLEL_WORKERS > 1), actualizando el progreso del job.
     """
-    Sube un archivo (CSV/XLS/XLSX) y prepara la vista previa de cambios.
+    prevalidadas: List[Dict[str, Any]] = []
+    with open(path, "rb") as fh:
+        columnas, chunks = read_upload_chunks(fh, chunk_rows=BULK_CHUNK_ROWS)
+
+        # Normalizar headers
+        columnas = [str(c).strip() for c in columnas]
+        if BUSINESS_KEY_FIELD not in columnas and "business_key" not in columnas:
+            raise BulkError(f"Falta la columna clave '{BUSINESS_KEY_FIELD}'")
+
+        def _bloques():
+            for chunk in chunks:
+                chunk = df_drop_blank_rows(chunk.rename(columns=lambda c: str(c).strip()))
+                if not chunk.empty:
+                    yield chunk
+
+        for parte in map_chunks(_prevalidar_shard, _bloques()):
+            prevalidadas.extend(parte)
+            _progreso(job, "leyendo", len(prevalidadas))
+
+    if not prevalidadas:
+        raise BulkError("El archivo está vacío.")
+    return prevalidadas
+
+
+def validar_bulk_upload(job: BulkJob, path) -> Dict[str, Any]:
+    """
+    Valida el archivo de Modificar Masivo ya guardado en disco (`path`) y arma
+    el staging de `job` (estado VALIDATING -> READY). Lo usan bulk_validate y la
+    tarea validar_bulk_job.
     Reglas clave:
     - INSERT: dni/cuit/nombre_apellido obligatorios (tras normalizar); fecha_apertura auto si falta;
               fecha_deuda < fecha_apertura; unicidad blanda (CANCELADO/CON DEUDA).
     - UPDATE: ignora celdas vacías (incluye NO-EDITABLES vacías). NO-EDITABLES con valor => error.
     - DELETE: basta id_pago_unico + __op=DELETE (otras columnas se ignoran).
-    """
-    f = request.FILES.get("archivo")
-    if not f:
-        return Response({"errors": ["Archivo requerido."]}, status=400)
 
-    file_bytes = f.read()
-    file_hash = _sha256_bytes(file_bytes)
-    name = f.name.lower()
-
-    # Leer en pandas
-    if name.endswith((".xlsx", ".xls")):
-        df = pd.read_excel(io.BytesIO(file_bytes))
-    else:
-        df = pd.read_csv(io.BytesIO(file_bytes))
+    Sin consultas por fila: filas actuales, entidades y conteos de activos
+    se precargan por conjuntos y el staging se escribe por lotes
+    (StagingBulkWriter). Una business_key repetida en el archivo se resuelve
+    antes de validar (queda la última fila, summary['duplicadas']); las filas
+    sin clave se guardan como "(auto)#n".
 
-    if df.empty:
-        return Response({"errors": ["El archivo está vacío."]}, status=400)
-
-    # Normalizar headers
-    df.rename(columns={c: str(c).strip() for c in df.columns}, inplace=True)
-    cols = [str(c).strip() for c in df.columns]
+    Devuelve el summary. Archivo inválido: BulkError y el job queda FAILED.
+    """
+    try:
+        return _validar_bulk_upload(job, path)
+    except Exception as e:
+        job.status = BulkJob.Status.FAILED
+        job.error_message = str(e)
+        job.save(update_fields=["status", "error_message"])
+        raise
 
-    if BUSINESS_KEY_FIELD not in cols and "business_key" not in cols:
-        return Response({"errors": [f"Falta la columna clave '{BUSINESS_KEY_FIELD}'"]}, status=400)
 
+def _validar_bulk_upload(job: BulkJob, path) -> Dict[str, Any]:
     fields_map = _model_concrete_fields(BaseDeDatosBia)
-    editable_cols = set(fields_map.keys()) - ({"id"} | NON_EDITABLE_FIELDS)
 
-    job = BulkJob.objects.create(
-        id=uuid.uuid4(),
-        filename=f.name,
-        file_hash=file_hash,
-        created_by=request.user,
-        status=BulkJob.Status.READY,
-        summary={},
-    )
+    # Normalización/validación por fila sin DB, bloque a bloque
+    prevalidadas = _prevalidar_archivo(job, path)
+    _progreso(job, "validando", 0, len(prevalidadas))
 
-    summary = {"total": int(len(df)), "ok": 0, "con_errores": 0, "updates": 0, "inserts": 0, "deletes": 0, "nochange": 0}
-    preview_rows: List[Dict[str, Any]] = []
+    summary = {"total": len(prevalidadas), "ok": 0, "con_errores": 0, "updates": 0, "inserts": 0, "deletes": 0, "nochange": 0, "duplicadas": 0}
     today = timezone.localdate()
 
-    with transaction.atomic():
-        for _, s in df.iterrows():
-            raw_row = {k: _normalize_val(v) for k, v in s.to_dict().items()}
-            bkey = _normalize_business_key(raw_row.get(BUSINESS_KEY_FIELD) or raw_row.get("business_key"))
-            op_in = str(raw_row.get("__op") or "").upper().strip()
-            if op_in and op_in not in ACCEPTED_OPS:
-                op_in = ""
-
-            # DELETE: ignorar demás columnas
-            if op_in == "DELETE":
-                current = BaseDeDatosBia.objects.filter(**{f"{BUSINESS_KEY_FIELD}": bkey}).first()
-                op = "DELETE" if current else "NOCHANGE"
-                errors = []
-                if not current:
-                    errors.append("DELETE ignorado: la clave no existe en DB.")
-                can_apply = (op == "DELETE") and len(errors) == 0 and ALLOW_DELETES
-                if not ALLOW_DELETES:
-                    errors.append("Borrado masivo deshabilitado por configuración.")
-                    can_apply = False
-
-                StagingBulkChange.objects.update_or_create(
-                    job=job,
-                    business_key=str(bkey) if bkey else "(sin_clave)",
-                    defaults=dict(op=op, payload=raw_row, validation_errors=errors, can_apply=can_apply),
-                )
-                summary["deletes"] += 1 if op == "DELETE" else 0
-                summary["nochange"] += 1 if op == "NOCHANGE" else 0
-                if can_apply:
-                    summary["ok"] += 1
-                else:
-                    summary["con_errores"] += 1
-                preview_rows.append({BUSINESS_KEY_FIELD: str(bkey) if bkey else "(sin_clave)", "op": op, "errors": errors, "changes": {}})
-                continue
+    # Claves repetidas dentro del archivo: se resuelven acá (gana la última fila)
+    prevalidadas, summary["duplicadas"] = _descartar_duplicadas(prevalidadas)
 
-            # Construir payload_clean (ignorando vacíos; no editables vacíos => ignorar)
-            payload_clean = {}
-            errors: List[str] = []
-            for k, v in raw_row.items():
-                if k in {BUSINESS_KEY_FIELD, "business_key", "__op"}:
-                    continue
-                if k not in fields_map:
-                    if _normalize_val(v) is not None:
-                        errors.append(f"Columna desconocida: {k}")
-                    continue
+    # Prefetch: filas actuales y entidades referenciadas, pocas consultas para todo el archivo
+    actuales = existing_rows(pre["bkey"] for pre in prevalidadas)
+    entidades = _EntidadesPrefetch(
+        (pre["raw_row"].get(ENTIDAD_FIELD) for pre in prevalidadas if pre["op_in"] != "DELETE"),
+        ids_extra=(o.entidad_id for o in actuales.values()),
+    )
 
-                is_non_editable = k in NON_EDITABLE_FIELDS
-                norm_v = _normalize_val(v)
+    # FK entidad: contra el prefetch (no en los workers)
+    for pre in prevalidadas:
+        if pre["op_in"] == "DELETE" or ENTIDAD_FIELD not in pre["payload_clean"]:
+            continue
+        payload_clean = pre["payload_clean"]
+        coerced, err = entidades.coerce(payload_clean[ENTIDAD_FIELD])
+        if err:
+            pre["errors"].append(err)
+            del payload_clean[ENTIDAD_FIELD]
+        else:
+            payload_clean[ENTIDAD_FIELD] = coerced
+
+    # Diff contra la base de todas las filas existentes de una vez, por columnas (utils_diff)
+    cambiados = campos_cambiados(
+        {pre["bkey"]: pre["payload_clean"] for pre in prevalidadas if pre["bkey"] and pre["op_in"] != "DELETE"},
+        actuales, fields_map,
+    )
 
-                # NO-EDITABLE vacía => ignorar
-                if is_non_editable and norm_v is None:
-                    continue
-                # NO-EDITABLE con valor => error
-                if is_non_editable and norm_v is not None:
-                    errors.append(f"Columna no editable: {k}")
-                    continue
+    # 1ra pasada (en memoria): op, cambios y errores de cada fila
+    items: List[Dict[str, Any]] = []
+    sin_clave = 0  # filas sin id_pago_unico: cada una con su propia clave de staging
+    for pre in prevalidadas:
+        raw_row = pre["raw_row"]
+        bkey = pre["bkey"]
+        op_in = pre["op_in"]
+        current = actuales.get(bkey) if bkey else None
+        if not bkey:
+            sin_clave += 1
+
+        # DELETE: ignorar demás columnas
+        if op_in == "DELETE":
+            op = "DELETE" if current else "NOCHANGE"
+            errors = []
+            if not current:
+                errors.append("DELETE ignorado: la clave no existe en DB.")
+            can_apply = (op == "DELETE") and len(errors) == 0 and ALLOW_DELETES
+            if not ALLOW_DELETES:
+                errors.append("Borrado masivo deshabilitado por configuración.")
+                can_apply = False
+            items.append({
+                "key": str(bkey) if bkey else f"{NO_KEY}#{sin_clave}", "op": op, "raw_row": raw_row,
+                "errors": errors, "can_apply": can_apply,
+                "activo": None, "previo": par_activo(current),
+                "clean": {}, "diff": {}, "snapshot": {},
+            })
+            continue
 
-                if k not in editable_cols:
-                    continue
-                if norm_v is None:
-                    continue
+        payload_clean = pre["payload_clean"]
+        errors: List[str] = pre["errors"]
+        activo = None  # (dni, entidad_id) si la fila queda activa (unicidad blanda)
 
-                # Normalización especial para dni/cuit
-                if k == "dni":
-                    nd = _normalize_dni(norm_v)
-                    if nd:
-                        payload_clean[k] = nd
-                    continue
-                if k == "cuit":
-                    nc = _normalize_cuit(norm_v)
-                    if nc:
-                        payload_clean[k] = nc
-                    continue
+        diff = {}
+        snapshot = {}
+        if current:
+            # UPDATE/NOCHANGE
+            diff = {k: payload_clean[k] for k in cambiados[bkey]}
+            op = "UPDATE" if diff else "NOCHANGE"
+            snapshot = _snapshot_fila(current, set(payload_clean) | REVALIDATION_FIELDS, fields_map)
 
-                coerced, err = _coerce_to_field(fields_map[k], norm_v)
-                if err:
-                    errors.append(err)
-                else:
-                    payload_clean[k] = coerced
-
-            current = BaseDeDatosBia.objects.filter(**{f"{BUSINESS_KEY_FIELD}": bkey}).first() if bkey else None
-
-            changes = {}
-            if current:
-                # UPDATE/NOCHANGE
-                for k, newv in payload_clean.items():
-                    oldv = getattr(current, f"{k}_id") if isinstance(fields_map[k], models.ForeignKey) else getattr(current, k, None)
-                    cmp_old = None if oldv is None else str(oldv)
-                    cmp_new = None if newv is None else (str(newv) if not hasattr(newv, "pk") else str(newv))
-                    if cmp_old != cmp_new:
-                        if k == ENTIDAD_FIELD:
-                            old_display = None
-                            if getattr(current, f"{k}_id") is not None:
-                                old_ent = getattr(current, k)
-                                old_display = f"{old_ent.id} · {getattr(old_ent, 'nombre', '')}"
-                            new_display = None
-                            if newv is not None:
-                                Entidad = _get_entidad_model()
-                                ent = Entidad.objects.filter(pk=newv).only("id", "nombre").first()
-                                new_display = f"{ent.id} · {ent.nombre}" if ent else str(newv)
-                            changes[k] = {"old": old_display, "new": new_display}
-                        else:
-                            changes[k] = {"old": getattr(current, k, None), "new": newv}
-                op = "UPDATE" if changes else "NOCHANGE"
-
-                if op == "UPDATE" and payload_clean:
-                    # Emails/Teléfonos (suaves)
-                    for ef in EMAIL_FIELDS:
-                        if ef in payload_clean and not _email_is_valid(str(payload_clean[ef])):
-                            errors.append(f"Email inválido en {ef}.")
-                    for pf in PHONE_FIELDS:
-                        if pf in payload_clean and not _phone_is_valid(str(payload_clean[pf])):
-                            errors.append(f"Teléfono inválido (solo dígitos) en {pf}.")
-
-                    # Fechas
-                    fa = payload_clean.get("fecha_apertura") or getattr(current, "fecha_apertura", None)
-                    fd = payload_clean.get("fecha_deuda") or getattr(current, "fecha_deuda", None)
-                    okd, msgd = _dates_are_valid(fa, fd, today)
-                    if not okd:
-                        errors.append(msgd)
-
-                    # Montos
-                    okm, msgm = _money_is_valid(payload_clean)
-                    if not okm:
-                        errors.append(msgm)
-
-                    # Estado/Subestado
-                    estado_val = _normalize_estado(payload_clean.get("estado") or getattr(current, "estado", None))
-                    sub_estado_val = _normalize_estado(payload_clean.get("sub_estado") or getattr(current, "sub_estado", None))
-                    oke, msge = _estado_is_valid(estado_val, sub_estado_val)
-                    if not oke:
-                        errors.append(msge)
-
-                    # Unicidad blanda (solo si estado activo)
-                    entidad_id = payload_clean.get("entidad") or getattr(current, "entidad_id", None)
-                    dni_val = payload_clean.get("dni") or getattr(current, "dni", None)
-                    if entidad_id and dni_val and _is_active_estado(estado_val):
-                        cnt = BaseDeDatosBia.objects.filter(
-                            dni=dni_val, entidad_id=entidad_id
-                        ).filter(Q(estado__iexact="CANCELADO") | Q(estado__iexact="CON DEUDA")).exclude(pk=current.pk).count()
-                        if cnt >= MAX_ACTIVOS_POR_DNI_ENTIDAD:
-                            errors.append(f"Regla de negocio: ya existen {cnt} registro(s) activo(s) para este DNI+Entidad (estados: CANCELADO / CON DEUDA).")
+            if op == "UPDATE" and payload_clean:
+                # Emails/Teléfonos (suaves, ya calculados en _prevalidar_fila)
+                errors.extend(pre["contact_errors"])
 
-            else:
-                # INSERT
-                op = "INSERT"
-
-                # Requeridos (tras normalizar)
-                dni_norm = _normalize_dni(raw_row.get("dni"))
-                cuit_norm = _normalize_cuit(raw_row.get("cuit"))
-                nombre_ok = bool(_normalize_val(raw_row.get("nombre_apellido")))
-                if not dni_norm:
-                    errors.append("Falta DNI (no se pudo normalizar).")
-                if not cuit_norm:
-                    errors.append("Falta CUIT (no se pudo normalizar).")
-                if not nombre_ok:
-                    errors.append("Falta nombre_apellido.")
-
-                if dni_norm:
-                    payload_clean["dni"] = dni_norm
-                if cuit_norm:
-                    payload_clean["cuit"] = cuit_norm
-
-                # Fechas: fecha_apertura hoy si falta; fecha_deuda < fecha_apertura
-                fa = payload_clean.get("fecha_apertura") or _normalize_val(raw_row.get("fecha_apertura")) or today
-                fd = payload_clean.get("fecha_deuda") or _normalize_val(raw_row.get("fecha_deuda"))
+                # Fechas
+                fa = payload_clean.get("fecha_apertura") or getattr(current, "fecha_apertura", None)
+                fd = payload_clean.get("fecha_deuda") or getattr(current, "fecha_deuda", None)
                 okd, msgd = _dates_are_valid(fa, fd, today)
                 if not okd:
                     errors.append(msgd)
@@ -663,329 +983,1054 @@ def bulk_validate(request):
                     errors.append(msgm)
 
                 # Estado/Subestado
-                estado_val = _normalize_estado(payload_clean.get("estado") or raw_row.get("estado"))
-                sub_estado_val = _normalize_estado(payload_clean.get("sub_estado") or raw_row.get("sub_estado"))
+                estado_val = _normalize_estado(payload_clean.get("estado") or getattr(current, "estado", None))
+                sub_estado_val = _normalize_estado(payload_clean.get("sub_estado") or getattr(current, "sub_estado", None))
                 oke, msge = _estado_is_valid(estado_val, sub_estado_val)
                 if not oke:
                     errors.append(msge)
 
-                # Unicidad blanda si activo
-                entidad_id = payload_clean.get("entidad")
-                if entidad_id is None and _normalize_val(raw_row.get("entidad")):
-                    coerced_ent, err_ent = _coerce_to_field(fields_map["entidad"], raw_row.get("entidad"))
-                    if not err_ent:
-                        entidad_id = coerced_ent
-                        payload_clean["entidad"] = entidad_id
-                dni_val = payload_clean.get("dni")
+                # Unicidad blanda (solo si estado activo): se cuenta en la 2da pasada
+                entidad_id = payload_clean.get("entidad") or getattr(current, "entidad_id", None)
+                dni_val = payload_clean.get("dni") or getattr(current, "dni", None)
                 if entidad_id and dni_val and _is_active_estado(estado_val):
-                    okuniq, msguniq = _soft_uniqueness_ok(dni_val, entidad_id, estado_val)
-                    if not okuniq:
-                        errors.append(msguniq)
-
-                # Preview de cambios (incluye (auto) para id)
-                for k, v in payload_clean.items():
-                    if k == ENTIDAD_FIELD and v is not None:
-                        Entidad = _get_entidad_model()
-                        ent = Entidad.objects.filter(pk=v).only("id", "nombre").first()
-                        disp = f"{ent.id} · {ent.nombre}" if ent else str(v)
-                        changes[k] = {"old": None, "new": disp}
-                    else:
-                        changes[k] = {"old": None, "new": v}
-                if not bkey:
-                    changes[BUSINESS_KEY_FIELD] = {"old": None, "new": "(auto)"}
-
-            can_apply = (op in {"UPDATE", "INSERT"}) and len(errors) == 0
-            StagingBulkChange.objects.update_or_create(
-                job=job,
-                business_key=str(bkey) if bkey else ("(auto)" if op == "INSERT" else "(sin_clave)"),
-                defaults=dict(op=op, payload=raw_row, validation_errors=errors, can_apply=can_apply if op != "DELETE" else False),
+                    activo = (str(dni_val), int(entidad_id))
+
+        else:
+            # INSERT
+            op = "INSERT"
+
+            # Requeridos (tras normalizar)
+            dni_norm = _normalize_dni(raw_row.get("dni"))
+            cuit_norm = _normalize_cuit(raw_row.get("cuit"))
+            nombre_ok = bool(_normalize_val(raw_row.get("nombre_apellido")))
+            if not dni_norm:
+                errors.append("Falta DNI (no se pudo normalizar).")
+            if not cuit_norm:
+                errors.append("Falta CUIT (no se pudo normalizar).")
+            if not nombre_ok:
+                errors.append("Falta nombre_apellido.")
+
+            if dni_norm:
+                payload_clean["dni"] = dni_norm
+            if cuit_norm:
+                payload_clean["cuit"] = cuit_norm
+
+            # Fechas: fecha_apertura hoy si falta; fecha_deuda < fecha_apertura
+            fa = payload_clean.get("fecha_apertura") or _normalize_val(raw_row.get("fecha_apertura")) or today
+            fd = payload_clean.get("fecha_deuda") or _normalize_val(raw_row.get("fecha_deuda"))
+            okd, msgd = _dates_are_valid(fa, fd, today)
+            if not okd:
+                errors.append(msgd)
+
+            # Montos
+            okm, msgm = _money_is_valid(payload_clean)
+            if not okm:
+                errors.append(msgm)
+
+            # Estado/Subestado
+            estado_val = _normalize_estado(payload_clean.get("estado") or raw_row.get("estado"))
+            sub_estado_val = _normalize_estado(payload_clean.get("sub_estado") or raw_row.get("sub_estado"))
+            oke, msge = _estado_is_valid(estado_val, sub_estado_val)
+            if not oke:
+                errors.append(msge)
+
+            # Unicidad blanda si activo (se cuenta en la 2da pasada)
+            entidad_id = payload_clean.get("entidad")
+            if entidad_id is None and _normalize_val(raw_row.get("entidad")):
+                coerced_ent, err_ent = entidades.coerce(raw_row.get("entidad"))
+                if not err_ent:
+                    entidad_id = coerced_ent
+                    payload_clean["entidad"] = entidad_id
+            dni_val = payload_clean.get("dni")
+            if entidad_id and dni_val and _is_active_estado(estado_val):
+                activo = (str(dni_val), int(entidad_id))
+
+            diff = dict(payload_clean)
+
+        items.append({
+            "key": str(bkey) if bkey else f"{AUTO_KEY if op == 'INSERT' else NO_KEY}#{sin_clave}",
+            "op": op, "raw_row": raw_row, "errors": errors,
+            "can_apply": None, "activo": activo, "previo": par_activo(current),
+            "clean": payload_clean, "diff": diff, "snapshot": snapshot,
+        })
+
+    # 2da pasada: unicidad blanda. Activos de la base en UNA consulta agrupada
+    # + lo que van activando (o liberando) las filas anteriores del mismo archivo
+    _progreso(job, "staging", 0, len(items))
+    activos = ActivosPorDniEntidad(
+        {it["activo"] for it in items if it["activo"]}
+        | {it["previo"] for it in items if it["previo"]}
+    )
+
+    with transaction.atomic(), StagingBulkWriter(job, expected_rows=len(items)) as staging:
+        for it in items:
+            op, errors = it["op"], it["errors"]
+            if it["activo"]:
+                cnt = activos.otros(it["activo"], it["previo"])
+                if cnt >= MAX_ACTIVOS_POR_DNI_ENTIDAD:
+                    errors.append(_msg_activos(cnt))
+
+            can_apply = it["can_apply"]
+            if can_apply is None:
+                can_apply = (op in {"UPDATE", "INSERT"}) and len(errors) == 0
+            if can_apply:
+                activos.aplicar(it["activo"] if op != "DELETE" else None, it["previo"])
+
+            staging.add(
+                it["key"], op=op, payload=it["raw_row"], validation_errors=errors, can_apply=can_apply,
+                clean_payload=it["clean"], diff=it["diff"], snapshot=it["snapshot"],
             )
 
             if op == "UPDATE":
                 summary["updates"] += 1
             elif op == "INSERT":
                 summary["inserts"] += 1
+            elif op == "DELETE":
+                summary["deletes"] += 1
             elif op == "NOCHANGE":
                 summary["nochange"] += 1
+            if can_apply:
+                summary["ok"] += 1
+            else:
+                summary["con_errores"] += 1
 
-            if op != "DELETE":
-                if can_apply:
-                    summary["ok"] += 1
-                else:
-                    summary["con_errores"] += 1
+    job.summary = summary
+    job.status = BulkJob.Status.READY
+    job.error_message = ""
+    job.save(update_fields=["summary", "status", "error_message"])
+    return summary
 
-            preview_rows.append({
-                BUSINESS_KEY_FIELD: str(bkey) if bkey else ("(auto)" if op == "INSERT" else "(sin_clave)"),
-                "op": op,
-                "errors": errors,
-                "changes": changes,
-            })
 
-    job.summary = summary
-    job.save(update_fields=["summary"])
+def _bulk_url(name: str, job: BulkJob) -> str:
+    return reverse(f"carga_datos:{name}") + f"?job_id={job.id}"
 
-    preview_html = render_preview_table(preview_rows, title="Vista previa — Modificación masiva")
 
-    return Response({"success": True, "job_id": str(job.id), "preview": preview_html, "summary": summary})
+def _bulk_links(job: BulkJob) -> Dict[str, str | None]:
+    """URLs de preview paginada y reporte de errores de un job ya validado."""
+    con_errores = (job.summary or {}).get("con_errores")
+    return {
+        "preview_url": _bulk_url("bulk_update_preview", job),
+        "errors_url": _bulk_url("bulk_update_errors_xlsx", job) if con_errores else None,
+    }
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, CanBulkModify])
+def bulk_validate(request):
+    """
+    Sube un archivo (CSV/XLS/XLSX) y prepara la vista previa de cambios
+    (reglas en validar_bulk_upload). Responde sólo el summary: las filas se
+    consultan paginadas en bulk-update/preview y los errores se descargan
+    en bulk-update/errors.xlsx / errors.csv.
+
+    El archivo se guarda en disco (TEMP_UPLOAD_DIR) en vez de leerse entero
+    en memoria y se procesa por bloques. Con background=true la validación
+    corre en Celery: responde 202 con job_id y el avance se consulta en
+    bulk-update/status.
+
+    Si el mismo archivo ya se validó y db_bia no cambió desde entonces, se
+    devuelve el BulkJob anterior tal cual (cached=true, ver utils_cache).
+    """
+    f = request.FILES.get("archivo")
+    if not f:
+        return Response({"errors": ["Archivo requerido."]}, status=400)
+    background = _es_verdadero(request.data.get("background"))
+
+    file_hash = file_sha256(f)
+
+    # Versión leída ANTES de validar: si algo cambia durante la validación, el
+    # job queda con una versión vieja y simplemente no se reusa.
+    db_version = db_bia_version()
+    previo = cached_bulk_job(file_hash, request.user, db_version)
+    if previo is not None:
+        return Response({
+            "success": True,
+            "job_id": str(previo.id),
+            "summary": previo.summary,
+            **_bulk_links(previo),
+            "cached": True,
+        })
+
+    job = BulkJob.objects.create(
+        id=uuid.uuid4(),
+        filename=f.name,
+        file_hash=file_hash,
+        created_by=request.user,
+        status=BulkJob.Status.VALIDATING,
+        summary={},
+        db_version=db_version,
+    )
+    # Spool a disco (por bloques); el nombre sale del id del job
+    path = save_raw_upload(job.id.hex, f, upload_extension(f))
+
+    if background:
+        try:
+            validar_bulk_job.delay(str(job.id))
+        except Exception as e:
+            delete_staged_upload(job.id.hex)
+            job.status = BulkJob.Status.FAILED
+            job.error_message = f"No se pudo encolar la tarea: {e}"
+            job.save(update_fields=["status", "error_message"])
+            return Response({"errors": ["Error al encolar la validación."]}, status=500)
+        return Response(
+            {"success": True, "job_id": str(job.id), "status": job.status, "status_url": _bulk_url("bulk_update_status", job)},
+            status=202,
+        )
+
+    try:
+        summary = validar_bulk_upload(job, path)
+    except BulkError as e:
+        return Response({"errors": [str(e)]}, status=400)
+    finally:
+        delete_staged_upload(job.id.hex)
+
+    return Response({"success": True, "job_id": str(job.id), "summary": summary, **_bulk_links(job)})
 
 
 # =========== COMMIT ===========
 
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated, IsAdminOrSuperuser])
-def bulk_commit(request):
+def _staging_por_bloques(staging_qs):
+    """Filas del staging en el orden del archivo (id), de a BULK_CHUNK_ROWS, sin cargarlas todas."""
+    filas = (
+        staging_qs.order_by("id")
+        .values(*STAGING_COMMIT_COLS)
+        .iterator(chunk_size=BULK_CHUNK_ROWS)
+    )
+    while lote := list(islice(filas, BULK_CHUNK_ROWS)):
+        yield lote
+
+
+def _staging_por_clave(staging_qs, desde: str, chunk_rows: int):
+    """
+    Bloques de chunk_rows filas ordenadas por business_key, a partir de `desde`
+    (excluida). Cada bloque es una consulta nueva (keyset), así no queda un
+    cursor abierto entre las transacciones de cada bloque.
+    """
+    qs = staging_qs.order_by("business_key").values(*STAGING_COMMIT_COLS)
+    while True:
+        lote = list((qs.filter(business_key__gt=desde) if desde else qs)[:chunk_rows])
+        if not lote:
+            return
+        yield lote
+        desde = lote[-1]["business_key"]
+
+
+def _fin_commit(job: BulkJob, status: str, error: str = ""):
+    """Commit que no terminó (rechazo/error): el job sale de COMMITTING con el motivo."""
+    summary = dict(job.summary or {})
+    summary.pop("progreso", None)
+    job.summary = summary
+    job.status = status
+    job.error_message = error
+    job.save(update_fields=["summary", "status", "error_message"])
+
+
+def aplicar_bulk_job(job: BulkJob, actor) -> Dict[str, Any]:
     """
-    Aplica el job:
+    Aplica el staging de `job` (estado COMMITTING, ver bulk_commit):
       - UPDATE/INSERT/DELETE
-      - INSERT: autogenera id si falta (secuencial desde DB max) y fecha_apertura hoy si falta.
+      - INSERT: autogenera id si falta (secuencia, ver allocate_id_pago_unico_block) y fecha_apertura hoy si falta.
       - UPDATE: ignora vacíos (incluye NO-EDITABLES vacías).
       - DELETE: elimina por id_pago_unico.
-      - Revalida reglas críticas.
+      - Aplica el diff que dejó bulk_validate en el staging (clean_payload/diff) sin
+        volver a normalizar; sólo revalida las filas con errores en la validación o
+        cuya fila en DB cambió desde entonces (snapshot distinto).
       - AuditLog por campo.
+      - Locks por clave (utils_locks) antes de leer las filas: jobs con claves
+        distintas confirman en paralelo; si se pisan, el segundo espera al primero
+        y revalida contra lo que éste dejó (un INSERT cuya clave ya existe se rechaza).
+    Sin job.commit_chunk_rows todo va en una transacción: un rechazo (BulkError)
+    revierte y el job vuelve a READY con el motivo en error_message; otro error
+    lo deja FAILED.
+    Con job.commit_chunk_rows se aplica por bloques de business_key ordenadas,
+    cada uno en su transacción junto con el checkpoint (commit_checkpoint). Si
+    falla con bloques ya aplicados el job queda PARTIAL y bulk_commit lo
+    reanuda desde el bloque siguiente al checkpoint.
+    Devuelve los contadores (también quedan en job.summary['commit']).
     """
-    job_id = request.data.get("job_id")
-    if not job_id:
-        return Response({"errors": ["'job_id' requerido."]}, status=400)
-
-    job = BulkJob.objects.filter(id=job_id, status=BulkJob.Status.READY).first()
-    if not job:
-        return Response({"errors": ["Job inválido o ya procesado."]}, status=400)
-
-    staging_qs = StagingBulkChange.objects.filter(job=job)
-    if not staging_qs.exists():
-        return Response({"errors": ["No hay staging para este job."]}, status=400)
-
-    fields_map = _model_concrete_fields(BaseDeDatosBia)
-    editable_cols = set(fields_map.keys()) - ({"id"} | NON_EDITABLE_FIELDS)
+    try:
+        return _aplicar_bulk_job(job, actor)
+    except Exception as e:
+        if job.commit_checkpoint:
+            _fin_commit(job, BulkJob.Status.PARTIAL, str(e))
+        elif isinstance(e, BulkError):
+            _fin_commit(job, BulkJob.Status.READY, str(e))
+        else:
+            _fin_commit(job, BulkJob.Status.FAILED, str(e))
+        raise
 
-    rows = list(staging_qs.values("business_key", "op", "payload"))
-    keys = [r["business_key"] for r in rows if r["business_key"] and r["business_key"] not in {"(auto)", "(sin_clave)"}]
 
-    existentes = {getattr(o, BUSINESS_KEY_FIELD): o for o in BaseDeDatosBia.objects.filter(**{f"{BUSINESS_KEY_FIELD}__in": keys})}
+class _CambiosCommit:
+    """
+    Cambios de un commit (todo el job, o un bloque en el modo por bloques):
+    agregar() junta las filas del staging y aplicar() chequea la unicidad
+    blanda, asigna ids y persiste (llamarlo dentro de la transacción).
+    """
 
-    updates_instances = []
-    inserts_instances = []
-    deletes_keys = []
-    changed_fields_union = set()
-    pending_inserts_payloads = []
-    today = timezone.localdate()
+    def __init__(self, job: BulkJob, actor, fields_map: Dict[str, models.Field], today: datetime.date):
+        self.fields_map = fields_map
+        self.today = today
+        # AuditLog por lotes; un rechazo revierte la transacción, incluida la auditoría ya enviada
+        self.audit = AuditBuffer(job=job, actor=actor)
+        self.updates_instances = []
+        self.deletes_keys = []
+        self.changed_fields_union = set()
+        self.pending_inserts_payloads = []
+        # (fila, par dni+entidad en que queda activa o None, par en que estaba activa) en orden
+        self.movimientos_activos = []
+        self.revalidadas = 0
+
+    def agregar(self, lote: List[Dict[str, Any]]):
+        fields_map, today, audit = self.fields_map, self.today, self.audit
+
+        # Filas actuales del bloque: un round trip (unnest/JOIN en PostgreSQL)
+        existentes = existing_rows(
+            r["business_key"] for r in lote if not _es_clave_sin_asignar(r["business_key"])
+        )
 
-    with transaction.atomic():
-        for r in rows:
+        # UPDATE validado ok y sin cambios en DB desde entonces: se aplica el diff guardado.
+        # Si no, se revalida contra el estado actual y el diff se recalcula (todo el bloque junto).
+        revalidar = {}
+        for r in lote:
+            obj = existentes.get(r["business_key"])
+            if (r["op"] or "").upper() == "UPDATE" and obj is not None and not (
+                r["can_apply"] and _snapshot_fila(obj, r["snapshot"], fields_map) == r["snapshot"]
+            ):
+                revalidar[r["business_key"]] = _decodificar_payload(r["clean_payload"], fields_map)
+        recalculados = campos_cambiados(revalidar, existentes, fields_map)
+
+        for r in lote:
             bkey = r["business_key"]
             op = (r["op"] or "").upper()
-            raw = r["payload"] or {}
+            clean = r["clean_payload"]
 
             # DELETE
             if op == "DELETE" and ALLOW_DELETES:
                 if bkey in existentes:
-                    deletes_keys.append(bkey)
-                    AuditLog.objects.create(
-                        table_name=BaseDeDatosBia._meta.db_table,
-                        business_key=str(bkey),
-                        field="*",
-                        old_value="(row)",
-                        new_value=None,
-                        job=job,
-                        action=AuditLog.Action.DELETE,
-                        actor=request.user,
-                    )
+                    self.deletes_keys.append(bkey)
+                    self.movimientos_activos.append((bkey, None, par_activo(existentes[bkey])))
+                    # La fila completa queda en el AuditLog para poder recrearla (bulk-update/rollback)
+                    audit.add(AuditLog.Action.DELETE, bkey, "*", _fila_json(existentes[bkey]), None)
                 continue
 
-            # payload_clean (ignora vacíos; no aplica no-editables)
-            payload_clean = {}
-            for k, v in raw.items():
-                if k in {BUSINESS_KEY_FIELD, "business_key", "__op"}:
-                    continue
-                if k not in fields_map:
-                    continue
-                norm_v = _normalize_val(v)
-
-                if k in NON_EDITABLE_FIELDS:
-                    # vacía -> ignorar; con valor -> ignorar (defensa)
-                    continue
-                if k not in editable_cols:
-                    continue
-                if norm_v is None:
-                    continue
-
-                if k == "dni":
-                    nd = _normalize_dni(norm_v)
-                    if nd:
-                        payload_clean[k] = nd
-                    continue
-                if k == "cuit":
-                    nc = _normalize_cuit(norm_v)
-                    if nc:
-                        payload_clean[k] = nc
-                    continue
-
-                coerced, err = _coerce_to_field(fields_map[k], norm_v)
-                if err:
-                    continue
-                payload_clean[k] = coerced
-
             if op == "UPDATE":
                 obj = existentes.get(bkey)
                 if not obj:
                     continue
 
-                # Revalidaciones
-                fa = payload_clean.get("fecha_apertura") or getattr(obj, "fecha_apertura", None)
-                fd = payload_clean.get("fecha_deuda") or getattr(obj, "fecha_deuda", None)
-                okd, msgd = _dates_are_valid(fa, fd, today)
-                if not okd:
-                    return Response({"errors": [f"Fila {bkey}: {msgd}"]}, status=400)
-                okm, msgm = _money_is_valid(payload_clean)
-                if not okm:
-                    return Response({"errors": [f"Fila {bkey}: {msgm}"]}, status=400)
-                estado_val = _normalize_estado(payload_clean.get("estado") or getattr(obj, "estado", None))
-                sub_estado_val = _normalize_estado(payload_clean.get("sub_estado") or getattr(obj, "sub_estado", None))
-                oke, msge = _estado_is_valid(estado_val, sub_estado_val)
-                if not oke:
-                    return Response({"errors": [f"Fila {bkey}: {msge}"]}, status=400)
-                for ef in EMAIL_FIELDS:
-                    if ef in payload_clean and not _email_is_valid(str(payload_clean[ef])):
-                        return Response({"errors": [f"Fila {bkey}: Email inválido en {ef}."]}, status=400)
-                for pf in PHONE_FIELDS:
-                    if pf in payload_clean and not _phone_is_valid(str(payload_clean[pf])):
-                        return Response({"errors": [f"Fila {bkey}: Teléfono inválido en {pf} (solo dígitos)."]}, status=400)
-
-                entidad_id = payload_clean.get("entidad") or getattr(obj, "entidad_id", None)
-                dni_val = payload_clean.get("dni") or getattr(obj, "dni", None)
-                if entidad_id and dni_val and _is_active_estado(estado_val):
-                    cnt = BaseDeDatosBia.objects.filter(
-                        dni=dni_val, entidad_id=entidad_id
-                    ).filter(Q(estado__iexact="CANCELADO") | Q(estado__iexact="CON DEUDA")).exclude(pk=obj.pk).count()
-                    if cnt >= MAX_ACTIVOS_POR_DNI_ENTIDAD:
-                        return Response({"errors": [f"Fila {bkey}: Regla de negocio: ya existen {cnt} registro(s) activo(s) para este DNI+Entidad (estados: CANCELADO / CON DEUDA)."]}, status=400)
+                if bkey in revalidar:
+                    self.revalidadas += 1
+                    payload_clean = revalidar[bkey]
+                    err = _revalidar_fila(op, payload_clean, obj, today)
+                    if err:
+                        raise BulkError(f"Fila {bkey}: {err}")
+                    cambios = {k: payload_clean[k] for k in recalculados[bkey]}
+                else:
+                    cambios = _decodificar_payload(r["diff"], fields_map)
+
+                # Unicidad blanda: se chequea en aplicar(), para todas las filas juntas
+                self.movimientos_activos.append((bkey, _par_activo_payload(clean, obj), par_activo(obj)))
 
                 # Aplicar
-                local_changed = []
-                for k, newv in payload_clean.items():
-                    oldv = getattr(obj, f"{k}_id") if isinstance(fields_map[k], models.ForeignKey) else getattr(obj, k, None)
-                    cmp_old = None if oldv is None else str(oldv)
-                    cmp_new = None if newv is None else str(newv)
-                    if cmp_old != cmp_new:
-                        if isinstance(fields_map[k], models.ForeignKey):
-                            setattr(obj, f"{k}_id", newv)
-                        else:
-                            setattr(obj, k, newv)
-                        local_changed.append(k)
-                        AuditLog.objects.create(
-                            table_name=BaseDeDatosBia._meta.db_table,
-                            business_key=str(bkey),
-                            field=k,
-                            old_value=str(oldv) if oldv is not None else None,
-                            new_value=str(newv) if newv is not None else None,
-                            job=job,
-                            action=AuditLog.Action.UPDATE,
-                            actor=request.user,
-                        )
-                if local_changed:
-                    updates_instances.append(obj)
-                    changed_fields_union.update(local_changed)
+                for k, newv in cambios.items():
+                    attname = fields_map[k].attname
+                    audit.add(AuditLog.Action.UPDATE, bkey, k, getattr(obj, attname), newv)
+                    setattr(obj, attname, newv)
+                if cambios:
+                    self.updates_instances.append(obj)
+                    self.changed_fields_union.update(cambios)
 
             elif op == "INSERT" and ALLOW_INSERTS:
-                # Requeridos normalizados
-                dni_norm = _normalize_dni(raw.get("dni"))
-                cuit_norm = _normalize_cuit(raw.get("cuit"))
-                nombre_ok = bool(_normalize_val(raw.get("nombre_apellido")))
-                if not dni_norm or not cuit_norm or not nombre_ok:
-                    return Response({"errors": [f"Fila {bkey or '(auto)'}: faltan dni/cuit/nombre_apellido (tras normalizar)."]}, status=400)
-                payload_clean.setdefault("dni", dni_norm)
-                payload_clean.setdefault("cuit", cuit_norm)
-
-                # Fechas
+                if bkey in existentes:
+                    raise BulkError(f"Fila {bkey}: la clave ya existe (la cargó otro commit después de validar).")
+                payload_clean = _decodificar_payload(r["diff"], fields_map)
                 payload_clean.setdefault("fecha_apertura", today)
-                okd, msgd = _dates_are_valid(payload_clean.get("fecha_apertura"), payload_clean.get("fecha_deuda"), today)
-                if not okd:
-                    return Response({"errors": [f"Fila {bkey or '(auto)'}: {msgd}"]}, status=400)
-
-                # Montos
-                okm, msgm = _money_is_valid(payload_clean)
-                if not okm:
-                    return Response({"errors": [f"Fila {bkey or '(auto)'}: {msgm}"]}, status=400)
-
-                # Estado/Subestado
-                estado_val = _normalize_estado(payload_clean.get("estado") or raw.get("estado"))
-                sub_estado_val = _normalize_estado(payload_clean.get("sub_estado") or raw.get("sub_estado"))
-                oke, msge = _estado_is_valid(estado_val, sub_estado_val)
-                if not oke:
-                    return Response({"errors": [f"Fila {bkey or '(auto)'}: {msge}"]}, status=400)
+                if not r["can_apply"]:
+                    self.revalidadas += 1
+                    err = _revalidar_fila(op, payload_clean, None, today)
+                    if err:
+                        raise BulkError(f"Fila {bkey or AUTO_KEY}: {err}")
 
                 # Unicidad blanda si activo
-                entidad_id = payload_clean.get("entidad")
-                if entidad_id is None and _normalize_val(raw.get("entidad")):
-                    coerced_ent, err_ent = _coerce_to_field(fields_map["entidad"], raw.get("entidad"))
-                    if not err_ent:
-                        entidad_id = coerced_ent
-                        payload_clean["entidad"] = entidad_id
-                dni_val = payload_clean.get("dni")
-                if entidad_id and dni_val and _is_active_estado(estado_val):
-                    okuniq, msguniq = _soft_uniqueness_ok(dni_val, entidad_id, estado_val)
-                    if not okuniq:
-                        return Response({"errors": [f"Fila {bkey or '(auto)'}: {msguniq}"]}, status=400)
+                par = _par_activo_payload(clean)
+                if par:
+                    self.movimientos_activos.append((bkey or AUTO_KEY, par, None))
 
-                pending_inserts_payloads.append({
-                    "bkey": (bkey if (bkey and bkey not in {"(auto)", "(sin_clave)"}) else None),
-                    "payload_clean": payload_clean.copy()
+                self.pending_inserts_payloads.append({
+                    "bkey": (None if _es_clave_sin_asignar(bkey) else bkey),
+                    "payload_clean": payload_clean,
                 })
 
-        # Asignar ids automáticos
-        need_auto = sum(1 for it in pending_inserts_payloads if not it["bkey"])
-        auto_ids = _allocate_sequential_ids_from_db_max(need_auto) if need_auto else []
+    def aplicar(self) -> Dict[str, int]:
+        fields_map, audit = self.fields_map, self.audit
+        movimientos_activos = self.movimientos_activos
+
+        # Unicidad blanda (DNI+Entidad activos): conteos de la base en una consulta
+        # + lo que van activando/liberando las filas anteriores
+        activos = ActivosPorDniEntidad(
+            {par for _, par, _ in movimientos_activos if par} | {prev for _, _, prev in movimientos_activos if prev}
+        )
+        for fila, par, previo in movimientos_activos:
+            if par is not None:
+                cnt = activos.otros(par, previo)
+                if cnt >= MAX_ACTIVOS_POR_DNI_ENTIDAD:
+                    raise BulkError(f"Fila {fila}: {_msg_activos(cnt)}")
+            activos.aplicar(par, previo)
+
+        # Asignar ids automáticos (secuencia; se saltean las claves explícitas del archivo)
+        need_auto = sum(1 for it in self.pending_inserts_payloads if not it["bkey"])
+        auto_ids = allocate_id_pago_unico_block(
+            need_auto, evitar=(it["bkey"] for it in self.pending_inserts_payloads if it["bkey"]),
+        )
         auto_iter = iter(auto_ids)
 
-        for it in pending_inserts_payloads:
+        inserts_instances = []
+        for it in self.pending_inserts_payloads:
             final_bkey = it["bkey"] or next(auto_iter)
             obj = BaseDeDatosBia(**{BUSINESS_KEY_FIELD: final_bkey})
             for k, v in it["payload_clean"].items():
-                if isinstance(fields_map[k], models.ForeignKey):
-                    setattr(obj, f"{k}_id", v)
-                else:
-                    setattr(obj, k, v)
+                setattr(obj, fields_map[k].attname, v)
             inserts_instances.append(obj)
 
-            AuditLog.objects.create(
-                table_name=BaseDeDatosBia._meta.db_table,
-                business_key=str(final_bkey),
-                field=BUSINESS_KEY_FIELD,
-                old_value=None,
-                new_value=str(final_bkey),
-                job=job,
-                action=AuditLog.Action.INSERT,
-                actor=request.user,
-            )
+            audit.add(AuditLog.Action.INSERT, final_bkey, BUSINESS_KEY_FIELD, None, final_bkey)
             for k, newv in it["payload_clean"].items():
-                AuditLog.objects.create(
-                    table_name=BaseDeDatosBia._meta.db_table,
-                    business_key=str(final_bkey),
-                    field=k,
-                    old_value=None,
-                    new_value=str(newv) if newv is not None else None,
-                    job=job,
-                    action=AuditLog.Action.INSERT,
-                    actor=request.user,
-                )
+                audit.add(AuditLog.Action.INSERT, final_bkey, k, None, newv)
 
         # Persistencia
         if inserts_instances:
             BaseDeDatosBia.objects.bulk_create(inserts_instances, ignore_conflicts=True)
-        if updates_instances and changed_fields_union:
-            BaseDeDatosBia.objects.bulk_update(updates_instances, fields=list(changed_fields_union))
-        if ALLOW_DELETES and deletes_keys:
-            BaseDeDatosBia.objects.filter(**{f"{BUSINESS_KEY_FIELD}__in": deletes_keys}).delete()
+        if self.updates_instances and self.changed_fields_union:
+            BaseDeDatosBia.objects.bulk_update(self.updates_instances, fields=list(self.changed_fields_union))
+        if ALLOW_DELETES and self.deletes_keys:
+            BaseDeDatosBia.objects.filter(**{f"{BUSINESS_KEY_FIELD}__in": self.deletes_keys}).delete()
+        audit.flush()
+        touch_db_bia()
+
+        return {
+            "inserted_count": len(inserts_instances),
+            "updated_count": len(self.updates_instances),
+            "deleted_count": len(self.deletes_keys) if ALLOW_DELETES else 0,
+            "revalidated_count": self.revalidadas,
+        }
+
+
+def _marcar_committed(job: BulkJob, resultado: Dict[str, int]):
+    summary = dict(job.summary or {})
+    summary.pop("progreso", None)
+    summary["commit"] = resultado
+    job.summary = summary
+    job.status = BulkJob.Status.COMMITTED
+    job.committed_at = timezone.now()
+    job.error_message = ""
+    job.save(update_fields=["summary", "status", "committed_at", "error_message"])
+
+
+def _aplicar_bulk_job(job: BulkJob, actor) -> Dict[str, Any]:
+    staging_qs = StagingBulkChange.objects.filter(job=job)
+
+    # Staging de antes de guardar clean_payload/diff/snapshot: no se puede aplicar sin revalidar
+    if staging_qs.filter(clean_payload__isnull=True).exists():
+        raise BulkError("El job se validó con una versión anterior; volvé a validar el archivo.")
+
+    fields_map = _model_concrete_fields(BaseDeDatosBia)
+    today = timezone.localdate()
+
+    if job.commit_chunk_rows:
+        return _aplicar_por_bloques(job, actor, staging_qs, fields_map, today)
+
+    _progreso(job, "aplicando", 0, staging_qs.count())
+
+    with transaction.atomic():
+        # La fila del job queda tomada hasta el commit: mientras esto corre,
+        # _tomar_job_para_commit no lo reclama como colgado
+        BulkJob.objects.select_for_update().filter(pk=job.pk).values_list("pk", flat=True).first()
+        _bloquear_claves(staging_qs.values_list("business_key", flat=True).iterator())
+        cambios = _CambiosCommit(job, actor, fields_map, today)
+        # Orden del archivo (mismo que usó bulk_validate para la unicidad blanda), por bloques
+        for lote in _staging_por_bloques(staging_qs):
+            cambios.agregar(lote)
+        resultado = cambios.aplicar()
+        _marcar_committed(job, resultado)
+
+    return resultado
+
+
+def _aplicar_por_bloques(job: BulkJob, actor, staging_qs, fields_map, today) -> Dict[str, Any]:
+    """
+    Modo por bloques: cada bloque de job.commit_chunk_rows business_keys (en orden)
+    se aplica en su propia transacción, que también guarda el checkpoint y los
+    contadores acumulados; así un corte no deja un bloque a medias ni un
+    checkpoint adelantado. La unicidad blanda se chequea contra la base (ya con
+    los bloques anteriores aplicados) + las filas del bloque.
+    """
+    total = staging_qs.count()
+    desde = job.commit_checkpoint
+    if desde:
+        resultado = dict((job.summary or {}).get("commit") or {})
+        procesadas = staging_qs.filter(business_key__lte=desde).count()
+    else:
+        resultado = {}
+        procesadas = 0
+    for k in ("inserted_count", "updated_count", "deleted_count", "revalidated_count"):
+        resultado.setdefault(k, 0)
+
+    _progreso(job, "aplicando", procesadas, total)
+
+    for lote in _staging_por_clave(staging_qs, desde, job.commit_chunk_rows):
+        with transaction.atomic():
+            _bloquear_claves(r["business_key"] for r in lote)
+            cambios = _CambiosCommit(job, actor, fields_map, today)
+            cambios.agregar(lote)
+            for k, v in cambios.aplicar().items():
+                resultado[k] += v
+
+            procesadas += len(lote)
+            summary = dict(job.summary or {})
+            summary["commit"] = resultado
+            summary["progreso"] = {"fase": "aplicando", "procesadas": procesadas, "total": total}
+            job.summary = summary
+            job.commit_checkpoint = lote[-1]["business_key"]
+            job.checkpoint_at = timezone.now()
+            job.save(update_fields=["summary", "commit_checkpoint", "checkpoint_at"])
+
+    _marcar_committed(job, resultado)
+    return resultado
+
+
+def _tomar_job_para_commit(job_id, chunk_rows: int | None) -> BulkJob | None:
+    """
+    Pasa el job a COMMITTING con un UPDATE condicional (dos commits del mismo job
+    no corren a la vez). Se puede tomar:
+      - READY: commit nuevo (chunk_rows = None -> una sola transacción).
+      - PARTIAL: reanuda el commit por bloques desde el checkpoint.
+      - COMMITTING por bloques sin avance hace más de BULK_COMMIT_STALE_SECONDS:
+        el worker se cortó (no hay nada a medias: cada bloque es atómico).
+      - COMMITTING de una sola transacción empezado hace más de
+        BULK_COMMIT_STALE_SECONDS y cuya fila no está tomada (el worker se cortó y
+        la transacción se revirtió): vuelve a empezar de cero, como si fuera READY.
+    """
+    stale = timezone.now() - datetime.timedelta(seconds=BULK_COMMIT_STALE_SECONDS)
+    reanudable = Q(status=BulkJob.Status.PARTIAL) | Q(
+        status=BulkJob.Status.COMMITTING, commit_chunk_rows__isnull=False, checkpoint_at__lt=stale,
+    )
+    qs = BulkJob.objects.filter(id=job_id)
+    desde_cero = dict(
+        status=BulkJob.Status.COMMITTING, error_message="",
+        commit_chunk_rows=chunk_rows, commit_checkpoint="", checkpoint_at=timezone.now(),
+    )
+    if qs.filter(status=BulkJob.Status.READY).update(**desde_cero):
+        return qs.first()
+    if qs.filter(reanudable).update(
+        status=BulkJob.Status.COMMITTING, error_message="", checkpoint_at=timezone.now(),
+    ):
+        return qs.first()
+    with transaction.atomic():
+        # skip_locked: un commit de una sola transacción que sigue corriendo tiene la fila tomada
+        colgado = (
+            qs.select_for_update(skip_locked=True)
+            .filter(status=BulkJob.Status.COMMITTING, commit_chunk_rows__isnull=True, checkpoint_at__lt=stale)
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if colgado and qs.update(**desde_cero):
+            return qs.first()
+    return None
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, IsAdminOrSuperuser])
+def bulk_commit(request):
+    """
+    Aplica el job validado (reglas en aplicar_bulk_job).
+
+    Con background=true corre en Celery: responde 202 con job_id y el avance
+    se consulta en bulk-update/status.
+    Con chunked=true (opcional chunk_rows=N, default BIA_BULK_COMMIT_CHUNK_ROWS)
+    aplica por bloques, cada uno en su transacción. Un job PARTIAL (commit por
+    bloques cortado) se reanuda llamando de nuevo a bulk_commit con su job_id.
+    """
+    job_id = request.data.get("job_id")
+    if not job_id:
+        return Response({"errors": ["'job_id' requerido."]}, status=400)
+    background = _es_verdadero(request.data.get("background"))
+
+    chunk_rows = None
+    if _es_verdadero(request.data.get("chunked")):
+        try:
+            chunk_rows = int(request.data.get("chunk_rows", BULK_COMMIT_CHUNK_ROWS))
+        except (TypeError, ValueError):
+            return Response({"errors": ["'chunk_rows' debe ser un entero."]}, status=400)
+        if chunk_rows <= 0:
+            return Response({"errors": ["'chunk_rows' debe ser mayor a 0."]}, status=400)
+
+    if not StagingBulkChange.objects.filter(job_id=job_id).exists():
+        if not BulkJob.objects.filter(id=job_id).exists():
+            return Response({"errors": ["Job inválido o ya procesado."]}, status=400)
+        return Response({"errors": ["No hay staging para este job."]}, status=400)
+
+    job = _tomar_job_para_commit(job_id, chunk_rows)
+    if not job:
+        return Response({"errors": ["Job inválido o ya procesado."]}, status=400)
+
+    if background:
+        try:
+            confirmar_bulk_job.delay(str(job.id), request.user.pk)
+        except Exception as e:
+            _fin_commit(
+                job, BulkJob.Status.PARTIAL if job.commit_checkpoint else BulkJob.Status.READY,
+                f"No se pudo encolar la tarea: {e}",
+            )
+            return Response({"errors": ["Error al encolar el commit."]}, status=500)
+        return Response(
+            {"success": True, "job_id": str(job.id), "status": job.status, "status_url": _bulk_url("bulk_update_status", job)},
+            status=202,
+        )
+
+    try:
+        resultado = aplicar_bulk_job(job, request.user)
+    except BulkError as e:
+        return Response({"errors": [str(e)], "status": job.status}, status=400)
+
+    return Response({"success": True, **resultado, "status": job.status})
+
+
+# =========== ROLLBACK ===========
+
+
+def _cambios_del_job(job: BulkJob):
+    """
+    (business_key, acción, [(campo, old, new), ...]) de lo que aplicó el commit del
+    job, agrupado por clave: el AuditLog se lee en UN recorrido ordenado (iterator).
+    """
+    qs = (
+        AuditLog.objects
+        .filter(job=job, action__in=[AuditLog.Action.UPDATE, AuditLog.Action.INSERT, AuditLog.Action.DELETE])
+        .order_by("business_key", "id")
+        .values_list("business_key", "action", "field", "old_value", "new_value")
+    )
+    for bkey, filas in groupby(qs.iterator(chunk_size=BULK_ROLLBACK_BATCH), key=itemgetter(0)):
+        filas = list(filas)
+        yield bkey, filas[0][1], [(campo, old, new) for _, _, campo, old, new in filas]
+
+
+class _Reversion:
+    """
+    Reversión de un job por lotes de claves (llamar dentro de la transacción):
+      - UPDATE: vuelve los campos a old_value (bulk_update).
+      - INSERT: borra la fila creada.
+      - DELETE: recrea la fila desde la copia JSON del AuditLog (bulk_create).
+    Conflicto = la fila cambió después del commit (campos distintos a lo que dejó
+    el job, ya no existe o volvió a existir) o restaurarla rompe la unicidad
+    blanda. Las filas en conflicto no se tocan.
+    """
+
+    def __init__(self, job: BulkJob, actor, fields_map: Dict[str, models.Field]):
+        self.fields_map = fields_map
+        self.audit = AuditBuffer(job=job, actor=actor)
+        self.conflictos: List[Dict[str, str]] = []
+        self.conteos = {"restored_count": 0, "removed_count": 0, "recreated_count": 0}
+
+    def _conflicto(self, bkey: str, motivo: str):
+        self.conflictos.append({"business_key": bkey, "motivo": motivo})
+
+    def lote(self, grupos: List[Tuple[str, str, list]]):
+        fields_map, audit = self.fields_map, self.audit
+        actuales = existing_rows(bkey for bkey, _, _ in grupos)
+
+        restaurar: Dict[str, Dict[str, Any]] = {}
+        borrar: Dict[str, BaseDeDatosBia] = {}
+        recrear: Dict[str, BaseDeDatosBia] = {}
+        esperados: Dict[str, Dict[str, Any]] = {}  # lo que dejó el commit, para detectar cambios posteriores
+        for bkey, action, campos in grupos:
+            obj = actuales.get(bkey)
+            if action == AuditLog.Action.DELETE:
+                if obj is not None:
+                    self._conflicto(bkey, "la fila borrada volvió a existir.")
+                    continue
+                try:
+                    recrear[bkey] = _fila_desde_json(campos[0][1])
+                except ValueError:
+                    self._conflicto(bkey, "el AuditLog no tiene la copia de la fila borrada.")
+                continue
+
+            if obj is None:
+                self._conflicto(bkey, "la fila ya no existe.")
+                continue
+            valores = [(k, old, new) for k, old, new in campos if k in fields_map and k != BUSINESS_KEY_FIELD]
+            esperados[bkey] = {k: fields_map[k].to_python(new) for k, _, new in valores}
+            if action == AuditLog.Action.INSERT:
+                borrar[bkey] = obj
+            else:
+                restaurar[bkey] = {k: fields_map[k].to_python(old) for k, old, _ in valores}
+
+        for bkey, cambiados in campos_cambiados(esperados, actuales, fields_map).items():
+            if cambiados:
+                self._conflicto(bkey, f"modificada después del commit ({', '.join(cambiados)}).")
+                restaurar.pop(bkey, None)
+                borrar.pop(bkey, None)
+
+        # Unicidad blanda (DNI+Entidad activos) del estado restaurado: primero lo que libera
+        movimientos = [(bkey, None, par_activo(obj)) for bkey, obj in borrar.items()]
+        for bkey, valores in restaurar.items():
+            obj = actuales[bkey]
+            previo = par_activo(obj)
+            for k, v in valores.items():
+                valores[k] = (getattr(obj, fields_map[k].attname), v)  # (actual, restaurado) para el audit
+                setattr(obj, fields_map[k].attname, v)
+            movimientos.append((bkey, par_activo(obj), previo))
+        movimientos += [(bkey, par_activo(obj), None) for bkey, obj in recrear.items()]
+        movimientos.sort(key=lambda m: m[1] is not None)
+
+        activos = ActivosPorDniEntidad(
+            {par for _, par, _ in movimientos if par} | {prev for _, _, prev in movimientos if prev}
+        )
+        for bkey, par, previo in movimientos:
+            if par is not None:
+                cnt = activos.otros(par, previo)
+                if cnt >= MAX_ACTIVOS_POR_DNI_ENTIDAD:
+                    self._conflicto(bkey, _msg_activos(cnt))
+                    restaurar.pop(bkey, None)
+                    recrear.pop(bkey, None)
+                    continue
+            activos.aplicar(par, previo)
+
+        # Persistencia + auditoría propia (REVERT)
+        if borrar:
+            for bkey, obj in borrar.items():
+                audit.add(AuditLog.Action.REVERT, bkey, "*", _fila_json(obj), None)
+            BaseDeDatosBia.objects.filter(pk__in=[obj.pk for obj in borrar.values()]).delete()
+        if restaurar:
+            campos_union = set()
+            for bkey, valores in restaurar.items():
+                for k, (old, new) in valores.items():
+                    audit.add(AuditLog.Action.REVERT, bkey, k, old, new)
+                campos_union.update(valores)
+            if campos_union:
+                BaseDeDatosBia.objects.bulk_update(
+                    [actuales[bkey] for bkey in restaurar], fields=list(campos_union), batch_size=BULK_ROLLBACK_BATCH,
+                )
+        if recrear:
+            BaseDeDatosBia.objects.bulk_create(list(recrear.values()), batch_size=BULK_ROLLBACK_BATCH)
+            for bkey, obj in recrear.items():
+                audit.add(AuditLog.Action.REVERT, bkey, "*", None, _fila_json(obj))
+        audit.flush()
+
+        self.conteos["restored_count"] += len(restaurar)
+        self.conteos["removed_count"] += len(borrar)
+        self.conteos["recreated_count"] += len(recrear)
+
+
+def revertir_bulk_job(job_id, actor, *, skip_conflicts: bool = False) -> Dict[str, Any]:
+    """
+    Vuelve db_bia al estado previo al commit del job (COMMITTED o PARTIAL: sólo
+    lo que llegó a aplicarse), a partir de su AuditLog: consultas por lote de
+    BULK_ROLLBACK_BATCH claves y bulk_update/bulk_create/delete, todo en una
+    transacción. Cada fila revertida deja su AuditLog (acción REVERT) en el job.
+    Con conflictos (ver _Reversion) no se revierte nada (BulkError con las claves),
+    salvo skip_conflicts=True: se revierte el resto y se informan.
+    El job queda ROLLED_BACK con los contadores en job.summary['rollback'].
+    """
+    with transaction.atomic():
+        job = BulkJob.objects.select_for_update().filter(id=job_id).first()
+        if job is None or job.status not in (BulkJob.Status.COMMITTED, BulkJob.Status.PARTIAL):
+            raise BulkError("Sólo se puede revertir un job confirmado (o confirmado en parte).")
+        _bloquear_claves(
+            AuditLog.objects.filter(job=job).order_by().values_list("business_key", flat=True).distinct().iterator()
+        )
+
+        reversion = _Reversion(job, actor, _model_concrete_fields(BaseDeDatosBia))
+        grupos = _cambios_del_job(job)
+        while lote := list(islice(grupos, BULK_ROLLBACK_BATCH)):
+            reversion.lote(lote)
+
+        conflictos = reversion.conflictos
+        if conflictos and not skip_conflicts:
+            claves = ", ".join(c["business_key"] for c in conflictos[:20])
+            raise BulkError(
+                f"{len(conflictos)} fila(s) cambiaron después del commit ({claves}"
+                f"{', ...' if len(conflictos) > 20 else ''}). Revisalas o usá skip_conflicts=true."
+            )
+
+        resultado = {**reversion.conteos, "conflict_count": len(conflictos)}
+        summary = dict(job.summary or {})
+        summary["rollback"] = {**resultado, "conflictos": conflictos[:ROLLBACK_MAX_CONFLICTOS]}
+        job.summary = summary
+        job.status = BulkJob.Status.ROLLED_BACK
+        job.rolled_back_at = timezone.now()
+        job.error_message = ""
+        job.save(update_fields=["summary", "status", "rolled_back_at", "error_message"])
+        touch_db_bia()
+
+    return resultado
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, IsAdminOrSuperuser])
+def bulk_rollback(request):
+    """
+    POST bulk-update/rollback {job_id, skip_conflicts?}
+    Revierte el commit de un job (reglas en revertir_bulk_job).
+    """
+    job_id = request.data.get("job_id")
+    if not job_id:
+        return Response({"errors": ["'job_id' requerido."]}, status=400)
+    try:
+        job_uuid = uuid.UUID(str(job_id))
+    except ValueError:
+        return Response({"errors": ["job_id inválido."]}, status=400)
+
+    try:
+        resultado = revertir_bulk_job(
+            job_uuid, request.user, skip_conflicts=_es_verdadero(request.data.get("skip_conflicts")),
+        )
+    except BulkError as e:
+        return Response({"errors": [str(e)]}, status=400)
+
+    return Response({"success": True, **resultado, "status": BulkJob.Status.ROLLED_BACK})
+
+
+# =========== STATUS / PREVIEW / REPORTE DE ERRORES ===========
 
-        job.status = BulkJob.Status.COMMITTED
-        job.committed_at = timezone.now()
-        job.save(update_fields=["status", "committed_at"])
+
+def _job_del_usuario(request) -> Tuple[BulkJob | None, Response | None]:
+    """BulkJob de ?job_id= si el usuario lo puede ver: (job, None) o (None, respuesta de error)."""
+    job_id = (request.query_params.get("job_id") or "").strip()
+    try:
+        job_uuid = uuid.UUID(job_id)
+    except ValueError:
+        return None, Response({"errors": ["job_id inválido."]}, status=400)
+
+    job = get_object_or_404(BulkJob, pk=job_uuid)
+    if job.created_by_id and job.created_by_id != request.user.pk and not request.user.is_superuser:
+        return None, Response({"errors": ["No estás autorizado para ver este job."]}, status=403)
+    return job, None
+
+
+def _job_validado(job: BulkJob) -> bool:
+    return job.status in (
+        BulkJob.Status.READY, BulkJob.Status.COMMITTING, BulkJob.Status.PARTIAL, BulkJob.Status.COMMITTED,
+        BulkJob.Status.ROLLED_BACK,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, CanBulkModify])
+def bulk_status(request):
+    """
+    GET bulk-update/status?job_id=...
+    Estado y progreso de un BulkJob (validate/commit en background).
+    Los links de preview/errores vienen recién cuando la validación terminó.
+    """
+    job, error = _job_del_usuario(request)
+    if error:
+        return error
 
     return Response({
         "success": True,
-        "inserted_count": len(inserts_instances),
-        "updated_count": len(updates_instances),
-        "deleted_count": len(deletes_keys) if ALLOW_DELETES else 0,
+        "job_id": str(job.id),
         "status": job.status,
+        "is_finished": job.is_finished,
+        "summary": job.summary,
+        "error_message": job.error_message,
+        **(_bulk_links(job) if _job_validado(job) else {}),
+        "created_at": job.created_at,
+        "committed_at": job.committed_at,
+        "rolled_back_at": job.rolled_back_at,
     })
+
+
+def _staging_filtrado(job: BulkJob, params):
+    """
+    Staging del job con los filtros de la preview:
+      op=UPDATE|INSERT|DELETE|NOCHANGE, can_apply=true|false,
+      has_errors=true|false, field=<campo que cambia>.
+    """
+    qs = StagingBulkChange.objects.filter(job=job)
+    op = (params.get("op") or "").strip().upper()
+    if op:
+        if op not in ACCEPTED_OPS:
+            raise BulkError(f"op inválida: '{op}'.")
+        qs = qs.filter(op=op)
+    if params.get("can_apply"):
+        qs = qs.filter(can_apply=_es_verdadero(params.get("can_apply")))
+    if params.get("has_errors"):
+        sin_errores = Q(validation_errors=[])
+        qs = qs.exclude(sin_errores) if _es_verdadero(params.get("has_errors")) else qs.filter(sin_errores)
+    field = (params.get("field") or "").strip()
+    if field:
+        qs = qs.filter(diff__has_key=field)
+    return qs
+
+
+def _conteos_staging(qs) -> Dict[str, int]:
+    """Agregados de un queryset de staging en una sola consulta (mismas claves que el summary)."""
+    return qs.aggregate(
+        total=Count("id"),
+        ok=Count("id", filter=Q(can_apply=True)),
+        con_errores=Count("id", filter=Q(can_apply=False)),
+        updates=Count("id", filter=Q(op="UPDATE")),
+        inserts=Count("id", filter=Q(op="INSERT")),
+        deletes=Count("id", filter=Q(op="DELETE")),
+        nochange=Count("id", filter=Q(op="NOCHANGE")),
+    )
+
+
+def _cambios_preview(fila: Dict[str, Any], entidades: _EntidadesPrefetch) -> Dict[str, Dict[str, Any]]:
+    """{campo: {'old', 'new'}} a partir del diff/snapshot guardados en el staging."""
+    op = fila["op"]
+    if op == "DELETE":
+        return {}
+    snapshot = fila["snapshot"] or {}
+    cambios = {}
+    for k, new in (fila["diff"] or {}).items():
+        old = snapshot.get(k) if op == "UPDATE" else None
+        if k == ENTIDAD_FIELD:
+            old = entidades.display(int(old)) if old else None
+            new = entidades.display(new)
+        cambios[k] = {"old": old, "new": new}
+    if op == "INSERT" and _es_clave_sin_asignar(fila["business_key"]):
+        cambios[BUSINESS_KEY_FIELD] = {"old": None, "new": AUTO_KEY}
+    return cambios
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, CanBulkModify])
+def bulk_preview(request):
+    """
+    GET bulk-update/preview?job_id=...&after=<id>&limit=100
+    Filas del staging en el orden del archivo, paginadas por keyset (id del
+    staging): para la página siguiente se manda after=next_after.
+    Filtros: op, can_apply, has_errors, field (ver _staging_filtrado).
+    'counts' (agregados del filtro) sólo viene en la primera página.
+    """
+    job, error = _job_del_usuario(request)
+    if error:
+        return error
+    if not _job_validado(job):
+        return Response({"errors": ["El job todavía no está validado."]}, status=409)
+
+    params = request.query_params
+    try:
+        after = int(params.get("after") or 0)
+        limit = int(params.get("limit") or PREVIEW_PAGE_SIZE)
+    except ValueError:
+        return Response({"errors": ["after/limit deben ser enteros."]}, status=400)
+    limit = max(1, min(limit, PREVIEW_MAX_PAGE_SIZE))
+
+    try:
+        qs = _staging_filtrado(job, params)
+    except BulkError as e:
+        return Response({"errors": [str(e)]}, status=400)
+
+    filas = list(
+        qs.filter(id__gt=after).order_by("id")
+        .values("id", "business_key", "op", "can_apply", "validation_errors", "diff", "snapshot")[:limit + 1]
+    )
+    hay_mas = len(filas) > limit
+    filas = filas[:limit]
+
+    # Nombres de las entidades de la página, en una consulta
+    ids_entidad = set()
+    for f in filas:
+        for valor in ((f["diff"] or {}).get(ENTIDAD_FIELD), (f["snapshot"] or {}).get(ENTIDAD_FIELD)):
+            if valor is not None and str(valor).isdigit():
+                ids_entidad.add(int(valor))
+    entidades = _EntidadesPrefetch((), ids_extra=ids_entidad)
+
+    data = {
+        "success": True,
+        "job_id": str(job.id),
+        "results": [
+            {
+                "id": f["id"],
+                BUSINESS_KEY_FIELD: f["business_key"],
+                "op": f["op"],
+                "can_apply": f["can_apply"],
+                "errors": f["validation_errors"],
+                "changes": _cambios_preview(f, entidades),
+            }
+            for f in filas
+        ],
+        "next_after": filas[-1]["id"] if hay_mas else None,
+    }
+    if not after:
+        data["counts"] = _conteos_staging(qs)
+    return Response(data)
+
+
+def _filas_con_error(job: BulkJob):
+    """
+    (encabezado, iterador de filas) del reporte de errores: clave de staging,
+    operación, errores y las columnas originales del archivo.
+    """
+    qs = StagingBulkChange.objects.filter(job=job).exclude(validation_errors=[]).order_by("id")
+    primera = qs.values_list("payload", flat=True).first() or {}
+    columnas = [c for c in primera if c != "__op"]
+    encabezado = ["fila", "op", "errores", *columnas]
+
+    def _filas():
+        valores = qs.values_list("business_key", "op", "validation_errors", "payload")
+        for bkey, op, errores, payload in valores.iterator(chunk_size=BULK_CHUNK_ROWS):
+            payload = payload or {}
+            yield [bkey, op, "; ".join(map(str, errores)), *(payload.get(c) for c in columnas)]
+
+    return encabezado, _filas()
+
+
+class _Echo:
+    """Pseudo-buffer para csv.writer en StreamingHttpResponse."""
+
+    def write(self, value):
+        return value
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, CanBulkModify])
+def bulk_errors_csv(request):
+    """GET bulk-update/errors.csv?job_id=... — filas con errores, en streaming."""
+    job, error = _job_del_usuario(request)
+    if error:
+        return error
+
+    encabezado, filas = _filas_con_error(job)
+
+    def _iter():
+        writer = csv.writer(_Echo())
+        yield writer.writerow(encabezado)
+        for fila in filas:
+            yield writer.writerow(["" if v is None else v for v in fila])
+
+    resp = StreamingHttpResponse(_iter(), content_type="text/csv; charset=utf-8")
+    resp["Content-Disposition"] = f'attachment; filename="errores_{job.id}.csv"'
+    return resp
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, CanBulkModify])
+def bulk_errors_xlsx(request):
+    """
+    GET bulk-update/errors.xlsx?job_id=... — filas con errores.
+    openpyxl en modo write_only a un archivo temporal (memoria acotada) que se
+    devuelve por bloques con FileResponse.
+    """
+    job, error = _job_del_usuario(request)
+    if error:
+        return error
+
+    encabezado, filas = _filas_con_error(job)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Errores")
+    ws.append(encabezado)
+    for fila in filas:
+        ws.append(fila)
+
+    tmp = tempfile.TemporaryFile()
+    wb.save(tmp)
+    tmp.seek(0)
+    return FileResponse(
+        tmp,
+        as_attachment=True,
+        filename=f"errores_{job.id}.xlsx",
+        content_type=XLSX_CONTENT_TYPE,
+    )
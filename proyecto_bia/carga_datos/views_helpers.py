@@ -1,17 +1,129 @@
+import unicodedata
+
 import pandas as pd
+from django.apps import apps  # import perezoso de modelos de otras apps
+
+from .models import BaseDeDatosBia
+from .utils_cleaning import strip_strings, drop_blank_rows
+
+# =========================
+# CONFIGURACIÓN IMPORTANTE
+# =========================
+# Si True: si no existe la Entidad (por propietario o entidadinterna), se crea automáticamente.
+CREATE_MISSING_ENTIDADES = True
+
+# (Opcional) Exigir clave en confirmación para considerar válida la fila.
+# Si lo activás, sólo se aceptarán filas que tengan al menos DNI o id_pago_unico no vacío.
+REQUIRE_KEY_FOR_ROW = False
+KEY_FIELDS = ('dni', 'id_pago_unico')
+
+
+def _strip_accents(s: str) -> str:
+    if s is None:
+        return ""
+    s = str(s)
+    return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
+
+def normalizar_valor_nombre(valor: str) -> str:
+    """
+    Normaliza valores de 'propietario' / 'entidadinterna' para comparación:
+    - s/ tildes, espacios y puntuación común
+    - lower
+    """
+    s = _strip_accents((valor or "").strip())
+    for ch in ('.', '-', '_', ',', ';', ':', '/', '\\'):
+        s = s.replace(ch, '')
+    s = s.lower().replace(" ", "")
+    return s
 
-def limpiar_valor(valor):
+# ==============================
+# RESOLVER FK ENTIDAD (OPCIÓN 3)
+# ==============================
+def _get_entidad_model():
+    """Importa Entidad de forma perezosa para evitar ciclos de import."""
+    return apps.get_model('certificado_ldd', 'Entidad')
+
+def _build_entidad_cache():
     """
-    Convierte valores NaN (de pandas) o cadenas vacías a None,
-    y deja el resto tal cual.
+    Devuelve un dict clave-normalizada -> Entidad
     """
-    try:
-        if pd.isna(valor):
-            return None
-    except Exception:
-        pass
+    Entidad = _get_entidad_model()
+    cache = {}
+    for e in Entidad.objects.all():
+        cache[normalizar_valor_nombre(e.nombre)] = e
+    return cache
 
-    if isinstance(valor, str) and valor.strip() == "":
-        return None
+# ==============================
+# COLUMNAS Y LIMPIEZA DE BLOQUES
+# ==============================
+def normalizar_columna(col):
+    """
+    Normaliza nombres de columnas para matchear contra campos del modelo:
+    - s/ tildes, puntos, guiones, guiones bajos, espacios
+    - upper
+    """
+    col = str(col).strip()
+    col = _strip_accents(col)
+    col = col.replace(".", "").replace("-", "").replace("_", "")
+    col = col.upper().replace(" ", "")
+    return col
 
-    return valor
+def validar_columnas_obligatorias(df_columns):
+    """
+    Verifica qué columnas del modelo faltan en el archivo.
+    Si querés que 'creditos' sea opcional, podés excluirlo aquí como ejemplo.
+    """
+    columnas_modelo = [f.name for f in BaseDeDatosBia._meta.fields if f.name != 'id']
+    # Ejemplo para hacer opcional:
+    # if 'creditos' in columnas_modelo:
+    #     columnas_modelo.remove('creditos')
+
+    columnas_modelo_norm = [normalizar_columna(c) for c in columnas_modelo]
+    columnas_excel_norm  = [normalizar_columna(c) for c in df_columns]
+
+    faltantes = []
+    for i, normalizada in enumerate(columnas_modelo_norm):
+        if normalizada not in columnas_excel_norm:
+            faltantes.append(columnas_modelo[i])
+    return faltantes
+
+def _es_verdadero(valor) -> bool:
+    """Flags de request ('1', 'true', 'sí', 'on', ...)."""
+    return str(valor or "").strip().lower() in ("1", "true", "si", "sí", "yes", "on")
+
+
+# ---------- Helpers de limpieza de filas ----------
+def df_drop_blank_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Elimina filas completamente vacías (None/NaN/''/espacios).
+    Evita que pandas cuente filas con formato/bordes como válidas.
+    Vectorizado por columna (ver utils_cleaning), sin apply por fila.
+    """
+    return drop_blank_rows(df)
+
+def mapear_columnas(df_columns) -> dict:
+    """
+    Devuelve {columna_archivo: campo_modelo} comparando nombres normalizados.
+    """
+    columnas_modelo = [f.name for f in BaseDeDatosBia._meta.fields if f.name != 'id']
+    campos_norm = {}
+    for campo in columnas_modelo:
+        campos_norm.setdefault(normalizar_columna(campo), campo)
+    columna_map = {}
+    for col in df_columns:
+        campo = campos_norm.get(normalizar_columna(col))
+        if campo:
+            columna_map[col] = campo
+    return columna_map
+
+def _limpiar_chunk(df: pd.DataFrame, columna_map: dict) -> pd.DataFrame:
+    """
+    Limpieza de un bloque del archivo: trim de strings (''/espacios -> NaN),
+    filas vacías fuera + rename al modelo. Todo por columna, sin recorrer filas.
+    """
+    if df is None or df.empty:
+        return df
+    df = df_drop_blank_rows(strip_strings(df))
+    if df.empty:
+        return df
+    return df.rename(columns=columna_map)